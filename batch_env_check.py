@@ -0,0 +1,124 @@
+import sys
+sys.path.insert(0, 'scripts/')
+
+import time
+import numpy as np
+from ttrengine import Game, Player, USA_VARIANTS, emptyCardDict, make_train_deck, point_table
+from parallelRunner import load_map
+from batchEnv import BatchEnv, slot_generator
+
+#plays the games of a BatchEnv and Game games made with the same random numbers side by side, with random legal actions,
+#and checks that both have the same state, legal actions and points after every action, then compares their speed
+#usage: python batch_env_check.py [number of steps]
+
+#random generator of a Game that takes its numbers from the generator of a BatchEnv slot
+class SlotRandom:
+    def __init__(self, generator):
+        self.generator = generator
+
+    def random(self):
+        return float(self.generator.random())
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+def new_game(board, destination_deck, number_of_players, rng):
+    players = [Player(hand=emptyCardDict(), number_of_trains=45, points=0) for i in range(number_of_players)]
+    game = Game(board=board.copy(), point_table=point_table(), destination_deck=destination_deck.copy(), train_deck=make_train_deck(number_of_color_cards=12, number_of_wildcards=14), players=players, current_player=0, variants=USA_VARIANTS, rng=rng)
+    game.setup()
+    return game
+
+#the player of the next action of a game: the first player with pending destination cards, else the current player
+def acting_player(game):
+    for (i, player) in enumerate(game.players):
+        if len(player.hand.pending) > 0:
+            return i
+    return game.current_player
+
+def make_action(game, pnum, action):
+    move = game.decode_action(action, pnum)
+    if move.function == 'chooseDestinationCards':
+        min_num_cards = game.destination_deck_draw_rules[1] if len(game.players[pnum].hand_destination_cards) == 0 else game.destination_deck_draw_rules[3]
+        assert game.choose_destination_cards(pnum, move.args[1], min_num_cards)
+    else:
+        game.make_move(move.function, move.args)
+
+def check_game(env, n, game):
+    pnum = acting_player(game)
+    assert env.player[n] == pnum, (n, env.player[n], pnum)
+    assert (env.mask[n] == game.legal_action_mask(pnum)).all(), (n, np.flatnonzero(env.mask[n] != game.legal_action_mask(pnum)))
+    assert env.owner[n].tolist() == game.board.owner.tolist(), n
+    assert env.hand[n].tolist() == [p.hand.counts for p in game.players], n
+    assert env.points[n].tolist() == [p.points for p in game.players], n
+    assert env.trains[n].tolist() == [p.number_of_trains for p in game.players], n
+    assert env.face_up[n].tolist() == list(game.train_cards_face_up.values()), n
+    assert env.deck_total[n] == game.train_deck.remaining() and env.discard_total[n] == game.train_deck.discarded(), n
+    assert env.completed[n].sum(axis=1).tolist() == [len(p.completed_destination_cards) for p in game.players], n
+
+def differential_check(map_name, number_of_games, number_of_players, steps, seed=0):
+    (board, destination_deck) = load_map(map_name)
+    env = BatchEnv(board, destination_deck, number_of_games, number_of_players, seed)
+    rngs = [SlotRandom(slot_generator(seed, n)) for n in range(number_of_games)]
+    games = [new_game(board, destination_deck, number_of_players, rngs[n]) for n in range(number_of_games)]
+    policy = np.random.default_rng(seed)
+    finished = 0
+    failed = 0
+    for step in range(steps):
+        for n in range(number_of_games):
+            check_game(env, n, games[n])
+        actions = (policy.random(env.mask.shape) * env.mask).argmax(axis=1)
+        players = env.player.copy()
+        (observations, rewards, masks, done, info) = env.step(actions)
+        for n in range(number_of_games):
+            points = [p.points for p in games[n].players]
+            make_action(games[n], players[n], actions[n])
+            assert rewards[n].tolist() == [p.points - q for (p, q) in zip(games[n].players, points)], n
+            if info['failed'][n]:
+                #no legal action left: the game can't go on
+                assert not games[n].game_over and not games[n].legal_action_mask(acting_player(games[n])).any(), n
+                failed += 1
+            else:
+                assert done[n] == games[n].game_over, (n, step)
+            if done[n]:
+                assert info['final_points'][n].tolist() == [p.points for p in games[n].players], n
+                games[n] = new_game(board, destination_deck, number_of_players, rngs[n])
+                finished += 1
+    print(f"{map_name}, {number_of_players} players: {steps} steps of {number_of_games} games ({finished} games finished, {failed} without legal actions) match")
+
+#warmup => steps played before the time is counted: all slots start their first game at once, so the games only end
+#at a steady rate (the rate of a long run) after about the length of a game
+def throughput(map_name, number_of_games, number_of_players, steps, seed=0, warmup=300):
+    (board, destination_deck) = load_map(map_name)
+    env = BatchEnv(board, destination_deck, number_of_games, number_of_players, seed)
+    policy = np.random.default_rng(seed)
+    #only the time of step is counted (not the time to pick the actions)
+    elapsed = 0
+    finished = 0
+    for step in range(warmup + steps):
+        actions = (policy.random(env.mask.shape) * env.mask).argmax(axis=1)
+        start = time.time()
+        (observations, rewards, masks, done, info) = env.step(actions)
+        if step >= warmup:
+            elapsed += time.time() - start
+            finished += int(done.sum())
+    print(f"BatchEnv: {finished / elapsed:.0f} games/s, {number_of_games * steps / elapsed:.0f} actions/s ({number_of_games} games)")
+
+    game = new_game(board, destination_deck, number_of_players, SlotRandom(slot_generator(seed, 0)))
+    start = time.time()
+    actions = 0
+    games = 0
+    while time.time() - start < 5:
+        pnum = acting_player(game)
+        mask = game.legal_action_mask(pnum)
+        make_action(game, pnum, int((policy.random(len(mask)) * mask).argmax()))
+        actions += 1
+        if game.game_over:
+            game = new_game(board, destination_deck, number_of_players, SlotRandom(slot_generator(seed, 0)))
+            games += 1
+    elapsed = time.time() - start
+    print(f"Game: {games / elapsed:.1f} games/s, {actions / elapsed:.0f} actions/s")
+
+steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+for number_of_players in (2, 3, 4):
+    differential_check('usa', 16, number_of_players, steps, seed=number_of_players)
+throughput('usa', 1024, 2, 500)
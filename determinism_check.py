@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+sys.path.insert(0, 'scripts/')
+
+#plays the same games in new processes with different hash seeds (PYTHONHASHSEED changes the order of sets of strings)
+#and checks that they are the same games: same scores, turns and moves
+#usage: python determinism_check.py [number of games] [hash seeds, comma separated]
+
+from hungryAgent import HungryAgent
+from pathAgent import PathAgent
+from oneStepThinkerAgent import OneStepThinkerAgent
+from longRouteJunkieAgent import LongRouteJunkieAgent
+
+def make_agents():
+    return [HungryAgent(), PathAgent(), OneStepThinkerAgent(), LongRouteJunkieAgent()]
+
+#prints one line per game: its scores, turns and moves (as move codes, see gameRecord.py)
+def play(number_of_games, seed, map_name):
+    from parallelRunner import run_games
+    for result in run_games(number_of_games, make_agents, seed=seed, map_name=map_name, processes=1, record=True):
+        print(result['game_no'], result['scores'], result['turn_count'], result['record'].moves)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--play':
+        play(int(sys.argv[2]), int(sys.argv[3]), sys.argv[4])
+        sys.exit(0)
+
+    number_of_games = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    hash_seeds = sys.argv[2].split(',') if len(sys.argv) > 2 else ['1', '2', '3']
+    failed = False
+    for map_name in ('usa', 'europe'):
+        outputs = []
+        for hash_seed in hash_seeds:
+            env = dict(os.environ, PYTHONHASHSEED=hash_seed)
+            outputs.append(subprocess.run([sys.executable, __file__, '--play', str(number_of_games), '1', map_name], env=env, capture_output=True, text=True, check=True).stdout.splitlines())
+        for (hash_seed, output) in zip(hash_seeds[1:], outputs[1:]):
+            different = [game_no for (game_no, (line1, line2)) in enumerate(zip(outputs[0], output)) if line1 != line2]
+            if different or len(output) != len(outputs[0]):
+                failed = True
+                print(f"{map_name}: games {different} differ between PYTHONHASHSEED={hash_seeds[0]} and {hash_seed}")
+        print(f"{map_name}: {len(outputs[0])} games checked under PYTHONHASHSEED {','.join(hash_seeds)}")
+    sys.exit(1 if failed else 0)
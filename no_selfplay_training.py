@@ -1,6 +1,7 @@
 import sys
 sys.path.insert(0, 'scripts/')
 import io
+import os
 
 from loadDestinationDeck import *
 from loadMap import *
@@ -15,27 +16,51 @@ import matplotlib.pyplot as plt
 import time
 import pprint
 import ast
+import argparse
+from checkpoint import save_checkpoint, load_checkpoint
+from metricsLog import MetricsWriter, game_metrics, read_metrics, rolling_stats, truncate_metrics
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--games", type=int, default=15000, help="number of training games")
+parser.add_argument("--checkpoint", default="checkpoint.npz", help="file the checkpoints are written to")
+parser.add_argument("--checkpoint-every", type=int, default=100, help="number of games between two checkpoints")
+parser.add_argument("--metrics", default="train_metrics.jsonl", help="file the metrics of every game are appended to")
+parser.add_argument("--overwrite-metrics", action="store_true", help="start a new run even if the --metrics file has the metrics of another run (they are deleted)")
+parser.add_argument("--resume", nargs="?", const="", default=None, help="continue the run saved in a checkpoint (by default the --checkpoint file) with the games it would have played (whatever PYTHONHASHSEED is), or start a new run from the Q-values of a q_values*.txt file")
+args = parser.parse_args()
 
 board = Board(loadgraphfromfile("gameContent/usa.txt"))
 dest_deck_dict = destinationdeckdict(dest_list=loaddestinationdeckfromfile("gameContent/usa_destinations.txt"), board="usa")
 agent = ApproximateQLearningAgent()
 
-#Load in Q-values
-with open("q_values.txt", 'r') as f:
-    qvals = f.read()
-agent.qvalues = ast.literal_eval(qvals)
-
 train_score_record = []
 epsilon_start = 0.1 #1
 agent.epsilon = epsilon_start
 
-num_training_sessions = 15000
+#Load in Q-values (or the Q-values, epsilon, scores and random state of the run to resume)
+game_no = 0
+resume_file = None if args.resume is None else (args.resume or args.checkpoint)
+if resume_file is not None:
+    game_no, train_score_record = load_checkpoint(resume_file, agent)
+    print(f"Resuming from game no. {game_no}")
+else:
+    agent.load_qvalues_file("q_values.txt")
+#a run resumed from a checkpoint drops the metrics of the games played after it, a new run (or one starting from the
+#Q-values of a .txt file, see load_checkpoint) doesn't delete the metrics of another run
+if resume_file is not None and not resume_file.endswith('.txt'):
+    truncate_metrics(args.metrics, game_no)
+elif os.path.exists(args.metrics) and os.path.getsize(args.metrics) > 0:
+    if not args.overwrite_metrics:
+        sys.exit(f"{args.metrics} has the metrics of another run: use --resume to continue it, --overwrite-metrics to delete them or --metrics to write to another file")
+    os.remove(args.metrics)
+metrics = MetricsWriter(args.metrics)
+
+num_training_sessions = args.games
 #epsilon_target = 0.1
 #cur_epsilon = epsilon_start
 #epsilon_decay = 0.9995
 #when_reach_target = 0.65 * num_training_sessions
 
-game_no = 0
 while game_no < num_training_sessions:
     # if game_no >= when_reach_target:
     #     epsilon_this_iter = epsilon_target
@@ -54,7 +79,8 @@ while game_no < num_training_sessions:
 
     start = time.time()
     gh.play(runnum=game_no, save=False)
-    print (f"Game no. {game_no}, scored {player_list[0].points}, dcards: {game_object.getNumCompletedDCards(0)} complete and {game_object.getNumIncompleteDCards(0)} incomplete totaling {len(player_list[0].hand_destination_cards)} for {game_object.getDCardScore(0)} points, took {gh.turn_count} turns ({(time.time() - start):.2f} seconds)")
+    wall_time = time.time() - start
+    print (f"Game no. {game_no}, scored {player_list[0].points}, dcards: {game_object.getNumCompletedDCards(0)} complete and {game_object.getNumIncompleteDCards(0)} incomplete totaling {len(player_list[0].hand_destination_cards)} for {game_object.getDCardScore(0)} points, took {gh.turn_count} turns ({wall_time:.2f} seconds)")
 
     #rerun this game number if the run was not successful 
     #record points if the run was successful
@@ -64,9 +90,14 @@ while game_no < num_training_sessions:
     else:
         #record points
         train_score_record.append(player_list[0].points)
+        metrics.write(game_metrics(game_no, game_object, gh, 0, wall_time))
         #cur_epsilon = max(epsilon_target, cur_epsilon * epsilon_decay)
         #agent.epsilon = cur_epsilon
         game_no += 1
+        if game_no % args.checkpoint_every == 0 or game_no == num_training_sessions:
+            metrics.flush()
+            save_checkpoint(args.checkpoint, agent, game_no, train_score_record)
+metrics.close()
 
 #test it out!
 test_score_record = []
@@ -97,16 +128,16 @@ with open('score_log.txt', 'a') as f:
     try:
         sys.stdout = f
         print("Agent q-values")
-        pprint.pprint(agent.qvalues)
+        pprint.pprint(agent.qvalues_dict())
     finally:
         sys.stdout = original_stdout
 
-#score curve
-train_score_record = [np.array(arr) for arr in train_score_record]
-
-train_x = np.arange(num_training_sessions)
+#score curve: mean and 10%-90% quantiles of the last 100 games, read back from the metrics file
+curve = list(rolling_stats(read_metrics(args.metrics), 'score', window=100, quantiles=(0.1, 0.9), every=max(1, num_training_sessions // 2000)))
+train_x = [game_no for (game_no, mean, quantiles) in curve]
 
 plt.clf()
-plt.plot(train_x, train_score_record)
+plt.plot(train_x, [mean for (game_no, mean, quantiles) in curve])
+plt.fill_between(train_x, [quantiles[0] for (game_no, mean, quantiles) in curve], [quantiles[1] for (game_no, mean, quantiles) in curve], alpha=0.3)
 plt.title(f"Agent's training score progression")
 plt.savefig(f"Agent training score progression.png")
@@ -0,0 +1,19 @@
+import sys
+sys.path.insert(0, 'scripts/')
+
+from tournament import *
+
+#every agent against every other agent in 2 player duplicate games (both seatings with the same cards), on the usa and europe maps
+tournament = Tournament(agent_names=list(AGENTS), map_names=['usa', 'europe'], players_per_game=2, max_games=200, seed=0, crn=True)
+(agents, pairings) = tournament.run()
+
+for (pairing, (games, decided)) in pairings.items():
+    print(f"{' vs '.join(pairing)}: {games} games, {'decided' if decided else 'not decided'}")
+
+for name in sorted(agents, key=lambda name: agents[name]['elo'], reverse=True):
+    stats = agents[name]
+    print(f"{name}: elo {stats['elo']:.0f} ({stats['elo interval'][0]:.0f} to {stats['elo interval'][1]:.0f}), win rate {stats['win rate']:.2f}, mean score {stats['mean score']:.1f}, places {stats['places']}")
+
+with open('score_log.txt', 'a') as f:
+    print("Tournament results", file=f)
+    print(agents, file=f)
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
+import random
 import networkx as nx
+from pathOracle import path_oracle
 
 #   General strategies of each agent
 #   (Hungry Agent)      Accumulates destination cards until a threshold is reached. Keeps destination cards that maximize points scored/train tokens needed
@@ -20,6 +22,14 @@ import networkx as nx
 #                           If destination cards complete, selects among all unclaimed routes of size 3 or more
 
 class Agent(ABC):
+	#random generator of the agent's random choices, set by GameHandler to the generator of the game (see Game)
+	rng = random
+	#ticket ids of the destination cards seen by the last destinations_changed call (None before the first call)
+	observed_destinations = None
+
+	def set_rng(self, rng):
+		self.rng = rng
+
 	@abstractmethod
 	def decide(self, game, pnum):
 		"Must be implemented by subclass"
@@ -29,57 +39,83 @@ class Agent(ABC):
 	def choose_destination_cards(self, moves, game, pnum, num_keep):
 		"Must be implemented by subclass"
 		pass
+
+	#called instead of decide on the turns the agent is asked to watch the game without choosing a move
+	#(see ApproximateQLearningAgent.lazy), agents that keep a plan between turns update it here
+	def observe(self, game, pnum):
+		pass
+
+	#returns True if the destination cards of pnum changed since the last call (used by observe)
+	def destinations_changed(self, game, pnum):
+		cards = tuple(game.board.routes.ticket_id(card) for card in game.players[pnum].hand_destination_cards)
+		changed = cards != self.observed_destinations
+		self.observed_destinations = cards
+		return changed
 	
-	def free_routes_graph(self, pnum, graph, number_of_players, min_weight_edge=0):
+	#the graphs and lists below are cached in the planning cache of the board (see planningCache.py) until a route is claimed
+	#and shared by all agents, so they must not be modified
+
+	#returns a graph with all the routes pnum can still claim
+	#board => the Board of the game (game.board)
+	def free_routes_graph(self, pnum, board, number_of_players, min_weight_edge=0):
+		key = ('free_routes', board.version, pnum, number_of_players, min_weight_edge)
+		return board.planning_cache.get(key, lambda: self.build_free_routes_graph(pnum, board, number_of_players, min_weight_edge))
+
+	def build_free_routes_graph(self, pnum, board, number_of_players, min_weight_edge=0):
 		G = nx.MultiGraph()
-		visited_nodes = []
-		assert len(graph) > 0	
-		for node1 in graph:
-			for node2 in graph[node1]:
-				if node2 not in visited_nodes:
-					locked = False
-					conn_obj = graph[node1][node2]
-					for edge in conn_obj:
-						if number_of_players < 4:  #################### CHECK THIS FOR SWITZERLAND!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-							if conn_obj[edge]['owner'] != -1:
-								locked = True
-						else:
-							#if you already own one side of a double route, can't claim other
-							if conn_obj[edge]['owner'] == pnum:
-								locked = True
-
-					if not locked:
-						for edge in conn_obj:
-							if conn_obj[edge]['owner'] == -1 and conn_obj[edge]['weight'] >= min_weight_edge:
-								G.add_edge(node1, node2, weight=conn_obj[edge]['weight'], color=conn_obj[edge]['color'], underground=conn_obj[edge]['underground'], ferries=conn_obj[edge]['ferries'], owner=-1)
-
-			visited_nodes.append(node1)
+		assert board.routes.number_of_routes > 0
+		#locking: if number_of_players < 4 only one route between two cities can be claimed (CHECK THIS FOR SWITZERLAND!!!)
+		#else if you already own one side of a double route, can't claim other
+		rows = board.routes.rows
+		G.add_edges_from((rows[r][0], rows[r][1], {'weight': rows[r][3], 'color': rows[r][4], 'underground': rows[r][6], 'ferries': rows[r][5], 'owner': -1})
+						 for r in board.claimable_routes(number_of_players, pnum, min_weight_edge).nonzero()[0].tolist())
 		
 		return G
 	
+	#returns the free routes graph of pnum plus the routes pnum owns (with weight 0)
 	def joint_graph(self, game, pnum, min_weight_edge=0):
-		free_connections_graph = self.free_routes_graph(pnum, game.board.graph, game.number_of_players, min_weight_edge)
+		key = ('joint', game.board.version, pnum, game.number_of_players, min_weight_edge)
+		return game.board.planning_cache.get(key, lambda: self.build_joint_graph(game, pnum, min_weight_edge, key))
+
+	#key => the key of the joint graph in the planning cache of the board, saved in the graph so destinations_not_completed can be cached too
+	def build_joint_graph(self, game, pnum, min_weight_edge=0, key=None):
+		#a new free routes graph, the cached one is shared
+		free_connections_graph = self.build_free_routes_graph(pnum, game.board, game.number_of_players, min_weight_edge)
 		player_edges = game.player_graph(pnum).edges()
 		
 		joint_graph = free_connections_graph
 		for edge in player_edges:
 			joint_graph.add_edge(edge[0], edge[1], weight=0, color='none', owner=pnum, underground=False, ferries=0)
 
+		joint_graph.graph['planning_key'] = key
 		return joint_graph
 	
+	#returns the PathOracle (see pathOracle.py) of pnum: shortest paths of the joint graph (with min_weight_edge=0)
+	#without searching the graph, use it instead of nx.dijkstra_path/nx.dijkstra_path_length/nx.has_path on joint_graph(game, pnum)
+	def path_oracle(self, game, pnum):
+		return path_oracle(game.board, pnum, game.number_of_players)
+
+	#returns a list of dicts (city1, city2, points and type) of the destination cards of pnum
+	#that are not completed yet but can still be completed in joint_graph
+	#the dicts are new on every call (agents change them)
 	def destinations_not_completed(self, game, pnum, joint_graph):
+		graph_key = joint_graph.graph.get('planning_key')
+		if graph_key is None:
+			return self.find_destinations_not_completed(game, pnum, joint_graph)
+
+		cards = tuple(id(card) for card in game.players[pnum].hand_destination_cards)
+		result = game.board.planning_cache.get(('destinations', graph_key, pnum, cards), lambda: self.find_destinations_not_completed(game, pnum, joint_graph))
+		return [dict(destination) for destination in result]
+
+	def find_destinations_not_completed(self, game, pnum, joint_graph):
 		result = []
-		graph = game.player_graph(pnum)
+		player = game.players[pnum]
 
-		destination_cards = game.players[pnum].hand_destination_cards
+		destination_cards = player.hand_destination_cards
 		for card in destination_cards:
 			city1 = card.destinations[0]
 			city2 = card.destinations[1]
-			try:
-				nx.shortest_path(graph, city1, city2)
-				solved = True
-			except:
-				solved = False
+			solved = player.connections.completes(card)
 
 			if not solved:
 				if city1 in joint_graph.nodes() and city2 in joint_graph.nodes() and nx.has_path(joint_graph, city1, city2):
@@ -7,6 +7,7 @@ from oneStepThinkerAgent import OneStepThinkerAgent
 from pathAgent import PathAgent
 import numpy as np
 import random
+import ast
 
 #Question: how to handle storing feature weights?
 #   Answer: include training function that only needs to be run once (and stores results with pickle to load in at __init__)
@@ -21,13 +22,9 @@ import random
 # 
 
 class ApproximateQLearningAgent(Agent):
-    #convert list of True/False values to number corresponding to state
+    #convert list of True/False values to number corresponding to state (feature i is bit i)
     def bool_list_to_number(self, state):
-        state_idx = 0
-        for i in range(len(state)):
-            if state[i] == True:
-                state_idx += 2 ** i
-        return state_idx
+        return int(np.dot(np.asarray(state, dtype=np.int64), self.state_bits[:len(state)]))
     
     def point_lookup(self, val):
         tab = {1:1, 2:2, 3:4, 4:7, 5:10, 6:15, 8:21, 9:27}
@@ -60,11 +57,24 @@ class ApproximateQLearningAgent(Agent):
         # self.weight_decay = 0.9999
         # self.weight_decay_final = 0.99
 
-        self.qvalues = {state: {agent.__class__.__name__: 10.0 for agent in self.agents} for state in range(2**len(self.features))}
+        #Q-table: one row per state, one column per agent (agent id = index in self.agent_names)
+        self.agent_names = [agent.__class__.__name__ for agent in self.agents]
+        self.agent_ids = {name: i for (i, name) in enumerate(self.agent_names)}
+        self.state_bits = 1 << np.arange(len(self.features), dtype=np.int64)
+        self.qvalues = np.full((2**len(self.features), len(self.agents)), 10.0)
         
         self.discount = 0.995
         self.alpha = 0.15
         self.epsilon = 0.1
+        #if True, update() keeps the transitions of the game and applies them all at once at the end of the game (see batch_update)
+        self.batch_updates = False
+        #if True, decide and choose_destination_cards only ask the agent with the best Q-value for a move,
+        #the other agents only observe the game (faster, for evaluation runs)
+        self.lazy = False
+        #with lazy, fraction of the turns on which every agent is asked for its move to fill best_agents_reporting
+        #(drawn from its own generator so the games don't depend on it)
+        self.report_rate = 0.0
+        self.report_rng = random.Random(0)
         self.reinitialize_vars()        
         
     def reinitialize_vars(self):
@@ -73,6 +83,8 @@ class ApproximateQLearningAgent(Agent):
         #List of agents to pick actions from.
         #Each agent will have decide() called on it with this agent's pnum, which should keep their fields updated
         self.agents = [HungryAgent(), LongRouteJunkieAgent(), OneStepThinkerAgent(), PathAgent()]
+        for a in self.agents:
+            a.set_rng(self.rng)
         
         self.jgraph = None
         self.remaining_dest = []
@@ -81,6 +93,32 @@ class ApproximateQLearningAgent(Agent):
         self.run_failure = False
         self.best_agents_reporting = []
         self.last_move_route_points = 0
+        #transitions (state_idx, agent id, reward, next state_idx or -1 if terminal) waiting for batch_update
+        self.pending_transitions = []
+
+    #the agents to pick actions from draw from the same generator
+    def set_rng(self, rng):
+        self.rng = rng
+        for a in self.agents:
+            a.set_rng(rng)
+
+    #####################
+    #   Q-TABLE FILES   #
+    #####################
+
+    #loads Q-values saved as a dict {state: {agent name: value}} (the format of q_values.txt)
+    def load_qvalues_dict(self, qvalues):
+        for state in qvalues:
+            for ag_name in qvalues[state]:
+                self.qvalues[state, self.agent_ids[ag_name]] = qvalues[state][ag_name]
+
+    def load_qvalues_file(self, filename):
+        with open(filename, 'r') as f:
+            self.load_qvalues_dict(ast.literal_eval(f.read()))
+
+    #returns the Q-values as a dict {state: {agent name: value}} (the format of q_values.txt)
+    def qvalues_dict(self):
+        return {state: {ag_name: float(self.qvalues[state, i]) for (i, ag_name) in enumerate(self.agent_names)} for state in range(len(self.qvalues))}
     
     def decide(self, game, pnum):        
         overall_possible_actions = game.get_possible_moves(pnum)
@@ -90,6 +128,9 @@ class ApproximateQLearningAgent(Agent):
             print("AQL: no moves left to make")
             self.run_failure = True
             return
+
+        if self.lazy:
+            return self.lazy_decide(game, pnum)
         
         #get possible actions from agents no matter what so they update their own state
         agents_chosen_actions = {}
@@ -111,16 +152,8 @@ class ApproximateQLearningAgent(Agent):
         #convert list of True/False values to number corresponding to state
         state_idx = self.bool_list_to_number(state)
 
-        #get agent values mapping from table
-        agent_to_values_map = self.qvalues[state_idx]
-
-        #find maximum value move
-        best_agent_name = None
-        best_value = -1 * float('inf')
-        for ag_name in agent_to_values_map:
-            if agent_to_values_map[ag_name] > best_value:
-                best_agent_name = ag_name
-                best_value = agent_to_values_map[ag_name]
+        #find maximum value move (first agent on ties)
+        best_agent_name = self.agent_names[int(np.argmax(self.qvalues[state_idx]))]
 
         best_action = agents_chosen_actions[best_agent_name]
         
@@ -129,8 +162,49 @@ class ApproximateQLearningAgent(Agent):
                 self.best_agents_reporting.append(ag_name)
 
         return best_action, state_idx, best_agent_name
+
+    #decide with lazy: the state is determined first and only the best agent decides
+    def lazy_decide(self, game, pnum):
+        state_idx = self.bool_list_to_number(self.get_state_from_features(game, pnum))
+        best_agent_id = int(np.argmax(self.qvalues[state_idx]))
+        for a in self.agents:
+            a.observe(game, pnum)
+
+        best_action = self.agents[best_agent_id].decide(game, pnum)
+        if best_action is None:
+            print(f"{self.agent_names[best_agent_id]} returned a None action")
+            self.run_failure = True
+            return
+
+        self.best_agents_reporting = []
+        if self.report_rate > 0 and self.report_rng.random() < self.report_rate:
+            self.best_agents_reporting = self.agreeing_agents(best_agent_id, best_action, lambda a: a.decide(game, pnum))
+        return best_action, state_idx, self.agent_names[best_agent_id]
+
+    #returns the names of the agents that would make the same move as best_action (same function and arguments)
+    #ask => function that returns the move of an agent
+    #the random generator is restored afterwards so the diagnostic doesn't change the game
+    def agreeing_agents(self, best_agent_id, best_action, ask):
+        random_state = self.rng.getstate()
+        agreeing = []
+        for (i, a) in enumerate(self.agents):
+            action = best_action if i == best_agent_id else ask(a)
+            if action is not None and action.function == best_action.function and action.args == best_action.args:
+                agreeing.append(self.agent_names[i])
+        self.rng.setstate(random_state)
+        return agreeing
     
     def choose_destination_cards(self, moves, game, pnum, num_keep):
+        if self.lazy:
+            state_idx = self.bool_list_to_number(self.get_state_from_features(game, pnum))
+            best_agent_id = int(np.argmax(self.qvalues[state_idx]))
+            action = self.agents[best_agent_id].choose_destination_cards([m.copy() for m in moves], game.copy(), pnum, num_keep)
+            if action is None:
+                print(f"{self.agent_names[best_agent_id]} returned a None action")
+                self.run_failure = True
+                return
+            return action, state_idx, self.agent_names[best_agent_id]
+
         #get possible actions from agents no matter what so they update their own state
         agents_chosen_actions = {}
         for a in self.agents:
@@ -155,16 +229,8 @@ class ApproximateQLearningAgent(Agent):
         #convert list of True/False values to number corresponding to state
         state_idx = self.bool_list_to_number(state)
 
-        #get agent values mapping from table
-        agent_to_values_map = self.qvalues[state_idx]
-
-        #find maximum value move
-        best_agent_name = None
-        best_value = -1 * float('inf')
-        for ag in agent_to_values_map:
-            if agent_to_values_map[ag] > best_value:
-                best_agent_name = ag
-                best_value = agent_to_values_map[ag]
+        #find maximum value move (first agent on ties)
+        best_agent_name = self.agent_names[int(np.argmax(self.qvalues[state_idx]))]
                 
         best_action = agents_chosen_actions[best_agent_name]
 
@@ -176,44 +242,97 @@ class ApproximateQLearningAgent(Agent):
 
         #game_before_next_turn = None signifies terminal state
         fut_best_value = 0 #if terminal state
+        fut_state_idx = -1
         if game_before_next_turn is not None:
             #nonterminal state
             
             #find future state in qvalue table
             fut_state = self.get_state_from_features(game_before_next_turn, pnum)
             fut_state_idx = self.bool_list_to_number(fut_state)
-            fut_agent_to_values_map = self.qvalues[fut_state_idx]
 
             #find best future Q-value
-            fut_best_value = -1 * float('inf')
-            for ag_name in fut_agent_to_values_map:
-                if fut_agent_to_values_map[ag_name] > fut_best_value:
-                    fut_best_value = fut_agent_to_values_map[ag_name]
+            fut_best_value = self.qvalues[fut_state_idx].max()
+
+        agent_id = self.agent_ids[chosen_agent_name]
+        if self.batch_updates:
+            self.pending_transitions.append((state_idx_before_action, agent_id, reward, fut_state_idx))
+            if game_before_next_turn is None:
+                self.apply_pending_transitions()
+            return
         
         #find original Q-value
-        orig_value = self.qvalues[state_idx_before_action][chosen_agent_name]
+        orig_value = self.qvalues[state_idx_before_action, agent_id]
 
         #calculate TD difference
         difference = reward + self.discount * fut_best_value
 
         #update Q-value table
-        self.qvalues[state_idx_before_action][chosen_agent_name] = (1 - self.alpha) * orig_value + self.alpha * difference
+        self.qvalues[state_idx_before_action, agent_id] = (1 - self.alpha) * orig_value + self.alpha * difference
+
+    def apply_pending_transitions(self):
+        if len(self.pending_transitions) > 0:
+            self.batch_update(*zip(*self.pending_transitions))
+        self.pending_transitions = []
+
+    #applies the TD update of many transitions in one call (for example all the transitions of a game)
+    #state_idxs, agent_ids, rewards, next_state_idxs => one value per transition, next state -1 for terminal states
+    #the future values use the Q-table from before the batch, then each Q-value gets its updates in order:
+    #an entry updated k times ends up as (1-alpha)^k * Q + sum of alpha * (1-alpha)^(updates after it) * target
+    def batch_update(self, state_idxs, agent_ids, rewards, next_state_idxs):
+        state_idxs = np.asarray(state_idxs, dtype=np.int64)
+        agent_ids = np.asarray(agent_ids, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=np.float64)
+        next_state_idxs = np.asarray(next_state_idxs, dtype=np.int64)
+
+        fut_best_values = np.where(next_state_idxs >= 0, self.qvalues[np.maximum(next_state_idxs, 0)].max(axis=1), 0.0)
+        targets = rewards + self.discount * fut_best_values
+
+        entries = state_idxs * self.qvalues.shape[1] + agent_ids
+        #rank of each transition among the transitions of the same entry
+        order = np.argsort(entries, kind='stable')
+        sorted_entries = entries[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_entries[1:] != sorted_entries[:-1]])
+        group_sizes = np.diff(np.r_[group_start, len(entries)])
+        ranks = np.empty(len(entries), dtype=np.int64)
+        ranks[order] = np.arange(len(entries)) - np.repeat(group_start, group_sizes)
+
+        counts = np.bincount(entries, minlength=self.qvalues.size)
+        updates_after = counts[entries] - ranks - 1
+        qvalues = self.qvalues.reshape(-1)
+        qvalues *= (1 - self.alpha) ** counts
+        np.add.at(qvalues, entries, self.alpha * (1 - self.alpha) ** updates_after * targets)
     
     def get_state_from_features(self, game, pnum):
-        #update joint graph/remaining destinations storage
-        self.jgraph = self.joint_graph(game, pnum)
-        self.remaining_dest = self.destinations_not_completed(game, pnum, self.jgraph)
+        #joint graph/remaining destinations/cards needed only change when a route is claimed or destination cards are kept
+        #(not with the hand or the face up cards), so they are cached for each board version, player and destination cards
+        #and shared by all the AQL agents. Only the features themselves are evaluated on every call
+        cards = tuple(id(card) for card in game.players[pnum].hand_destination_cards)
+        key = ('aql_cards_needed', game.board.version, pnum, game.number_of_players, cards)
+        (self.jgraph, self.remaining_dest, self.cards_needed, self.num_cards_needed) = game.board.planning_cache.get(key, lambda: self.find_cards_needed(game, pnum))
+
+        res = np.zeros(len(self.features), dtype=bool)
+        for (i, f) in enumerate(self.features):
+            res[i] = f(game, pnum) #each feature will return True or False
+        
+        return res
+
+    #returns (joint graph, remaining destinations, cards needed, number of cards needed) of pnum
+    #cached by get_state_from_features, so the results must not be modified
+    def find_cards_needed(self, game, pnum):
+        jgraph = self.joint_graph(game, pnum)
+        remaining_dest = self.destinations_not_completed(game, pnum, jgraph)
         player_graph = game.player_graph(pnum)
 
         #update paths planned with shortest available path to each remaining dcard
 
         #figure out what color cards are needed to complete each of these paths
-        #note: the two below variables are different since routes with multiple colors to claim show up 2x in self.cards_needed
-        self.cards_needed = emptyCardDict()
-        self.num_cards_needed = 0
-        for d in self.remaining_dest:
+        #note: the two below variables are different since routes with multiple colors to claim show up 2x in cards_needed
+        cards_needed = emptyCardDict()
+        num_cards_needed = 0
+        oracle = self.path_oracle(game, pnum)
+        for d in remaining_dest:
             #this shortest path will include this player's already-claimed routes!
-            paths_lst = nx.shortest_path(self.jgraph, d['city1'], d['city2'], weight='weight')
+            paths_lst = oracle.path(d['city1'], d['city2'])
             for i in range(0, len(paths_lst) - 1):
                 node1 = paths_lst[i]
                 node2 = paths_lst[i+1]
@@ -226,23 +345,19 @@ class ApproximateQLearningAgent(Agent):
                 #otherwise, find pairing on game board
                 edgelist = game.board.get_free_connection(node1, node2, number_of_players=game.number_of_players)
                 
-                self.num_cards_needed += edgelist[0]['weight']
+                num_cards_needed += edgelist[0]['weight']
 
                 #decision: if route has multiple ways to claim it, add to both
                 for e in edgelist:
                     #note: graph has colors uppercase but cards_needed has colors lowercase
                     #note: if e['color'] is gray, will just add gray to self_cards_needed. That's OK.
                     col = e['color'].lower()
-                    if col == 'gray' and 'gray' not in self.cards_needed:
-                        self.cards_needed['gray'] = e['weight']
+                    if col == 'gray' and 'gray' not in cards_needed:
+                        cards_needed['gray'] = e['weight']
                     else:
-                        self.cards_needed[col] += e['weight']
+                        cards_needed[col] += e['weight']
 
-        res = np.zeros(len(self.features), dtype=bool)
-        for (i, f) in enumerate(self.features):
-            res[i] = f(game, pnum) #each feature will return True or False
-        
-        return res
+        return (jgraph, remaining_dest, cards_needed, num_cards_needed)
     
     def feature_minimum_trains_left(self, game, pnum): #2-45
         return min([p.number_of_trains for p in game.players]) > ((45-2) / 2)
@@ -285,12 +400,12 @@ class ApproximateQLearningAgent(Agent):
             assert len(game.get_possible_moves(pnum)) > 0
         except AssertionError as e:
             print(f"face up {game.train_cards_face_up}")
-            print(f"train deck {sum(game.train_deck.deck.values())}")
-            print(f"destination deck {sum(game.destination_deck.deck.values())}")
+            print(f"train deck {game.train_deck.remaining()}")
+            print(f"destination deck {game.destination_deck.remaining()}")
             exit(1)
             
-        if random.random() < self.epsilon:
-            rand_agent_idx = random.randint(0, len(self.agents) - 1)
+        if self.rng.random() < self.epsilon:
+            rand_agent_idx = self.rng.randint(0, len(self.agents) - 1)
             move = self.agents[rand_agent_idx].decide(game.copy(), pnum)
             try:
                 assert move is not None
@@ -321,8 +436,8 @@ class ApproximateQLearningAgent(Agent):
     def train_choose_destination_cards(self, moves, game, pnum, num_keep):
         #with probability epsilon, randomly decide between the agents
         #with probabiliity 1-epsilon, just take the real action
-        if random.random() < self.epsilon:
-            rand_agent_idx = random.randint(0, len(self.agents) - 1)
+        if self.rng.random() < self.epsilon:
+            rand_agent_idx = self.rng.randint(0, len(self.agents) - 1)
             move = self.agents[rand_agent_idx].choose_destination_cards(moves.copy(), game.copy(), pnum, num_keep)
             try:
                 assert move is not None
@@ -0,0 +1,491 @@
+import numpy as np
+from ttrengine import ROUTE_COLORS, HAND_COLORS, HAND_INDEX, NUMBER_OF_CLAIM_COLORS, MAX_PENDING_CARDS, USA_VARIANTS, action_offsets, make_train_deck, point_table
+from longestRoute import routeTrailComponents, longestTrailOfComponents
+
+#many games stepped in lockstep: the state of every game is a row of numpy arrays (routes owned, hands, decks, face up
+#cards...) and step makes one action (see Game.action_offsets) in every game at once, so training can play thousands of
+#games without a Game object or a python loop per game. The rules are the ones of Game (make_move, choose_destination_cards
+#and calculatePoints with the usa variants), down to the way cards are drawn (see draw_train_cards), so the games are
+#the same as Game games made with the same random numbers (batch_env_check.py plays both and compares them)
+#only the maps without ferries, tunnels and mountains can be played (the usa map)
+#the rare parts (scoring the end of a game, the longest route) are done one game at a time
+
+#id of the wild cards in the card arrays (the columns follow HAND_COLORS)
+WILD = HAND_INDEX['wild']
+#column of the deck arrays that is always 0: the keys of a deck (see deck_order) are padded with it
+NO_CARD = len(HAND_COLORS)
+#color id of the gray routes (see RouteTable)
+GRAY = ROUTE_COLORS.index("GRAY")
+#destination cards a player can have that are not completed (Player.max_incomplete_destination_cards)
+MAX_INCOMPLETE_DESTINATION_CARDS = 3
+
+#returns the random generator of the games of slot slot of a BatchEnv made with seed (the games of a slot draw from it in turn)
+def slot_generator(seed, slot):
+	return np.random.Generator(np.random.PCG64(np.random.SeedSequence([seed, slot])))
+
+#board, destination_deck => the board and the destination deck dict of the map (see parallelRunner.load_map), not changed
+#number_of_games => number of games played at once (slots), a slot starts a new game as soon as its game ends
+#seed => seed of the games, slot n draws its cards from slot_generator(seed, n)
+#variants => variants of the games (the usa rules, with or without the longest route)
+#train_deck => the train deck (see make_train_deck, 12 cards of each color and 14 wilds by default)
+#buffer_size => random numbers generated at once for a slot
+class BatchEnv:
+	def __init__(self, board, destination_deck, number_of_games, number_of_players=2, seed=0, variants=USA_VARIANTS, number_of_trains=45, train_deck=None, buffer_size=256):
+		routes = board.routes
+		if routes.ferries.any() or routes.underground.any() or routes.mountain.any():
+			raise ValueError("BatchEnv can't play maps with ferries, tunnels or mountains")
+		if len(routes.color_names) > len(ROUTE_COLORS):
+			raise ValueError(f"BatchEnv can't play routes of colors {routes.color_names[len(ROUTE_COLORS):]}")
+		if any(variants[5:10]) or variants[18]:
+			raise ValueError("BatchEnv only plays the rules of the usa map")
+		if variants[2] > MAX_PENDING_CARDS:
+			raise ValueError(f"BatchEnv can't draw more than {MAX_PENDING_CARDS} destination cards at once")
+
+		self.number_of_games = number_of_games
+		self.number_of_players = number_of_players
+		self.number_of_trains = number_of_trains
+		self.destination_deck_draw_rules = variants[0:4]
+		self.longest_route_variant = variants[4]
+		self.number_of_train_cards_first_turn = variants[10]
+		self.number_of_face_up_train_cards = variants[11]
+		self.limit_of_face_up_wild_cards = variants[12]
+		self.number_of_leftover_trains_to_end_game = variants[14]
+		self.amount_of_points_longest_route = variants[15]
+		self.number_of_cards_draw_per_turn = variants[17]
+		self.buffer_size = buffer_size
+
+		#routes
+		self.number_of_routes = routes.number_of_routes
+		self.route_city1 = routes.city1
+		self.route_city2 = routes.city2
+		self.route_length = routes.length
+		self.route_pair = routes.pair
+		table = point_table()
+		self.route_points = np.array([table[length] for length in routes.length.tolist()], dtype=np.int32)
+		#claim_colors[route] => bits of the colors that can claim the route (bit c for color id c), 0 for the route after
+		#the last one (the route of earlier_routes when there are no more)
+		claimable = (routes.color[:, None] == np.arange(NUMBER_OF_CLAIM_COLORS)) | (routes.color[:, None] == GRAY)
+		self.claim_colors = np.zeros(self.number_of_routes + 1, dtype=np.uint8)
+		self.claim_colors[:-1] = np.packbits(claimable, axis=1, bitorder='little')[:, 0]
+		#claims are checked against the hands for every length up to the longest route
+		self.lengths = np.arange(routes.length.max() + 1)
+		#earlier_routes[route] => the routes of the same pair of cities that come before it (a color claims the first free one)
+		most_routes = max(len(pair_routes) for pair_routes in routes.pair_routes)
+		self.earlier_routes = np.full((self.number_of_routes, most_routes - 1), self.number_of_routes, dtype=np.int32)
+		for pair_routes in routes.pair_routes:
+			for (i, route) in enumerate(pair_routes):
+				self.earlier_routes[route, :i] = pair_routes[:i]
+
+		#destination cards, numbered in the order of the deck dict (the order cards are drawn from)
+		#cities of destination cards that are not on the map come after the cities of the map
+		self.destination_cards = list(destination_deck)
+		cities = list(routes.cities)
+		city_index = dict(routes.city_index)
+		for card in self.destination_cards:
+			if not isinstance(destination_deck[card], int) or hasattr(card, 'type'):
+				raise ValueError("BatchEnv only plays destination cards between two cities")
+			for city in card.destinations:
+				if city not in city_index:
+					city_index[city] = len(cities)
+					cities.append(city)
+		self.cities = cities
+		self.ticket_city1 = np.array([city_index[card.destinations[0]] for card in self.destination_cards], dtype=np.int32)
+		self.ticket_city2 = np.array([city_index[card.destinations[1]] for card in self.destination_cards], dtype=np.int32)
+		self.ticket_points = np.array([card.points for card in self.destination_cards], dtype=np.int32)
+		self.ticket_counts = np.array([destination_deck[card] for card in self.destination_cards], dtype=np.int32)
+
+		train_deck = train_deck or make_train_deck(number_of_color_cards=12, number_of_wildcards=14)
+		self.train_deck_counts = np.zeros(NO_CARD + 1, dtype=np.int32)
+		self.train_deck_order = np.full(NO_CARD, NO_CARD, dtype=np.int32)
+		for (i, (card, count)) in enumerate(train_deck.items()):
+			self.train_deck_counts[HAND_INDEX[card]] = count
+			self.train_deck_order[i] = HAND_INDEX[card]
+
+		self.offsets = action_offsets(self.number_of_routes)
+		self.action_space_size = self.offsets[-1]
+		#number of cards kept by every chooseDestinationCards action
+		self.choice_sizes = np.array([bin(cards).count('1') for cards in range(1, 1 << MAX_PENDING_CARDS)], dtype=np.int32)
+
+		(N, P, R) = (number_of_games, number_of_players, self.number_of_routes)
+		#owner of every route (-1 if free), route pairs claimed (to lock double routes) and claimed by each player
+		self.owner = np.full((N, R), -1, dtype=np.int8)
+		self.pair_claims = np.zeros((N, routes.number_of_pairs), dtype=np.int32)
+		self.player_pairs = np.zeros((N, P, routes.number_of_pairs), dtype=bool)
+		#cards of every color in the hands, trains and points of the players
+		self.hand = np.zeros((N, P, len(HAND_COLORS)), dtype=np.int32)
+		self.trains = np.zeros((N, P), dtype=np.int32)
+		self.points = np.zeros((N, P), dtype=np.int32)
+		#train deck: cards of every color (plus the NO_CARD column) and the colors in the order of the keys of the deck dict
+		#(the order cards are drawn from), padded with NO_CARD. Same for the discard pile (keys in the order cards were discarded)
+		self.deck = np.zeros((N, NO_CARD + 1), dtype=np.int32)
+		self.deck_order = np.zeros((N, NO_CARD), dtype=np.int32)
+		self.deck_keys = np.zeros(N, dtype=np.int32)
+		self.deck_total = np.zeros(N, dtype=np.int32)
+		self.discard = np.zeros((N, NO_CARD + 1), dtype=np.int32)
+		self.discard_order = np.zeros((N, NO_CARD), dtype=np.int32)
+		self.discard_keys = np.zeros(N, dtype=np.int32)
+		self.discard_total = np.zeros(N, dtype=np.int32)
+		self.face_up = np.zeros((N, len(HAND_COLORS)), dtype=np.int32)
+		#destination deck: cards left of every destination card
+		self.tickets = np.zeros((N, len(self.destination_cards)), dtype=np.int32)
+		self.tickets_left = np.zeros(N, dtype=np.int32)
+		#destination cards kept and completed (as in Player.completed_destination_cards) by the players, and the ones
+		#drawn but not chosen yet (-1 after the last one)
+		self.kept = np.zeros((N, P, len(self.destination_cards)), dtype=bool)
+		self.completed = np.zeros((N, P, len(self.destination_cards)), dtype=bool)
+		self.pending = np.full((N, P, MAX_PENDING_CARDS), -1, dtype=np.int32)
+		self.pending_count = np.zeros((N, P), dtype=np.int32)
+		#the cities connected by the routes of a player have the same label (like Player.connections)
+		self.components = np.zeros((N, P, len(self.cities)), dtype=np.int32)
+		self.current = np.zeros(N, dtype=np.int32)
+		self.last_turn_player = np.zeros(N, dtype=np.int32)
+		self.number_of_current_draws = np.zeros(N, dtype=np.int32)
+		self.drawing_train_cards = np.zeros((N, P), dtype=bool)
+		#player of the next action of every game and its legal actions (see update_actions)
+		self.player = np.zeros(N, dtype=np.int32)
+		self.mask = np.zeros((N, self.action_space_size), dtype=bool)
+
+		self.generators = [slot_generator(seed, n) for n in range(N)]
+		self.random_numbers = np.zeros((N, buffer_size))
+		self.next_random_number = np.full(N, buffer_size, dtype=np.int64)
+
+		self.reset(np.arange(N))
+		self.update_actions()
+
+	#returns the observations of the players of the next actions: dict of arrays with one row per game
+	#(the board and the cards everyone sees, plus the hand and the destination cards of the player)
+	def observe(self):
+		games = np.arange(self.number_of_games)
+		return {
+			'player': self.player.copy(),
+			'owner': self.owner.copy(),
+			'trains': self.trains.copy(),
+			'points': self.points.copy(),
+			'hand_sizes': self.hand.sum(axis=2),
+			'face_up': self.face_up.copy(),
+			'deck': self.deck_total.copy(),
+			'destination_deck': self.tickets_left.copy(),
+			'hand': self.hand[games, self.player],
+			'kept': self.kept[games, self.player],
+			'completed': self.completed[games, self.player],
+			'pending': self.pending[games, self.player],
+		}
+
+	#makes one action in every game, actions => action of every game (legal in self.mask)
+	#returns (observations, rewards, masks, done, info): rewards => points won by every player of every game with the action,
+	#done => the games that ended (their slots have a new game already), info['final_points'] => points of the players
+	#at the end of the games that ended, info['failed'] => games that ended because the player had no legal action
+	#(GameHandler counts those as run failures, they aren't scored)
+	def step(self, actions):
+		actions = np.asarray(actions)
+		games = np.arange(self.number_of_games)
+		if not self.mask[games, actions].all():
+			raise ValueError(f"Illegal actions in games {np.flatnonzero(~self.mask[games, actions]).tolist()}")
+
+		(claim, top, face_up, draw_destinations, choose, size) = self.offsets
+		points = self.points.copy()
+		#choosing destination cards isn't a move (see Game.make_move), so it never ends the game
+		last_turn = (actions < choose) & (self.current == self.last_turn_player)
+
+		claims = np.flatnonzero(actions < top)
+		self.claim_routes(claims, actions[claims] // NUMBER_OF_CLAIM_COLORS, actions[claims] % NUMBER_OF_CLAIM_COLORS)
+		draws = np.flatnonzero((actions >= top) & (actions < draw_destinations))
+		self.draw_train_card(draws, np.where(actions[draws] == top, -1, actions[draws] - face_up))
+		self.draw_destination_cards(np.flatnonzero(actions == draw_destinations))
+		choices = np.flatnonzero(actions >= choose)
+		self.choose_destination_cards(choices, actions[choices] - choose + 1)
+
+		for n in np.flatnonzero(last_turn).tolist():
+			self.calculate_points(n)
+		rewards = self.points - points
+		final_points = self.points.copy()
+		self.reset(np.flatnonzero(last_turn))
+		self.update_actions()
+
+		failed = ~self.mask.any(axis=1)
+		if failed.any():
+			self.reset(np.flatnonzero(failed))
+			self.update_actions()
+		return (self.observe(), rewards, self.mask.copy(), last_turn | failed, {'final_points': final_points, 'failed': failed})
+
+	#starts new games in the slots games (setup of Game)
+	def reset(self, games):
+		if len(games) == 0:
+			return
+		self.owner[games] = -1
+		self.pair_claims[games] = 0
+		self.player_pairs[games] = False
+		self.hand[games] = 0
+		self.trains[games] = self.number_of_trains
+		self.points[games] = 0
+		self.deck[games] = self.train_deck_counts
+		self.deck_order[games] = self.train_deck_order
+		self.deck_keys[games] = np.count_nonzero(self.train_deck_order != NO_CARD)
+		self.deck_total[games] = self.train_deck_counts.sum()
+		self.discard[games] = 0
+		self.discard_order[games] = NO_CARD
+		self.discard_keys[games] = 0
+		self.discard_total[games] = 0
+		self.face_up[games] = 0
+		self.tickets[games] = self.ticket_counts
+		self.tickets_left[games] = self.ticket_counts.sum()
+		self.kept[games] = False
+		self.completed[games] = False
+		self.pending[games] = -1
+		self.pending_count[games] = 0
+		self.components[games] = np.arange(len(self.cities))
+		self.last_turn_player[games] = -1
+		self.number_of_current_draws[games] = 0
+		self.drawing_train_cards[games] = False
+
+		for p in range(self.number_of_players):
+			for j in range(self.number_of_train_cards_first_turn):
+				self.hand[games, p, self.draw_train_cards(games)] += 1
+			for j in range(self.destination_deck_draw_rules[0]):
+				self.pending[games, p, j] = self.draw_tickets(games)
+			self.pending_count[games, p] = self.destination_deck_draw_rules[0]
+		#rng.choice of the players
+		self.current[games] = (self.random(games) * self.number_of_players).astype(np.int32)
+
+		for i in range(self.number_of_face_up_train_cards):
+			self.add_face_up_train_cards(games)
+
+	#returns the next random number in [0, 1) of the generator of every slot of games
+	def random(self, games):
+		for n in games[self.next_random_number[games] == self.buffer_size].tolist():
+			self.random_numbers[n] = self.generators[n].random(self.buffer_size)
+			self.next_random_number[n] = 0
+		numbers = self.random_numbers[games, self.next_random_number[games]]
+		self.next_random_number[games] += 1
+		return numbers
+
+	#draws a train card in every game of games (Game.draw_card) and returns their colors
+	#a card is picked with one random number per draw, the same way CardManager.draw_card does:
+	#the first color (in the order of the keys of the deck) whose cumulative count is bigger than random number * total
+	def draw_train_cards(self, games):
+		cumulative = np.cumsum(np.take_along_axis(self.deck[games], self.deck_order[games], axis=1), axis=1)
+		seeds = self.random(games) * self.deck_total[games]
+		cards = self.deck_order[games, (cumulative <= seeds[:, None]).sum(axis=1)]
+		self.deck[games, cards] -= 1
+		self.deck_total[games] -= 1
+		self.reshuffle(games[self.deck_total[games] == 0])
+		return cards
+
+	#puts the discard piles back in the train decks of games (CardManager.reshuffle)
+	def reshuffle(self, games):
+		if len(games) == 0:
+			return
+		self.deck[games] = self.discard[games]
+		self.deck_order[games] = self.discard_order[games]
+		self.deck_keys[games] = self.discard_keys[games]
+		self.deck_total[games] = self.discard_total[games]
+		self.discard[games] = 0
+		self.discard_order[games] = NO_CARD
+		self.discard_keys[games] = 0
+		self.discard_total[games] = 0
+
+	#discards numbers[i] cards of color cards[i] in game games[i]
+	def discard_cards(self, games, cards, numbers):
+		new = self.discard[games, cards] == 0
+		self.discard_order[games[new], self.discard_keys[games[new]]] = cards[new]
+		self.discard_keys[games[new]] += 1
+		self.discard[games, cards] += numbers
+		self.discard_total[games] += numbers
+
+	#draws a destination card in every game of games (the same way as draw_train_cards) and returns their ids
+	def draw_tickets(self, games):
+		cumulative = np.cumsum(self.tickets[games], axis=1)
+		seeds = self.random(games) * self.tickets_left[games]
+		tickets = (cumulative <= seeds[:, None]).sum(axis=1)
+		self.tickets[games, tickets] -= 1
+		self.tickets_left[games] -= 1
+		return tickets
+
+	#adds a face up card in every game of games that has cards in its deck (Game.addFaceUpTrainCard)
+	#with too many face up wild cards, the face up cards are discarded and dealt again
+	def add_face_up_train_cards(self, games):
+		games = games[self.deck_keys[games] > 0]
+		if len(games) == 0:
+			return
+		self.face_up[games, self.draw_train_cards(games)] += 1
+
+		full = self.face_up[games].sum(axis=1) == self.number_of_face_up_train_cards
+		too_many_wilds = self.face_up[games, WILD] > self.limit_of_face_up_wild_cards
+		enough_cards = self.deck_total[games] + self.discard_total[games] > self.number_of_face_up_train_cards
+		again = games[full & too_many_wilds & enough_cards]
+		if len(again) > 0:
+			#CardManager.discard of the face up dict discards one card of each of its keys
+			for card in range(len(HAND_COLORS)):
+				self.discard_cards(again, np.full(len(again), card), np.ones(len(again), dtype=np.int32))
+			self.face_up[again] = 0
+			for i in range(self.number_of_face_up_train_cards):
+				self.add_face_up_train_cards(again)
+
+	#passes the turn in games
+	def next_players_turn(self, games):
+		self.current[games] = (self.current[games] + 1) % self.number_of_players
+
+	#claims route routes[i] with cards of color colors[i] in game games[i] (Game.claimRoute)
+	def claim_routes(self, games, routes, colors):
+		if len(games) == 0:
+			return
+		players = self.current[games]
+		lengths = self.route_length[routes]
+		colored = np.minimum(self.hand[games, players, colors], lengths)
+		wilds = lengths - colored
+		self.hand[games, players, colors] -= colored
+		self.hand[games, players, WILD] -= wilds
+		self.discard_cards(games[colored > 0], colors[colored > 0], colored[colored > 0])
+		self.discard_cards(games[wilds > 0], np.full(np.count_nonzero(wilds), WILD), wilds[wilds > 0])
+
+		self.trains[games, players] -= lengths
+		self.owner[games, routes] = players
+		self.points[games, players] += self.route_points[routes]
+		pairs = self.route_pair[routes]
+		self.pair_claims[games, pairs] += 1
+		self.player_pairs[games, players, pairs] = True
+
+		components = self.components[games, players]
+		rows = np.arange(len(games))
+		(label1, label2) = (components[rows, self.route_city1[routes]], components[rows, self.route_city2[routes]])
+		components = np.where(components == label2[:, None], label1[:, None], components)
+		self.components[games, players] = components
+		connected = components[:, self.ticket_city1] == components[:, self.ticket_city2]
+		self.completed[games, players] |= self.kept[games, players] & connected
+
+		last = self.trains[games, players] <= self.number_of_leftover_trains_to_end_game
+		self.last_turn_player[games[last]] = players[last]
+		self.next_players_turn(games)
+
+	#draws the train card cards[i] (a color id, -1 for the top card of the deck) in game games[i] (Game.drawTrainCard)
+	def draw_train_card(self, games, cards):
+		if len(games) == 0:
+			return
+		players = self.current[games]
+		self.reshuffle(games[self.deck_total[games] == 0])
+
+		#a face up wild card as the first card of the turn is the whole turn
+		wild = (cards == WILD) & (self.number_of_current_draws[games] + 1 < self.number_of_cards_draw_per_turn) & (self.face_up[games, WILD] > 0) & ~self.drawing_train_cards[games, players]
+		first_wilds = games[wild]
+		if len(first_wilds) > 0:
+			self.hand[first_wilds, players[wild], WILD] += 1
+			self.face_up[first_wilds, WILD] -= 1
+			self.number_of_current_draws[first_wilds] += 2
+			self.add_face_up_train_cards(first_wilds)
+			turn_over = first_wilds[self.number_of_current_draws[first_wilds] == self.number_of_cards_draw_per_turn]
+			self.number_of_current_draws[turn_over] = 0
+			self.next_players_turn(turn_over)
+			drawing = first_wilds[self.number_of_current_draws[first_wilds] + 1 == self.number_of_cards_draw_per_turn]
+			self.drawing_train_cards[drawing, self.current[drawing]] = True
+
+		(games, cards, players) = (games[~wild], cards[~wild], players[~wild])
+		top = cards < 0
+		if top.any():
+			self.hand[games[top], players[top], self.draw_train_cards(games[top])] += 1
+		face_up = games[~top]
+		if len(face_up) > 0:
+			self.hand[face_up, players[~top], cards[~top]] += 1
+			self.face_up[face_up, cards[~top]] -= 1
+		self.number_of_current_draws[games] += 1
+		self.add_face_up_train_cards(face_up)
+
+		#the turn ends when the deck runs out, or after the second card
+		empty = self.deck_total[games] == 0
+		turn_over = (top & empty) | (empty & (self.face_up[games].sum(axis=1) == 0))
+		second = ~turn_over & self.drawing_train_cards[games, players]
+		self.drawing_train_cards[games[second], players[second]] = False
+		turn_over |= second
+		drawing = ~turn_over & (self.number_of_current_draws[games] + 1 == self.number_of_cards_draw_per_turn)
+		self.drawing_train_cards[games[drawing], players[drawing]] = True
+		self.number_of_current_draws[games[turn_over]] = 0
+		self.next_players_turn(games[turn_over])
+
+	#draws destination cards for the current players of games (Game.drawDestinationCards), they choose them next
+	def draw_destination_cards(self, games):
+		players = self.current[games]
+		numbers = np.minimum(self.destination_deck_draw_rules[2], self.tickets_left[games])
+		for i in range(self.destination_deck_draw_rules[2]):
+			drawing = numbers > i
+			self.pending[games[drawing], players[drawing], i] = self.draw_tickets(games[drawing])
+		self.pending_count[games, players] = numbers
+
+	#keeps the pending destination cards of the bits of choices[i] (see Game.action_offsets) in game games[i]
+	#(Game.choose_destination_cards for self.player), the other pending cards leave the game
+	def choose_destination_cards(self, games, choices):
+		players = self.player[games]
+		for i in range(MAX_PENDING_CARDS):
+			keep = (choices >> i) & 1 == 1
+			self.kept[games[keep], players[keep], self.pending[games[keep], players[keep], i]] = True
+		self.pending[games, players] = -1
+		self.pending_count[games, players] = 0
+
+	#adds the points of the end of game n (Game.calculatePoints)
+	#the longest route is found from the routes of the players and their components, without building graphs
+	def calculate_points(self, n):
+		longest_route_value = None
+		longest_route_player = []
+		owner = self.owner[n]
+		for p in range(self.number_of_players):
+			tickets = np.flatnonzero(self.kept[n, p])
+			components = self.components[n, p]
+			connected = components[self.ticket_city1[tickets]] == components[self.ticket_city2[tickets]]
+			self.points[n, p] += np.where(connected, self.ticket_points[tickets], -self.ticket_points[tickets]).sum()
+
+			if self.longest_route_variant:
+				owned = owner == p
+				routes = zip(self.route_city1[owned].tolist(), self.route_city2[owned].tolist(), self.route_length[owned].tolist())
+				#None if the player can't reach the longest route found so far
+				temp = longestTrailOfComponents(routeTrailComponents(routes, components.tolist()), longest_route_value)
+				if temp is not None and (longest_route_value is None or temp >= longest_route_value):
+					if longest_route_value is None or temp > longest_route_value:
+						longest_route_player = [p]
+					else:
+						longest_route_player.append(p)
+					longest_route_value = temp
+
+		for p in longest_route_player:
+			self.points[n, p] += self.amount_of_points_longest_route
+
+	#sets self.player and self.mask: the player of the next action of every game (the first player with pending
+	#destination cards, else the current player) and its legal actions (the same as Game.legal_action_mask)
+	def update_actions(self):
+		(claim, top, face_up, draw_destinations, choose, size) = self.offsets
+		games = np.arange(self.number_of_games)
+		has_pending = self.pending_count > 0
+		choosing = has_pending.any(axis=1)
+		self.player = players = np.where(choosing, has_pending.argmax(axis=1), self.current).astype(np.int32)
+		mask = np.zeros((self.number_of_games, size), dtype=bool)
+
+		kept = self.kept[games, players].sum(axis=1)
+		incomplete = kept - self.completed[games, players].sum(axis=1)
+		#players choose their first destination cards before they keep any
+		min_num_cards = np.where(kept > 0, self.destination_deck_draw_rules[3], self.destination_deck_draw_rules[1])
+		choices = np.arange(1, 1 << MAX_PENDING_CARDS)
+		mask[:, choose:] = choosing[:, None] & (choices < (1 << self.pending_count[games, players])[:, None]) & (self.choice_sizes >= min_num_cards[:, None]) & (incomplete[:, None] + self.choice_sizes <= MAX_INCOMPLETE_DESTINATION_CARDS)
+
+		#a player that drew a card draws another one, unless the deck is empty
+		can_draw = self.deck_total > 0
+		drawing = ~choosing & self.drawing_train_cards[games, players] & can_draw
+		mask[:, top] = ~choosing & can_draw
+		mask[:, face_up:draw_destinations] = ~choosing[:, None] & (self.face_up > 0)
+		mask[drawing, face_up + WILD] = False
+
+		moving = ~choosing & ~drawing
+		mask[:, draw_destinations] = moving & (self.tickets_left > 0) & (incomplete + self.destination_deck_draw_rules[3] <= MAX_INCOMPLETE_DESTINATION_CARDS)
+
+		#claimRoute: a color claims the first free route of a pair it can claim, if the pair isn't locked
+		#the colors of every route are bits, so all routes of all games are checked with one uint8 array
+		#(columns are gathered with np.take, which is much faster than indexing with an array on these shapes)
+		free = np.concatenate([self.owner < 0, np.zeros((self.number_of_games, 1), dtype=bool)], axis=1)
+		claimable = moving[:, None] & free[:, :-1] & ~np.take(self.player_pairs[games, players], self.route_pair, axis=1) & (self.trains[games, players][:, None] >= self.route_length)
+		if self.number_of_players < 4:
+			claimable &= np.take(self.pair_claims, self.route_pair, axis=1) == 0
+		hands = self.hand[games, players]
+		#affordable[game, length] => bits of the colors the player has (with wilds) length cards of
+		#(the NUMBER_OF_CLAIM_COLORS bits of a length are consecutive, so the flat array packs into one byte per length)
+		affordable = np.packbits((hands[:, None, :NUMBER_OF_CLAIM_COLORS] + hands[:, None, WILD, None] >= self.lengths[None, :, None]).reshape(-1), bitorder='little').reshape(self.number_of_games, len(self.lengths))
+		colors = (np.take(affordable, self.route_length, axis=1) & self.claim_colors[:-1]) * claimable
+		for earlier in self.earlier_routes.T:
+			colors &= ~(self.claim_colors[earlier] * np.take(free, earlier, axis=1))
+		mask[:, claim:top] = np.unpackbits(colors, axis=1, bitorder='little').view(bool)
+		self.mask = mask
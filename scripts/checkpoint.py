@@ -0,0 +1,42 @@
+import os
+import random
+import numpy as np
+
+#training checkpoints of an ApproximateQLearningAgent: a numpy .npz file with the Q-table, the number of games played,
+#epsilon, the score of every game and the state of the random generator, so a run can go on exactly where it stopped
+#checkpoints are written to a temporary file that then replaces the old one, so a crash never leaves a broken checkpoint
+
+#writes the checkpoint of agent after game_no games
+#scores => score of every game played so far, rng => random generator of the games (the random module by default)
+def save_checkpoint(filename, agent, game_no, scores, rng=random):
+	(version, internal_state, gauss_next) = rng.getstate()
+	temp_filename = filename + '.tmp'
+	with open(temp_filename, 'wb') as f:
+		np.savez(f,
+			qvalues=agent.qvalues,
+			agent_names=np.array(agent.agent_names),
+			game_no=game_no,
+			epsilon=agent.epsilon,
+			scores=np.asarray(scores, dtype=np.int64),
+			random_version=version,
+			random_state=np.array(internal_state, dtype=np.uint32),
+			random_gauss_next=np.nan if gauss_next is None else gauss_next)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(temp_filename, filename)
+
+#loads a checkpoint into agent (and rng), returns (game_no, scores)
+#the Q-values files of older runs (q_values*.txt) can be loaded too: they only have Q-values, so they start at game 0
+def load_checkpoint(filename, agent, rng=random):
+	if filename.endswith('.txt'):
+		agent.load_qvalues_file(filename)
+		return (0, [])
+
+	with np.load(filename, allow_pickle=False) as checkpoint:
+		qvalues = checkpoint['qvalues']
+		for (i, ag_name) in enumerate(checkpoint['agent_names'].tolist()):
+			agent.qvalues[:, agent.agent_ids[ag_name]] = qvalues[:, i]
+		agent.epsilon = float(checkpoint['epsilon'])
+		gauss_next = float(checkpoint['random_gauss_next'])
+		rng.setstate((int(checkpoint['random_version']), tuple(checkpoint['random_state'].tolist()), None if np.isnan(gauss_next) else gauss_next))
+		return (int(checkpoint['game_no']), checkpoint['scores'].tolist())
@@ -0,0 +1,113 @@
+import random
+import numpy as np
+from ttrengine import Game, Player, emptyCardDict, make_train_deck, point_table
+
+#compact records of games: the seeds and rules of the game plus one integer per move, instead of pickled Game objects
+#a game is replayed by making the same game again (same seed, same rules) and making the moves again with make_move,
+#so a record can only be replayed if the random generator of the game was only used by the game:
+#the agents need their own generator (GameHandler rng, see parallelRunner.play_game)
+#every move is kept as its move code (see pack_move and Game.move_code)
+
+#seed => seed of the random generator of the game, deck_seed => deck_seed of the game (None if the decks weren't shuffled piles)
+#map_name => map of parallelRunner.MAPS, variants => variants of the game, number_of_trains => trains of each player
+class GameRecord:
+	def __init__(self, seed, map_name, variants, number_of_players, number_of_trains=45, deck_seed=None):
+		self.seed = seed
+		self.deck_seed = deck_seed
+		self.map_name = map_name
+		self.variants = list(variants)
+		self.number_of_players = number_of_players
+		self.number_of_trains = number_of_trains
+		#move codes of the moves, in the order they were made (see add_move)
+		self.moves = []
+		#points of every player at the end of the game (to check replays), None until set
+		self.final_points = None
+
+	#called by Game.make_move and Game.choose_destination_cards (with args [player, cards]) before the move is made
+	def add_move(self, game, move, args):
+		self.moves.append(game.move_code(move, args))
+
+	#returns the game of the record before its first move (after setup)
+	#board, destination_deck => board and destination deck dict of the map (they are copied)
+	def new_game(self, board, destination_deck):
+		players = [Player(hand=emptyCardDict(), number_of_trains=self.number_of_trains, points=0) for i in range(self.number_of_players)]
+		game = Game(board=board.copy(), point_table=point_table(), destination_deck=destination_deck.copy(), train_deck=make_train_deck(number_of_color_cards=12, number_of_wildcards=14), players=players, current_player=0, variants=self.variants, rng=random.Random(self.seed), deck_seed=self.deck_seed)
+		game.setup()
+		return game
+
+#makes the move of a move code on game, the same way the recorded game made it
+#destination cards are chosen with the least number of cards of the rules of the game (see Game.min_destination_cards)
+def apply_move(game, code):
+	move = game.code_move(code)
+	if move.function == 'chooseDestinationCards':
+		(player, cards) = move.args
+		game.choose_destination_cards(player, cards, game.min_destination_cards(player))
+	else:
+		game.make_move(move.function, move.args)
+
+#returns a copy of game with its own random generator (in the same state), so it can be played on without changing game
+def snapshot(game):
+	g = game.copy()
+	rng = random.Random()
+	rng.setstate(game.rng.getstate())
+	g.rng = g.train_deck.rng = g.destination_deck.rng = rng
+	return g
+
+#replays a record, keeping a snapshot of the game every snapshot_every moves so any point of the game can be reached
+#by replaying at most snapshot_every moves
+class Replay:
+	def __init__(self, record, board, destination_deck, snapshot_every=32):
+		self.record = record
+		self.snapshot_every = snapshot_every
+		#move number => game before that move
+		self.snapshots = {0: record.new_game(board, destination_deck)}
+
+	#returns the game after the first move_no moves of the record (a new game that can be changed freely)
+	def seek(self, move_no):
+		move_no = min(move_no, len(self.record.moves))
+		start = max(n for n in self.snapshots if n <= move_no)
+		game = snapshot(self.snapshots[start])
+		for n in range(start, move_no):
+			apply_move(game, self.record.moves[n])
+			if (n + 1) % self.snapshot_every == 0 and (n + 1) not in self.snapshots:
+				self.snapshots[n + 1] = snapshot(game)
+		return game
+
+	#returns the game at the end of the record, raises ValueError if the points differ from the recorded ones
+	def final_game(self):
+		game = self.seek(len(self.record.moves))
+		points = [p.points for p in game.players]
+		if self.record.final_points is not None and points != self.record.final_points:
+			raise ValueError(f"Replay ended with points {points} instead of {self.record.final_points}")
+		return game
+
+#writes many records to one .npz file: the moves of all games one after another and where the moves of each game start
+def save_records(filename, records):
+	lengths = [len(r.moves) for r in records]
+	max_players = max([r.number_of_players for r in records], default=0)
+	np.savez_compressed(filename,
+		seeds=np.array([r.seed for r in records], dtype=np.int64),
+		deck_seeds=np.array([-1 if r.deck_seed is None else r.deck_seed for r in records], dtype=np.int64),
+		map_names=np.array([r.map_name for r in records]),
+		variants=np.array([[int(v) for v in r.variants] for r in records], dtype=np.int32),
+		players=np.array([[r.number_of_players, r.number_of_trains] for r in records], dtype=np.int32),
+		#padded with zeros up to the most players of a game (and all zeros if the game has no final points)
+		final_points=np.array([(r.final_points or [0] * r.number_of_players) + [0] * (max_players - r.number_of_players) for r in records], dtype=np.int32).reshape(len(records), max_players),
+		offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+		moves=np.array([code for r in records for code in r.moves], dtype=np.int32))
+
+#returns the records of a file written with save_records
+def load_records(filename):
+	records = []
+	with np.load(filename, allow_pickle=False) as f:
+		offsets = f['offsets']
+		moves = f['moves']
+		for i in range(len(f['seeds'])):
+			(number_of_players, number_of_trains) = f['players'][i].tolist()
+			deck_seed = int(f['deck_seeds'][i])
+			record = GameRecord(int(f['seeds'][i]), str(f['map_names'][i]), f['variants'][i].tolist(), number_of_players, number_of_trains, None if deck_seed < 0 else deck_seed)
+			record.moves = moves[offsets[i]:offsets[i + 1]].tolist()
+			record.final_points = f['final_points'][i, :number_of_players].tolist()
+			records.append(record)
+	return records
+
@@ -1,5 +1,4 @@
 import operator
-import random
 import networkx as nx
 from agent import Agent
 
@@ -11,26 +10,37 @@ class HungryAgent(Agent):
 		self.current_threshold = 0
 		self.list_of_cities = []
 		self.d_points = 0
+		self.observed_destinations = None
+
+	#keeps the cities of the destination cards up to date (used by choose_destination_cards)
+	#and generates the plan again on the next decide when the destination cards changed
+	def observe(self, game, pnum):
+		if self.destinations_changed(game, pnum):
+			self.players_previous_points = -1
+		self.set_destination_cities(game, pnum, self.joint_graph(game, pnum))
+
+	#the cities (and total points) of the destination cards that can still be completed
+	def set_destination_cities(self, game, pnum, joint_graph):
+		self.list_of_cities = []
+		self.d_points = 0
+		for d in game.players[pnum].hand_destination_cards:
+			if d.destinations[0] in joint_graph and d.destinations[1] in joint_graph:
+				self.list_of_cities.extend(d.destinations)
+				self.d_points += d.points
 
 	def decide(self, game, pnum):
 		possible_moves = game.get_possible_moves(pnum)
 		try:
 			assert len(possible_moves) > 0
 		except AssertionError as e:
-			print(f"No moves left to make because train deck {sum(game.train_deck.deck.values())} train deck discard {sum(game.train_deck.discard_pile.values())} destination deck {sum(game.destination_deck.deck.values())}")
+			print(f"No moves left to make because train deck {game.train_deck.remaining()} train deck discard {game.train_deck.discarded()} destination deck {game.destination_deck.remaining()}")
 			for i in range(len(game.players)):
 				print(i, game.players[i].hand, game.players[i].hand_destination_cards)
 			return None
 
-		free_connections_graph = self.free_routes_graph(pnum, game.board.graph, game.number_of_players)
+		free_connections_graph = self.free_routes_graph(pnum, game.board, game.number_of_players)
 		joint_graph = self.joint_graph(game, pnum)
-
-		self.list_of_cities = []
-		self.d_points = 0
-		for d in game.players[pnum].hand_destination_cards:
-			if d.destinations[0] in joint_graph and d.destinations[1] in joint_graph:
-				self.list_of_cities.extend(d.destinations)
-				self.d_points += d.points
+		self.set_destination_cities(game, pnum, joint_graph)
 
 		#print '1'
 
@@ -41,7 +51,7 @@ class HungryAgent(Agent):
 			total_current_points += game.players[i].points
 
 		if self.players_previous_points < total_current_points or self.colors_needed == {} or self.routes_by_color == {}:
-			x = self.generate_game_plan(self.list_of_cities, joint_graph)
+			x = self.generate_game_plan(self.list_of_cities, joint_graph, self.path_oracle(game, pnum))
 			self.colors_needed = x[3]
 			self.routes_by_color = x[2]
 			self.players_previous_points = total_current_points
@@ -110,26 +120,17 @@ class HungryAgent(Agent):
 		#print 'ROUTES TO TAKE: ' + str(routes_to_take)
 		if len(routes_to_take) > 0:
 			#print 'AQUI'
+			pair_index = game.board.routes.pair_index
 			for (route, move) in routes_to_take:
-				if route[0] < route[1]:
-					temp1 = route[0]
-					temp2 = route[1]
-				else:
-					temp1 = route[1]
-					temp2 = route[0]
-
-				#print [temp1, temp2]
-				#print route[2]
-				#print "TEMP1: " + str(temp1) + " TEMP2: " + str(temp2) + " COLOR: " + route[2]
-				#print [temp1, temp2] in self.routes_by_color[route[2]]
+				pair = pair_index[(route[0], route[1])]
 
-				if [temp1, temp2] in self.routes_by_color[route[2]] or [temp2, temp1] in self.routes_by_color[route[2]]:
-					assert move is not None, f"{temp1} {temp2}"
+				if pair in self.routes_by_color[route[2]]:
+					assert move is not None, f"{route[0]} {route[1]}"
 					return move
 
-				if [temp1, temp2] in self.routes_by_color['GRAY'] or [temp2, temp1] in self.routes_by_color['GRAY']:
+				if pair in self.routes_by_color['GRAY']:
 					if self.colors_needed[route[2]] <= 0:
-						assert move is not None, f"{temp1} {temp2}"
+						assert move is not None, f"{route[0]} {route[1]}"
 						return move
 
 
@@ -159,30 +160,37 @@ class HungryAgent(Agent):
 		if 'TOP' in moves_by_color:
 			return moves_by_color['TOP']
 		
-		return random.choice(possible_moves)
-
-	def generate_game_plan(self, dkey_nodes, G):
+		return self.rng.choice(possible_moves)
+
+	#G => the joint graph of the player
+	#oracle => the path oracle of the player (shortest paths of G)
+	#returns [.., .., color => set of the pair ids (see RouteTable) of the routes to claim with that color, color => number of cards needed]
+	def generate_game_plan(self, dkey_nodes, G, oracle):
+		routes = oracle.routes
+		#the cities of a route are ordered alphabetically
+		ordered = lambda city1, city2: (city1, city2) if routes.city_rank[routes.city_index[city1]] < routes.city_rank[routes.city_index[city2]] else (city2, city1)
 		longest_route = None
 		size_longest_route = 0
 
-		result = {'start': set(), 'end':set()}
+		#dicts used as sets, so the cities are tried in a fixed order (the order of a set of strings depends on PYTHONHASHSEED)
+		result = {'start': {}, 'end': {}}
 
 		for x in range(0, len(dkey_nodes)-1):
 			for y in range(x+1, len(dkey_nodes)):
 				#if dkey_nodes[x] in G:
 				#	if dkey_nodes[y] in G[dkey_nodes[x]]:
 				try:
-					if nx.has_path(G, dkey_nodes[x], dkey_nodes[y]):
-						temp_route_size = nx.dijkstra_path_length(G, dkey_nodes[x], dkey_nodes[y])
+					if oracle.has_path(dkey_nodes[x], dkey_nodes[y]):
+						temp_route_size = oracle.distance(dkey_nodes[x], dkey_nodes[y])
 						if temp_route_size > size_longest_route:
 							size_longest_route = temp_route_size
 							#longest_route = nx.dijkstra_path(G, key_nodes[x], key_nodes[y])
-							result['start'] = set([dkey_nodes[x]])
-							result['end'] = set([dkey_nodes[y]])
+							result['start'] = dict.fromkeys([dkey_nodes[x]])
+							result['end'] = dict.fromkeys([dkey_nodes[y]])
 				except:
 					pass
 
-		key_nodes = list((set(dkey_nodes) - result['start']) - result['end'])
+		key_nodes = [x for x in dict.fromkeys(dkey_nodes) if x not in result['start'] and x not in result['end']]
 		
 		where = ''
 		size_shortest_route = None
@@ -199,7 +207,7 @@ class HungryAgent(Agent):
 			for y in result['start']:
 				#####KEY ERROR
 				try:
-					temp_route_size = nx.dijkstra_path_length(G, x, y)
+					temp_route_size = oracle.distance(x, y)
 					if size_shortest_route == None or temp_route_size < size_shortest_route:
 						size_shortest_route = temp_route_size
 						which = [x, y]
@@ -209,7 +217,7 @@ class HungryAgent(Agent):
 
 			for y in result['end']:
 				try:
-					temp_route_size = nx.dijkstra_path_length(G, x, y)
+					temp_route_size = oracle.distance(x, y)
 					if size_shortest_route == None or temp_route_size < size_shortest_route:
 						size_shortest_route = temp_route_size
 						which = [x, y]
@@ -219,20 +227,15 @@ class HungryAgent(Agent):
 
 			if where == '':
 				return [None, None, None, None]
-			result[where] = result[where] | set([x])
+			result[where] = result[where] | dict.fromkeys([x])
 			try:
-				temp_path = nx.dijkstra_path(G, x, which[1])
+				temp_path = oracle.path(x, which[1])
 			except:
 				temp_path = []
 			#routes.append(temp_path)
 
 			for i in range(0, len(temp_path)-1):
-				if temp_path[i] > temp_path[i+1]:
-					temp1 = temp_path[i+1]
-					temp2 = temp_path[i]
-				else:
-					temp1 = temp_path[i]
-					temp2 = temp_path[i+1]
+				(temp1, temp2) = ordered(temp_path[i], temp_path[i+1])
 
 				if (temp1 not in routes_dict) and (temp2 not in routes_dict):
 					routes_dict[temp1] = [temp2]
@@ -248,24 +251,19 @@ class HungryAgent(Agent):
 		for x in result['start']:
 			for y in result['end']:
 				try:
-					temp_route_size = nx.dijkstra_path_length(G, x, y)
+					temp_route_size = oracle.distance(x, y)
 					if size_shortest_route == None or temp_route_size < size_shortest_route:
 						size_shortest_route = temp_route_size
 						which = [x, y]
 				except:
 					temp_route_size = 0
 		try:		
-			temp_path = nx.dijkstra_path(G, which[0], which[1])
+			temp_path = oracle.path(which[0], which[1])
 		except:
 			temp_path = []
 
 		for i in range(0, len(temp_path)-1):
-			if temp_path[i] > temp_path[i+1]:
-				temp1 = temp_path[i+1]
-				temp2 = temp_path[i]
-			else:
-				temp1 = temp_path[i]
-				temp2 = temp_path[i+1]
+			(temp1, temp2) = ordered(temp_path[i], temp_path[i+1])
 
 			if (temp1 not in routes_dict) and (temp2 not in routes_dict):
 				routes_dict[temp1] = [temp2]
@@ -278,7 +276,7 @@ class HungryAgent(Agent):
 					routes_dict[temp2].append(temp1)	
 
 		colors_needed = {"BLUE": 0, "GREEN": 0, "RED": 0, "PINK": 0, "ORANGE": 0, "BLACK": 0, "YELLOW": 0, "WHITE": 0, "GRAY": 0, "WILD": 0}
-		color_routes = {"BLUE": [], "GREEN": [], "RED": [], "PINK": [], "ORANGE": [], "BLACK": [], "YELLOW": [], "WHITE": [], "GRAY": []}
+		color_routes = {"BLUE": set(), "GREEN": set(), "RED": set(), "PINK": set(), "ORANGE": set(), "BLACK": set(), "YELLOW": set(), "WHITE": set(), "GRAY": set()}
 		double_opt = []
 		point_dict = {1:1, 2:2, 3:4, 4:7, 5:10, 6:15, 8:21, 9:27}
 
@@ -301,7 +299,7 @@ class HungryAgent(Agent):
 					if edge['weight'] > 0:
 						colors_needed[edge['color']] += edge['weight']
 						colors_needed['WILD'] += edge['ferries']
-						color_routes[edge['color']].append([key, x])
+						color_routes[edge['color']].add(routes.pair_index[(key, x)])
 						total_points_from_routes += point_dict[edge['weight']]
 
 		for edge_list in double_opt:
@@ -313,7 +311,7 @@ class HungryAgent(Agent):
 				if colors_needed[color] == 0:
 					colors_needed[color] += weight
 					colors_needed['WILD'] += ferries
-					color_routes[color].append([city1, city2])
+					color_routes[color].add(routes.pair_index[(city1, city2)])
 					total_points_from_routes += point_dict[weight]
 					flag = True
 					break
@@ -326,7 +324,7 @@ class HungryAgent(Agent):
 			if not flag:
 				colors_needed[temp[0]] += temp[1]
 				colors_needed['WILD'] += temp[2]
-				color_routes[temp[0]].append([temp[3], temp[4]])
+				color_routes[temp[0]].add(routes.pair_index[(temp[3], temp[4])])
 				total_points_from_routes += point_dict[weight]
 
 		return [total_points_from_routes, sum(colors_needed.values()), color_routes, colors_needed]
@@ -348,8 +346,8 @@ class HungryAgent(Agent):
 			if min_points == None or points < min_points:
 				min_points = points
 				min_move = m
-			destinations = list(set(destinations))
-			x = self.generate_game_plan(destinations, jgraph)
+			destinations = list(dict.fromkeys(destinations))
+			x = self.generate_game_plan(destinations, jgraph, self.path_oracle(game, pnum))
 			#if x[0] == None or x[1] == None:
 			#	fitness = 0
 			#else:
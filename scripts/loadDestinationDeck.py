@@ -1,17 +1,24 @@
 import re
 
 class DestinationCard:
+	__slots__ = ('destinations', 'points')
+
 	def __init__(self, dest1, dest2, points):
 		self.destinations = [dest1, dest2]
 		self.points = points
 	
-	def __getstate__(self): return self.__dict__
-	def __setstate__(self, d): self.__dict__.update(d)
+	#the state is a dict of the attributes (as in the pickles of older versions, before __slots__)
+	def __getstate__(self): return {name: getattr(self, name) for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())}
+	def __setstate__(self, d):
+		for (name, value) in d.items():
+			setattr(self, name, value)
 
 	def __str__(self):
 		return str(self.destinations) + " " + str(self.points)
 
 class DestinationCountryCard(DestinationCard):
+	__slots__ = ('type',)
+
 	def setType(self, ctype):
 		self.type = ctype
 
@@ -22,57 +29,35 @@ class DestinationCountryCard(DestinationCard):
 #	def setType():
 #		self.type = 'city'
 
-def loaddestinationdeckfromfile(filename):
-	file = open(filename, 'r')
-
-	deck = []
+#a destination line is: city1 points city2
+DESTINATION_LINE = re.compile(r'(.*?) (\d+) (.*)')
+#a country destination line is: city1 followed by one or more "points city2"
+COUNTRY_DESTINATION = re.compile(r'(\d+) (.*?)(?= \d+ |$)')
 
-	line = file.readline()
-	while len(line.strip()) > 0:
-		index = re.search('\d', line).start()
-		index_space = line[index:].index(' ')
-
-		deck.append(DestinationCard(line[:index-1], line[index+index_space+1:].strip(), int(line[index:index+index_space])))
-
-		line = file.readline()
+#yields the lines of a destination file up to the first empty line
+def destination_lines(filename):
+	with open(filename, 'r') as file:
+		for line in file:
+			if len(line.strip()) == 0:
+				break
+			yield line.rstrip('\n')
 
+def loaddestinationdeckfromfile(filename):
+	deck = []
+	for line in destination_lines(filename):
+		(dest1, points, dest2) = DESTINATION_LINE.match(line).groups()
+		deck.append(DestinationCard(dest1, dest2.strip(), int(points)))
 	return deck
 
 def loadcountrydestinationdeck(filename, ctype):
-	file = open(filename, 'r')
-
 	deck = []
+	for line in destination_lines(filename):
+		dest1 = DESTINATION_LINE.match(line).group(1)
+		destinations = COUNTRY_DESTINATION.findall(line[len(dest1) + 1:].strip())
 
-	line = file.readline()
-	while len(line.strip()) > 0:
-		index = re.search('\d', line)
-
-		dest1 = line[:index.start()-1]
-		dests2 = []
-		points = []
-
-		while index:
-			index_space = line[index.start():].index(' ')
-			#index_space2 = line[index_space:].index(' ')
-			temp_index = re.search('\d', line[index.start()+index_space:])
-
-			points.append(int(line[index.start():index.start()+index_space]))
-
-			if temp_index:
-				temp_abs_index = temp_index.start() + index.start() + index_space
-				dests2.append(line[index.start()+index_space+1:temp_abs_index-1].strip())
-			else:
-				dests2.append(line[index.start()+index_space+1:].strip())
-
-			line = line[temp_abs_index:]
-			index = re.search('\d', line)
-
-		obj = DestinationCountryCard(dest1, dests2, points)
+		obj = DestinationCountryCard(dest1, [dest2.strip() for (points, dest2) in destinations], [int(points) for (points, dest2) in destinations])
 		obj.setType(ctype)
 		deck.append(obj)
-
-		line = file.readline()
-
 	return deck
 
 def destinationdeckdict(dest_list, board="usa"):
@@ -1,48 +1,42 @@
 import networkx as nx
 import re
 
-def loadgraphfromfile(filename):
-	file = open(filename, 'r')
-	line = file.readline()
-
+#a route line is: city1 number color city2
+#the number is the length of the route, negative for underground routes (tunnels), with the number of ferries after
+#the point (2.1 => length 2 with 1 ferry), or +mlength for mountain routes (+23 => length 3 with 2 mountains)
+ROUTE_LINE = re.compile(r'(.*?)\s*([+-]?\d+(?:\.\d+)?) (\S*) (.*)')
+
+#returns (city1, city2, attributes) of a route line (see ROUTE_LINE)
+def parse_route(line):
+	(node1, num, color, node2) = ROUTE_LINE.search(line).groups()
+	if num[0] == '+':
+		(weight, mountain) = (float(num[2:]), int(num[1]))
+	else:
+		(weight, mountain) = (float(num), 0)
+	return (node1.strip(), node2.strip(), {'weight': int(abs(weight)), 'color': color, 'mountain': mountain, 'owner': -1, 'underground': weight < 0, 'ferries': int((weight % 1) * 10.0) if (weight % 1) > 0.0 else 0})
+
+#returns the cities and the routes (see parse_route) of a map file: the cities one per line, an empty line, then the routes
+def parse_map_file(filename):
+	with open(filename, 'r') as file:
+		lines = iter(file.readline, '')
+		cities = []
+		for line in lines:
+			if len(line.strip()) == 0:
+				break
+			cities.append(line.strip())
+		routes = []
+		for line in lines:
+			if len(line.strip()) == 0:
+				break
+			routes.append(parse_route(line))
+	return (cities, routes)
+
+def graph_from_routes(cities, routes):
 	G = nx.MultiGraph()
-
-	while len(line.strip()) > 0:
-		G.add_node(line.strip())
-		line = file.readline()
-
-	line = file.readline()
-	while len(line.strip()) > 0:
-		num = re.search('[+-]?\d+(?:\.\d+)?', line).group(0)
-		index = re.search('[+-]?\d+(?:\.\d+)?', line).start()
-		index_after_num = re.search('[+-]?\d+(?:\.\d+)?', line).start() + len(num) - 1
-		index_space = line[index_after_num+2:].index(' ')
-		color = line[index_after_num+2:index_after_num+2+index_space]
-		#print line[index+2:index+2+index_space]]
-		node1 = line[:index].strip() if (line[:index].strip())[-1] != ' ' else line[:index-1].strip()
-		node2 = line[index_after_num+2+index_space:].strip() if (line[index_after_num+2+index_space:].strip())[-1] != ' ' else (line[index_after_num+2+index_space:].strip())[:-1]
-		if num[0] == '+':
-			G.add_edge(node1, node2, weight=float(num[2:]), color=color, mountain=int(num[1]))
-		else:
-			G.add_edge(node1, node2, weight=float(num), color=color, mountain=int(0))
-		line = file.readline()
-
-	for e in G.edges():
-		for me in G[e[0]][e[1]]:
-			G[e[0]][e[1]][me]['owner'] = -1
-			num = G[e[0]][e[1]][me]['weight']
-
-			if num < 0:
-				G[e[0]][e[1]][me]['underground'] = True
-			else:
-				G[e[0]][e[1]][me]['underground'] = False
-			if (num % 1) > 0.0:
-				G[e[0]][e[1]][me]['ferries'] = int((num % 1) * 10.0)
-			else:
-				G[e[0]][e[1]][me]['ferries'] = 0
-
-	for e in G.edges():
-		for me in G[e[0]][e[1]]:
-			G[e[0]][e[1]][me]['weight'] = int(abs(G[e[0]][e[1]][me]['weight']))
-
+	G.add_nodes_from(cities)
+	for (node1, node2, attributes) in routes:
+		G.add_edge(node1, node2, **attributes)
 	return G
+
+def loadgraphfromfile(filename):
+	return graph_from_routes(*parse_map_file(filename))
@@ -0,0 +1,136 @@
+import networkx as nx
+
+#exact solvers for the end of game bonuses that depend on a single continuous route (trail) of a player
+#a trail can go through the same city more than once but can't use the same route twice
+#G => a player graph (networkx Graph with a 'weight' on every edge, see Game.player_graph)
+
+#splits G into its connected components (ignoring cities without routes)
+#every component is (adjacency, total_weight) where adjacency maps each city to a list of (neighbor, edge bit, weight)
+#the edges of a component are numbered so a set of used edges is a bitmask
+def trailComponents(G):
+	components = []
+	for nodes in nx.connected_components(G):
+		adjacency = {node: [] for node in nodes}
+		total_weight = 0
+		bit = 1
+		for (u, v, weight) in G.edges(nodes, data='weight'):
+			adjacency[u].append((v, bit, weight))
+			adjacency[v].append((u, bit, weight))
+			total_weight += weight
+			bit <<= 1
+		if total_weight > 0:
+			components.append((adjacency, total_weight))
+	return components
+
+#same as trailComponents for a list of routes (city1, city2, weight) instead of a graph
+#labels => the component of every city (connected cities have the same label, like BatchEnv.components)
+def routeTrailComponents(routes, labels):
+	#label => [adjacency, total weight, bit of the next edge]
+	components = {}
+	for (u, v, weight) in routes:
+		component = components.get(labels[u])
+		if component is None:
+			component = components[labels[u]] = [{}, 0, 1]
+		(adjacency, total_weight, bit) = component
+		adjacency.setdefault(u, []).append((v, bit, weight))
+		adjacency.setdefault(v, []).append((u, bit, weight))
+		component[1] = total_weight + weight
+		component[2] = bit << 1
+	return [(adjacency, total_weight) for (adjacency, total_weight, bit) in components.values() if total_weight > 0]
+
+#returns the cities a longest trail of a component can start from
+#a trail that can't be extended always starts at a city with an odd number of routes, unless every city has an even
+#number of routes (then the whole component can be travelled in one trail). Returns [] in that case
+def trailStarts(adjacency):
+	return [node for node in adjacency if len(adjacency[node]) % 2 == 1]
+
+#returns the weight of the longest trail of a connected component
+def longestTrailInComponent(adjacency, total_weight):
+	starts = trailStarts(adjacency)
+	if len(starts) == 0:
+		return total_weight
+
+	#(city, used edges) => longest way to continue the trail from city without the used edges
+	memo = {}
+	def extend(node, used):
+		key = (node, used)
+		if key in memo:
+			return memo[key]
+		best = 0
+		for (neighbor, bit, weight) in adjacency[node]:
+			if not used & bit:
+				length = weight + extend(neighbor, used | bit)
+				if length > best:
+					best = length
+		memo[key] = best
+		return best
+
+	best = 0
+	for start in starts:
+		best = max(best, extend(start, 0))
+		if best == total_weight:
+			break
+	return best
+
+#returns the weight of the longest trail in G (same result as the max of Game.findMaxWeightSumForNode over all cities)
+#at_least => if given, returns None as soon as it is known that no trail of G weighs at least at_least
+#(used to skip players that can't reach the current longest route)
+def longestTrailWeight(G, at_least=None):
+	return longestTrailOfComponents(trailComponents(G), at_least)
+
+#same as longestTrailWeight for the components of trailComponents or routeTrailComponents
+def longestTrailOfComponents(components, at_least=None):
+	best = 0
+	for (adjacency, total_weight) in sorted(components, key=lambda c: c[1], reverse=True):
+		#no trail of this component (or of the smaller ones) can be longer than its total weight
+		if total_weight <= best or (at_least is not None and total_weight < at_least):
+			break
+		best = max(best, longestTrailInComponent(adjacency, total_weight))
+
+	if at_least is not None and best < at_least:
+		return None
+	return best
+
+#returns the number of different cities of the trail of a connected component that goes through the most cities
+#the cities of a trail are the cities of its routes, so the result only depends on the city it is at and the used edges
+def maxCitiesInComponent(adjacency):
+	starts = trailStarts(adjacency)
+	if len(starts) == 0:
+		return len(adjacency)
+
+	city_bit = {node: 1 << i for (i, node) in enumerate(adjacency)}
+	#(city, used edges) => most cities of a trail that continues from city
+	memo = {}
+	def extend(node, used, visited):
+		key = (node, used)
+		if key in memo:
+			return memo[key]
+		best = visited.bit_count()
+		for (neighbor, bit, _) in adjacency[node]:
+			if not used & bit:
+				cities = extend(neighbor, used | bit, visited | city_bit[neighbor])
+				if cities > best:
+					best = cities
+		memo[key] = best
+		return best
+
+	best = 0
+	for start in starts:
+		best = max(best, extend(start, 0, city_bit[start]))
+		if best == len(adjacency):
+			break
+	return best
+
+#returns the most different cities visited by a single trail of G (0 if G has no routes), used by the Asia variant
+#at_least => if given, returns None as soon as it is known that no trail of G visits at least at_least cities
+def maxCitiesOnTrail(G, at_least=None):
+	best = 0
+	for (adjacency, _) in sorted(trailComponents(G), key=lambda c: len(c[0]), reverse=True):
+		#no trail of this component (or of the smaller ones) can visit more cities than the component has
+		if len(adjacency) <= best or (at_least is not None and len(adjacency) < at_least):
+			break
+		best = max(best, maxCitiesInComponent(adjacency))
+
+	if at_least is not None and best < at_least:
+		return None
+	return best
@@ -0,0 +1,167 @@
+import os
+import json
+import tempfile
+import hashlib
+import numpy as np
+from loadMap import parse_map_file, graph_from_routes
+from loadDestinationDeck import DestinationCard, loaddestinationdeckfromfile
+from ttrengine import Board
+import pathOracle
+
+#map bundles: a map file and its destination files compiled into one binary file that is memory-mapped when loaded
+#the bundle has the cities (interned: a city is its index in the list of cities), the routes and the destination cards
+#as arrays, plus the shortest paths of the empty board and the cost of every destination card, so loading a map parses
+#nothing and computes no paths. Processes forked after loading a bundle share its pages
+#a bundle is compiled again when it is missing, of another BUNDLE_VERSION or when its source files changed (see map_bundle)
+
+#file layout: MAGIC, BUNDLE_VERSION and the size of the header (uint32 each), the header (json), then the arrays,
+#each starting at a multiple of ALIGNMENT bytes (the header has their dtype, shape and offset)
+MAGIC = b'TTRM'
+BUNDLE_VERSION = 1
+ALIGNMENT = 64
+
+#returns a hash of the contents of the source files of a bundle
+def sources_hash(filenames):
+	h = hashlib.sha1()
+	for filename in filenames:
+		with open(filename, 'rb') as f:
+			h.update(f.read())
+	return h.hexdigest()
+
+#compiles a map file and its destination files into a bundle file
+#destination_files => destination files (loaddestinationdeckfromfile format), the deck of a file is named after it
+#(gameContent/usa_destinations.txt => usa_destinations)
+def compile_bundle(map_file, destination_files, filename):
+	(cities, routes) = parse_map_file(map_file)
+	board = Board(graph_from_routes(cities, routes))
+	#cities named by routes but not in the list of cities are in the graph too
+	cities = board.routes.cities
+	color_names = board.routes.color_names
+
+	decks = [loaddestinationdeckfromfile(f) for f in destination_files]
+	cards = [card for deck in decks for card in deck]
+	#cities of destination cards that are not on the map (misspelled) come after the cities of the map
+	ticket_cities = []
+	for card in cards:
+		for city in card.destinations:
+			if city not in board.routes.city_index and city not in ticket_cities:
+				ticket_cities.append(city)
+	city_index = {city: i for (i, city) in enumerate(cities + ticket_cities)}
+
+	#empty board distances of the path oracle (the oracle of any player: no route is owned)
+	distances = pathOracle.PathOracle(board.routes, 0, 4).distances
+	ticket_city1 = np.array([city_index[card.destinations[0]] for card in cards], dtype=np.int32)
+	ticket_city2 = np.array([city_index[card.destinations[1]] for card in cards], dtype=np.int32)
+	on_map = (ticket_city1 < len(cities)) & (ticket_city2 < len(cities))
+	ticket_costs = np.full(len(cards), pathOracle.NO_PATH, dtype=np.int64)
+	ticket_costs[on_map] = distances[ticket_city1[on_map], ticket_city2[on_map]]
+
+	arrays = {
+		'route_city1': np.array([city_index[city1] for (city1, city2, attributes) in routes], dtype=np.int32),
+		'route_city2': np.array([city_index[city2] for (city1, city2, attributes) in routes], dtype=np.int32),
+		'route_length': np.array([attributes['weight'] for (city1, city2, attributes) in routes], dtype=np.int32),
+		'route_color': np.array([color_names.index(attributes['color']) for (city1, city2, attributes) in routes], dtype=np.int32),
+		'route_mountain': np.array([attributes['mountain'] for (city1, city2, attributes) in routes], dtype=np.int32),
+		'route_ferries': np.array([attributes['ferries'] for (city1, city2, attributes) in routes], dtype=np.int32),
+		'route_underground': np.array([attributes['underground'] for (city1, city2, attributes) in routes], dtype=np.uint8),
+		'ticket_city1': ticket_city1,
+		'ticket_city2': ticket_city2,
+		'ticket_points': np.array([card.points for card in cards], dtype=np.int32),
+		#routes left to claim (sum of lengths) to complete each destination card on the empty board, -1 if impossible
+		#(no path, or a city not on the map)
+		'ticket_costs': np.where(ticket_costs < pathOracle.NO_PATH, ticket_costs // pathOracle.HOP_SCALE, -1).astype(np.int32),
+		'deck_offsets': np.array([0] + list(np.cumsum([len(deck) for deck in decks])), dtype=np.int32),
+		'distances': distances,
+	}
+
+	header = {
+		'sources': sources_hash([map_file] + list(destination_files)),
+		'cities': cities,
+		'ticket_cities': ticket_cities,
+		'colors': color_names,
+		'decks': [os.path.splitext(os.path.basename(f))[0] for f in destination_files],
+		'arrays': {},
+	}
+	#offsets are relative to the end of the header, so they don't depend on its size
+	offset = 0
+	for (name, array) in arrays.items():
+		header['arrays'][name] = (array.dtype.str, array.shape, offset)
+		offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+	header_bytes = json.dumps(header).encode()
+	header_bytes += b' ' * (-(len(header_bytes) + 12) % ALIGNMENT)
+
+	#a temporary file of its own in the same directory, so processes compiling the same bundle don't write to the same file
+	(fd, temp_filename) = tempfile.mkstemp(dir=os.path.dirname(filename) or '.', suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			f.write(MAGIC + np.array([BUNDLE_VERSION, len(header_bytes)], dtype='<u4').tobytes() + header_bytes)
+			for array in arrays.values():
+				data = np.ascontiguousarray(array).tobytes()
+				f.write(data + b'\0' * (-len(data) % ALIGNMENT))
+		os.replace(temp_filename, filename)
+	except BaseException:
+		os.remove(temp_filename)
+		raise
+
+class MapBundle:
+	#filename => a file written by compile_bundle
+	def __init__(self, filename):
+		self.filename = filename
+		with open(filename, 'rb') as f:
+			if f.read(4) != MAGIC:
+				raise ValueError(f"{filename} is not a map bundle")
+			(self.version, header_size) = np.frombuffer(f.read(8), dtype='<u4').tolist()
+			if self.version != BUNDLE_VERSION:
+				raise ValueError(f"{filename} is a map bundle of version {self.version} instead of {BUNDLE_VERSION}")
+			header = json.loads(f.read(header_size))
+		self.sources = header['sources']
+		#cities of the map, then the cities only named by destination cards
+		self.number_of_map_cities = len(header['cities'])
+		self.cities = header['cities'] + header['ticket_cities']
+		self.city_index = {city: i for (i, city) in enumerate(self.cities)}
+		self.colors = header['colors']
+		self.deck_names = header['decks']
+
+		data = np.memmap(filename, dtype=np.uint8, mode='r', offset=12 + header_size)
+		for (name, (dtype, shape, offset)) in header['arrays'].items():
+			dtype = np.dtype(dtype)
+			size = dtype.itemsize * int(np.prod(shape))
+			setattr(self, name, data[offset:offset + size].view(dtype).reshape(shape))
+
+	#returns the board graph, the same as loadgraphfromfile on the map file
+	def graph(self):
+		routes = []
+		for (city1, city2, length, color, mountain, ferries, underground) in zip(self.route_city1.tolist(), self.route_city2.tolist(), self.route_length.tolist(), self.route_color.tolist(), self.route_mountain.tolist(), self.route_ferries.tolist(), self.route_underground.tolist()):
+			routes.append((self.cities[city1], self.cities[city2], {'weight': length, 'color': self.colors[color], 'mountain': mountain, 'owner': -1, 'underground': bool(underground), 'ferries': ferries}))
+		return graph_from_routes(self.cities[:self.number_of_map_cities], routes)
+
+	#returns a new Board of the map, its path oracles start from the distances of the bundle
+	#and the destination cards of its decks are numbered in the order of the bundle (see RouteTable.add_tickets)
+	def board(self):
+		board = Board(self.graph())
+		pathOracle.empty_board_distances[board.routes] = self.distances
+		for deck_name in self.deck_names:
+			board.routes.add_tickets(self.destination_cards(deck_name))
+		return board
+
+	#returns the destination cards of a deck (name of the destination file, see compile_bundle)
+	def destination_cards(self, deck_name):
+		deck = self.deck_names.index(deck_name)
+		(start, end) = self.deck_offsets[deck:deck + 2].tolist()
+		return [DestinationCard(self.cities[city1], self.cities[city2], points) for (city1, city2, points) in zip(self.ticket_city1[start:end].tolist(), self.ticket_city2[start:end].tolist(), self.ticket_points[start:end].tolist())]
+
+#returns the bundle of a map, compiling it first if needed
+#bundle_file => where the bundle is kept (next to the map file by default: gameContent/usa.txt => gameContent/usa.ttrmap)
+def map_bundle(map_file, destination_files, bundle_file=None):
+	if bundle_file is None:
+		bundle_file = os.path.splitext(map_file)[0] + '.ttrmap'
+	sources = [map_file] + list(destination_files)
+	if os.path.exists(bundle_file):
+		try:
+			bundle = MapBundle(bundle_file)
+			if bundle.sources == sources_hash(sources) and bundle.deck_names == [os.path.splitext(os.path.basename(f))[0] for f in destination_files]:
+				return bundle
+		except ValueError:
+			pass
+	compile_bundle(map_file, destination_files, bundle_file)
+	return MapBundle(bundle_file)
@@ -0,0 +1,98 @@
+import os
+import json
+import bisect
+import collections
+
+#metrics of training/test runs: one JSON object per game and per line (JSONL), appended to the file as the run goes
+#and read back one line at a time, so a run of any length can be summarized (see rolling_stats) in constant memory
+
+#returns the metrics of player pnum in a finished game (see GameHandler)
+def game_metrics(game_no, game, gh, pnum, wall_time):
+	player = game.players[pnum]
+	return {
+		'game_no': game_no,
+		'score': player.points,
+		'place': game.get_place(pnum),
+		'completed': game.getNumCompletedDCards(pnum),
+		'incomplete': game.getNumIncompleteDCards(pnum),
+		'turns': gh.turn_count,
+		'wall_time': round(wall_time, 4),
+		'agents_reporting': dict(gh.agents_reporting),
+	}
+
+#appends records (dicts) to a JSONL file, buffer_size records at a time
+class MetricsWriter:
+	def __init__(self, filename, buffer_size=100):
+		self.filename = filename
+		self.buffer_size = buffer_size
+		self.buffer = []
+
+	def write(self, record):
+		self.buffer.append(json.dumps(record))
+		if len(self.buffer) >= self.buffer_size:
+			self.flush()
+
+	def flush(self):
+		if self.buffer:
+			with open(self.filename, 'a') as f:
+				f.write('\n'.join(self.buffer) + '\n')
+			self.buffer = []
+
+	def close(self):
+		self.flush()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+#yields the records of a metrics file, one at a time
+def read_metrics(filename):
+	with open(filename) as f:
+		for line in f:
+			if line.strip():
+				yield json.loads(line)
+
+#drops the records of the games from game_no on (games played after the checkpoint a run is resumed from)
+def truncate_metrics(filename, game_no):
+	if not os.path.exists(filename):
+		return
+	temp_filename = filename + '.tmp'
+	with open(temp_filename, 'w') as f:
+		for record in read_metrics(filename):
+			if record['game_no'] < game_no:
+				f.write(json.dumps(record) + '\n')
+	os.replace(temp_filename, filename)
+
+#returns the q quantile (0 <= q <= 1) of a sorted list, interpolating between the two closest values
+def quantile(sorted_values, q):
+	position = q * (len(sorted_values) - 1)
+	below = int(position)
+	above = min(below + 1, len(sorted_values) - 1)
+	return sorted_values[below] + (sorted_values[above] - sorted_values[below]) * (position - below)
+
+#yields (game_no, mean, [quantiles]) of field over the last window records, every every records
+#only the values of the window are kept (in order of arrival and sorted), whatever the number of records
+def rolling_stats(records, field, window=100, quantiles=(0.1, 0.5, 0.9), every=1):
+	values = collections.deque()
+	sorted_values = []
+	total = 0
+	for (i, record) in enumerate(records):
+		value = record[field]
+		values.append(value)
+		bisect.insort(sorted_values, value)
+		total += value
+		if len(values) > window:
+			old = values.popleft()
+			del sorted_values[bisect.bisect_left(sorted_values, old)]
+			total -= old
+		if (i + 1) % every == 0:
+			yield (record['game_no'], total / len(values), [quantile(sorted_values, q) for q in quantiles])
+
+#sums the agents_reporting counts of all the records (how often each agent agreed with the chosen move)
+def total_agents_reporting(records):
+	totals = collections.Counter()
+	for record in records:
+		totals.update(record['agents_reporting'])
+	return dict(totals)
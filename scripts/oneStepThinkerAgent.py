@@ -1,6 +1,5 @@
 import networkx as nx
 import operator
-import random
 from agent import Agent
 
 class OneStepThinkerAgent(Agent):
@@ -9,6 +8,13 @@ class OneStepThinkerAgent(Agent):
 		self.current_objective_color = None
 		#self.current_grand_objective = {}
 		self.players_previous_points = -1
+		self.observed_destinations = None
+
+	#the plan is generated again on the next decide when the destination cards changed
+	#(choose_destination_cards does the same when it is called)
+	def observe(self, game, pnum):
+		if self.destinations_changed(game, pnum):
+			self.players_previous_points = -1
 
 	def decide(self, game, pnum):
 		possible_moves = game.get_possible_moves(pnum)
@@ -16,7 +22,7 @@ class OneStepThinkerAgent(Agent):
 		try:
 			assert len(possible_moves) > 0
 		except AssertionError as e:
-			print(f"No moves left to make because train deck {sum(game.train_deck.deck.values())} train deck discard {sum(game.train_deck.discard_pile.values())} destination deck {sum(game.destination_deck.deck.values())}")
+			print(f"No moves left to make because train deck {game.train_deck.remaining()} train deck discard {game.train_deck.discarded()} destination deck {game.destination_deck.remaining()}")
 			for i in range(len(game.players)):
 				print(i, game.players[i].hand, game.players[i].hand_destination_cards)
 			return None
@@ -82,11 +88,11 @@ class OneStepThinkerAgent(Agent):
 				return draw_top_move
 		
 		if len(draw_train_card_moves) > 0:
-			return random.choice(draw_train_card_moves)
+			return self.rng.choice(draw_train_card_moves)
 		if len(claim_route_moves) > 0:
-			return random.choice(claim_route_moves)
+			return self.rng.choice(claim_route_moves)
 		
-		return random.choice(possible_moves)
+		return self.rng.choice(possible_moves)
 
 	def choose_destination_cards(self, moves, game, pnum, num_keep):
 		if num_keep == game.destination_deck_draw_rules[1]:
@@ -172,7 +178,7 @@ class OneStepThinkerAgent(Agent):
 				city1, city2, color = result
 		if city1 == None:
 			min_number_of_trains = min([x.number_of_trains for x in game.players])
-			if min_number_of_trains >= min_trains_threshold and sum(game.destination_deck.deck.values()) > 0:
+			if min_number_of_trains >= min_trains_threshold and game.destination_deck.remaining() > 0:
 				#for move in possible_moves:
 				#	if move.function == 'drawDestinationCards':
 				#		return move
@@ -188,7 +194,8 @@ class OneStepThinkerAgent(Agent):
 		except:
 			return False
 
-		list_of_colors = set()
+		#a list, so the colors are in the order of the routes (the order of a set of strings depends on PYTHONHASHSEED)
+		list_of_colors = []
 		cities = []
 		for i in range(0, len(list_of_route_nodes)-1):
 			cities = [list_of_route_nodes[i], list_of_route_nodes[i+1]]
@@ -196,11 +203,12 @@ class OneStepThinkerAgent(Agent):
 				edge = graph[list_of_route_nodes[i]][list_of_route_nodes[i+1]][key]
 
 				if edge['owner'] != -1:
-					list_of_colors = set()
+					list_of_colors = []
 					cities = []
 					break
 
-				list_of_colors.add(edge['color'].lower())
+				if edge['color'].lower() not in list_of_colors:
+					list_of_colors.append(edge['color'].lower())
 
 			if len(cities) != 0:
 				break
@@ -242,7 +250,7 @@ class OneStepThinkerAgent(Agent):
 		max_size = 0
 		list_of_edges = []
 	
-		free_routes_graph = self.free_routes_graph(pnum, game.board.graph, game.number_of_players)
+		free_routes_graph = self.free_routes_graph(pnum, game.board, game.number_of_players)
 		for city1 in free_routes_graph:
 			for city2 in free_routes_graph[city1]:
 				for e in free_routes_graph[city1][city2]:
@@ -0,0 +1,119 @@
+import os
+import random
+import multiprocessing
+import numpy as np
+from loadDestinationDeck import destinationdeckdict
+from mapBundle import map_bundle
+from ttrengine import Game, GameHandler, Player, USA_VARIANTS, emptyCardDict, make_train_deck, point_table
+from gameRecord import GameRecord
+
+#runs many games in a pool of processes, every game with its own random generator (see Game) seeded from the seed of
+#the run, so the results don't depend on the number of processes or on which process plays which game
+#the maps are loaded from their bundles (see mapBundle.py) before the pool is made, so the processes share them and
+#play their games on copies of them
+
+#map name => (map file, destination deck file, variants)
+#the europe map is played with the rules of the usa map (its long routes are shuffled with the other destination cards)
+MAPS = {
+	'usa': ("gameContent/usa.txt", "gameContent/usa_destinations.txt", USA_VARIANTS),
+	'europe': ("gameContent/europe.txt", "gameContent/europe_destinations.txt", USA_VARIANTS),
+}
+
+#map name => (board, destination deck) of the maps loaded by the process (see load_map)
+worker_maps = {}
+
+#returns the seed of attempt number attempt of game number game_no
+def game_seed(seed, game_no, attempt=0):
+	return int(np.random.SeedSequence([seed, game_no, attempt]).generate_state(1)[0])
+
+#returns the board and the destination deck of a map, loaded once per process
+def load_map(map_name):
+	if map_name not in worker_maps:
+		(map_file, destinations_file, variants) = MAPS[map_name]
+		bundle = map_bundle(map_file, [destinations_file])
+		deck_name = os.path.splitext(os.path.basename(destinations_file))[0]
+		worker_maps[map_name] = (bundle.board(), destinationdeckdict(dest_list=bundle.destination_cards(deck_name), board="usa"))
+	return worker_maps[map_name]
+
+def load_maps(map_names):
+	for map_name in map_names:
+		load_map(map_name)
+
+#plays one game with a fresh set of agents
+#make_agents => function that returns the list of agents of a game (one per seat), must be picklable (defined at module level)
+#aql_indices => seats of the ApproximateQLearningAgents (the games are played with GameHandler.train = False:
+#the agents live in the processes, so what they learn would be lost)
+#crn => if True, the decks are shuffled piles seeded with seed (see Game, deck_seed): games with the same seed deal the same cards
+#record => if True, the moves are recorded in game.record (see gameRecord.py)
+#the agents get their own random generator, seeded with agent_seed (seed if None), so the generator of the game only draws cards
+#and records can be replayed
+def play_game(make_agents, seed, map_name='usa', aql_indices=(), crn=False, record=False, number_of_trains=45, agent_seed=None):
+	agents = make_agents()
+	(board, destination_deck) = load_map(map_name)
+	players = [Player(hand=emptyCardDict(), number_of_trains=number_of_trains, points=0) for i in range(len(agents))]
+	game = Game(board=board.copy(), point_table=point_table(), destination_deck=destination_deck.copy(), train_deck=make_train_deck(number_of_color_cards=12, number_of_wildcards=14), players=players, current_player=0, variants=MAPS[map_name][2], rng=random.Random(seed), deck_seed=seed if crn else None)
+	if record:
+		game.record = GameRecord(seed, map_name, MAPS[map_name][2], len(agents), number_of_trains, seed if crn else None)
+	gh = GameHandler(game=game, agents=agents, filename="test", rng=random.Random(f"agents {seed if agent_seed is None else agent_seed}"))
+	gh.train = False
+	gh.aql_indices = set(aql_indices)
+	gh.play(runnum=0, save=False)
+	return (game, gh)
+
+#returns the results of a game as a dict (everything agent_test.py and the training scripts report)
+def game_result(game_no, seed, attempts, game, gh):
+	winner = game.winner()[0]
+	return {
+		'game_no': game_no,
+		'seed': seed,
+		'attempts': attempts,
+		'run_failure': gh.run_failure,
+		'turn_count': gh.turn_count,
+		'scores': [p.points for p in game.players],
+		'places': [game.get_place(i) for i in range(len(game.players))],
+		'winner': winner,
+		'completed_destinations': [game.getNumCompletedDCards(i) for i in range(len(game.players))],
+		'agents_reporting': dict(gh.agents_reporting),
+		'record': game.record,
+	}
+
+#plays game number game_no of a run, playing it again with the next seed while it fails (gh.run_failure), at most max_attempts times
+#with crn only the agents get the next seed: the game keeps the seed of its first attempt, so it still deals the same cards
+#as the other games with the same game_no (the other seatings of a duplicate game, see tournament.py)
+#task => (game_no, seed of the run, make_agents, map name, aql_indices, max_attempts, crn, record)
+def run_task(task):
+	(game_no, seed, make_agents, map_name, aql_indices, max_attempts, crn, record) = task
+	for attempt in range(max_attempts):
+		game_seed_value = game_seed(seed, game_no, 0 if crn else attempt)
+		(game, gh) = play_game(make_agents, game_seed_value, map_name, aql_indices, crn, record, agent_seed=game_seed(seed, game_no, attempt))
+		if not gh.run_failure:
+			break
+	return game_result(game_no, game_seed_value, attempt + 1, game, gh)
+
+#returns a pool of processes that have the maps (None if processes == 1: the games are played in this process)
+#processes => number of processes (None: one per core)
+#the pool uses fork, so the processes start with the modules and the maps loaded by this process
+def make_pool(processes=None, map_names=('usa',)):
+	load_maps(map_names)
+	if processes == 1:
+		return None
+	return multiprocessing.get_context('fork').Pool(processes=processes)
+
+#yields the result of every task (see run_task) in the order of the tasks, as soon as it (and the tasks before it) are done
+def run_tasks(pool, tasks):
+	if pool is None:
+		return map(run_task, tasks)
+	return pool.imap(run_task, tasks)
+
+#yields the result of every game (see game_result) in the order of the games
+#num_games => number of games, seed => seed of the run (game i of two runs with the same seed is the same game)
+#record => if True, the result of every game has its GameRecord (None otherwise)
+def run_games(num_games, make_agents, seed=0, map_name='usa', aql_indices=(), processes=None, max_attempts=10, crn=False, record=False):
+	tasks = ((game_no, seed, make_agents, map_name, tuple(aql_indices), max_attempts, crn, record) for game_no in range(num_games))
+	pool = make_pool(processes, (map_name,))
+	try:
+		for result in run_tasks(pool, tasks):
+			yield result
+	finally:
+		if pool is not None:
+			pool.terminate()
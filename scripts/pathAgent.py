@@ -1,7 +1,6 @@
 import networkx as nx
 import queue
 import collections
-import random
 import pickle
 from agent import Agent
 
@@ -15,7 +14,7 @@ class PathAgent(Agent):
 		try:
 			assert len(possible_moves) > 0
 		except AssertionError as e:
-			print(f"No moves left to make because train deck {sum(game.train_deck.deck.values())} train deck discard {sum(game.train_deck.discard_pile.values())} destination deck {sum(game.destination_deck.deck.values())}")
+			print(f"No moves left to make because train deck {game.train_deck.remaining()} train deck discard {game.train_deck.discarded()} destination deck {game.destination_deck.remaining()}")
 			for i in range(len(game.players)):
 				print(i, game.players[i].hand, game.players[i].hand_destination_cards)
 			return None
@@ -90,7 +89,7 @@ class PathAgent(Agent):
 								paths_to_take.append(((-1) * (game.point_table[weight] + 2 * destination['points'][destination['city2'].index(temp[i+1])]), temp[i], temp[i+1]))
 
 
-		free_connections_graph = self.free_routes_graph(pnum, game.board.graph, game.number_of_players)
+		free_connections_graph = self.free_routes_graph(pnum, game.board, game.number_of_players)
 
 		if len(paths_to_take) == 0:
 			for node1 in free_connections_graph:
@@ -202,7 +201,7 @@ class PathAgent(Agent):
 					return m
 
 		if len(possible_moves) > 0:
-			return random.choice(possible_moves)
+			return self.rng.choice(possible_moves)
 		
 		#print len(game.train_deck.deck)
 		#print len(game.train_deck.discard_pile)
@@ -0,0 +1,188 @@
+import copy
+import heapq
+import weakref
+import numpy as np
+import networkx as nx
+
+#shortest paths between every two cities of the joint graph of a player (see Agent.joint_graph, with min_weight_edge=0):
+#the routes the player can still claim (with their weight) plus the routes the player owns (with weight 0)
+#the distances of the empty board are computed once per map, then every oracle only repairs the distances
+#of the pairs of cities whose routes changed since the last query (see sync)
+#the oracles of a board are kept on the board (Board.path_oracles), copies of the board start with the oracles of the
+#board they were made from, so a copy played a few moves further only repairs the pairs of these moves
+#routes => the RouteTable of the board
+#pnum => index of the player
+#number_of_players => number of players of the game (double routes are locked with less than 4 players)
+
+#the cost of a route is weight * HOP_SCALE + 1, so among the paths with the same weight the one with the fewest routes is the shortest
+HOP_SCALE = 1024
+#distance between two cities that are not connected (small enough that adding two of them doesn't overflow)
+NO_PATH = np.iinfo(np.int64).max // 4
+#if more pairs of cities than this changed since the last query, all distances are computed again
+MAX_PAIRS_TO_REPAIR = 8
+
+#RouteTable => distances of the empty board (shared by all oracles of the map)
+empty_board_distances = weakref.WeakKeyDictionary()
+
+#returns the oracle of pnum, up to date with board
+#an oracle of another version of the board may be shared with copies of the board, so it is copied before it is synced
+def path_oracle(board, pnum, number_of_players):
+	key = (pnum, number_of_players)
+	oracle = board.path_oracles.get(key)
+	if oracle is None:
+		oracle = PathOracle(board.routes, pnum, number_of_players)
+	elif oracle.version != board.version:
+		oracle = oracle.copy()
+	else:
+		return oracle
+	board.path_oracles[key] = oracle.sync(board)
+	return oracle
+
+class PathOracle:
+	def __init__(self, routes, pnum, number_of_players):
+		self.routes = routes
+		self.pnum = pnum
+		self.number_of_players = number_of_players
+		self.number_of_cities = len(routes.cities)
+
+		self.pair_city1 = np.array([routes.city_index[c1] for (c1, c2) in routes.pairs], dtype=np.int64)
+		self.pair_city2 = np.array([routes.city_index[c2] for (c1, c2) in routes.pairs], dtype=np.int64)
+		#city index => list of (neighbor city index, pair index)
+		self.adjacency = [[] for i in range(self.number_of_cities)]
+		for (pair, (city1, city2)) in enumerate(zip(self.pair_city1.tolist(), self.pair_city2.tolist())):
+			self.adjacency[city1].append((city2, pair))
+			self.adjacency[city2].append((city1, pair))
+
+		self.costs = self.pair_costs(np.full(routes.number_of_routes, -1, dtype=np.int32))
+		if routes not in empty_board_distances:
+			empty_board_distances[routes] = self.all_distances(self.costs)
+		self.distances = empty_board_distances[routes].copy()
+		self.set_cities_in_graph()
+		#version of the board the distances are for (None before the first sync)
+		self.version = None
+
+	#returns a copy that can be synced without changing this oracle (the other arrays are replaced, never changed)
+	def copy(self):
+		o = copy.copy(self)
+		o.distances = self.distances.copy()
+		return o
+
+	#returns the cost of each pair of cities for this player (NO_PATH if the pair is not in the joint graph)
+	#owner => owner of every route of the board (Board.owner)
+	def pair_costs(self, owner):
+		routes = self.routes
+		free = owner == -1
+		min_free_weight = np.full(routes.number_of_pairs, NO_PATH, dtype=np.int64)
+		np.minimum.at(min_free_weight, routes.pair[free], routes.length[free])
+		costs = np.where(min_free_weight < NO_PATH, min_free_weight * HOP_SCALE + 1, NO_PATH)
+
+		if self.number_of_players < 4:
+			costs[routes.pair[~free]] = NO_PATH
+		costs[routes.pair[owner == self.pnum]] = 1
+		return costs
+
+	#floyd-warshall over the costs of the pairs
+	def all_distances(self, costs):
+		n = self.number_of_cities
+		distances = np.full((n, n), NO_PATH, dtype=np.int64)
+		np.fill_diagonal(distances, 0)
+		np.minimum.at(distances, (self.pair_city1, self.pair_city2), costs)
+		np.minimum.at(distances, (self.pair_city2, self.pair_city1), costs)
+		for k in range(n):
+			np.minimum(distances, distances[:, k:k+1] + distances[k:k+1, :], out=distances)
+		return distances
+
+	#dijkstra from source over the costs of the pairs (a python list), returns the list of distances to every city
+	def distances_from(self, source, costs):
+		distances = [NO_PATH] * self.number_of_cities
+		distances[source] = 0
+		heap = [(0, source)]
+		while heap:
+			(distance, city) = heapq.heappop(heap)
+			if distance > distances[city]:
+				continue
+			for (neighbor, pair) in self.adjacency[city]:
+				if costs[pair] < NO_PATH and distance + costs[pair] < distances[neighbor]:
+					distances[neighbor] = distance + costs[pair]
+					heapq.heappush(heap, (distances[neighbor], neighbor))
+		return distances
+
+	def set_cities_in_graph(self):
+		in_graph = self.costs < NO_PATH
+		self.cities_in_graph = np.zeros(self.number_of_cities, dtype=bool)
+		self.cities_in_graph[self.pair_city1[in_graph]] = True
+		self.cities_in_graph[self.pair_city2[in_graph]] = True
+
+	#updates the distances to the routes claimed in board
+	#pairs that got more expensive (claimed by someone else, or unclaimed with unmake_move): only the rows of the cities
+	#that had one of those pairs in a shortest path are computed again (dijkstra)
+	#pairs that got cheaper (claimed by this player): every distance is relaxed through the pair in O(n^2)
+	def sync(self, board):
+		if self.version == board.version:
+			return self
+
+		new_costs = self.pair_costs(board.owner)
+		changed = np.flatnonzero(new_costs != self.costs)
+		if len(changed) > MAX_PAIRS_TO_REPAIR:
+			self.distances = self.all_distances(new_costs)
+		elif len(changed) > 0:
+			distances = self.distances
+			more_expensive = changed[new_costs[changed] > self.costs[changed]]
+			if len(more_expensive) > 0:
+				affected = np.zeros(self.number_of_cities, dtype=bool)
+				for pair in more_expensive.tolist():
+					(city1, city2, cost) = (self.pair_city1[pair], self.pair_city2[pair], self.costs[pair])
+					affected |= (distances[:, city1] + cost == distances[:, city2]) | (distances[:, city2] + cost == distances[:, city1])
+				costs = np.maximum(self.costs, new_costs).tolist()
+				for source in np.flatnonzero(affected).tolist():
+					row = self.distances_from(source, costs)
+					distances[source, :] = row
+					distances[:, source] = row
+
+			for pair in changed[new_costs[changed] < self.costs[changed]].tolist():
+				(city1, city2, cost) = (self.pair_city1[pair], self.pair_city2[pair], new_costs[pair])
+				np.minimum(distances, distances[:, city1:city1+1] + cost + distances[city2:city2+1, :], out=distances)
+				np.minimum(distances, distances[:, city2:city2+1] + cost + distances[city1:city1+1, :], out=distances)
+
+		self.costs = new_costs
+		self.set_cities_in_graph()
+		self.version = board.version
+		return self
+
+	#returns the index of a city, raises nx.NodeNotFound (like networkx) if the city is not in the joint graph
+	def city(self, city):
+		index = self.routes.city_index.get(city)
+		if index is None or not self.cities_in_graph[index]:
+			raise nx.NodeNotFound(f"Node {city} not in joint graph")
+		return index
+
+	#same as nx.has_path(joint_graph, city1, city2)
+	def has_path(self, city1, city2):
+		return bool(self.distances[self.city(city1), self.city(city2)] < NO_PATH)
+
+	#same as nx.dijkstra_path_length(joint_graph, city1, city2): the weight of the routes left to claim
+	def distance(self, city1, city2):
+		distance = self.distances[self.city(city1), self.city(city2)]
+		if distance >= NO_PATH:
+			raise nx.NetworkXNoPath(f"No path between {city1} and {city2}")
+		return int(distance) // HOP_SCALE
+
+	#returns a list of cities of a shortest (weighted) path from city1 to city2, like nx.dijkstra_path(joint_graph, city1, city2)
+	#among the paths with the same weight, returns one with the fewest routes
+	def path(self, city1, city2):
+		source = self.city(city1)
+		target = self.city(city2)
+		if self.distances[source, target] >= NO_PATH:
+			raise nx.NetworkXNoPath(f"No path between {city1} and {city2}")
+
+		to_target = self.distances[:, target].tolist()
+		costs = self.costs.tolist()
+		path = [city1]
+		city = source
+		while city != target:
+			for (neighbor, pair) in self.adjacency[city]:
+				if costs[pair] < NO_PATH and costs[pair] + to_target[neighbor] == to_target[city]:
+					city = neighbor
+					break
+			path.append(self.routes.cities[city])
+		return path
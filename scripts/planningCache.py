@@ -0,0 +1,40 @@
+import collections
+
+#bounded cache for the planning structures agents build from the board every turn (free routes graph, joint graph, ...)
+#every board has its own cache (Board.planning_cache), copies of the board start with the entries of the board they were
+#made from, so games played at the same time (in threads or in a BatchEnv) never share a cache
+#keys start with the version of the board (Board.version), which changes every time the owner of a route changes,
+#so entries of an older state of the board are never returned again (they are dropped when the cache is full)
+#cached values are shared by every agent and by the copies of the board: don't modify them (copy them first)
+#max_entries => number of entries kept, the least recently used entries are dropped first
+class PlanningCache:
+	def __init__(self, max_entries=64):
+		self.entries = collections.OrderedDict()
+		self.max_entries = max_entries
+		self.hits = 0
+		self.misses = 0
+
+	#returns the value of key, calling build() to make it if it is not in the cache
+	def get(self, key, build):
+		if key in self.entries:
+			self.hits += 1
+			self.entries.move_to_end(key)
+			return self.entries[key]
+
+		self.misses += 1
+		value = build()
+		self.entries[key] = value
+		if len(self.entries) > self.max_entries:
+			self.entries.popitem(last=False)
+		return value
+
+	#returns a new cache with the entries of this one (the values are shared)
+	def copy(self):
+		c = PlanningCache(self.max_entries)
+		c.entries = self.entries.copy()
+		return c
+
+	def clear(self):
+		self.entries.clear()
+		self.hits = 0
+		self.misses = 0
@@ -0,0 +1,202 @@
+import math
+import itertools
+import statistics
+import functools
+import collections
+import numpy as np
+from parallelRunner import make_pool, run_tasks, game_seed
+from hungryAgent import HungryAgent
+from longRouteJunkieAgent import LongRouteJunkieAgent
+from oneStepThinkerAgent import OneStepThinkerAgent
+from pathAgent import PathAgent
+from approximateQLearningAgent import ApproximateQLearningAgent
+
+#round robin between agents: every combination of players_per_game agents (a pairing) plays games with every seating
+#(permutation of the agents over the seats) on every map, in turn, until a sequential test (SPRT) decides which agent
+#of each pair is stronger or the pairing reaches max_games. Then the agents are rated with a bradley-terry model (elo scale)
+
+#file the ApproximateQLearningAgent loads its Q-values from
+QVALUES_FILE = "q_values.txt"
+
+def make_aql_agent():
+	agent = ApproximateQLearningAgent()
+	agent.load_qvalues_file(QVALUES_FILE)
+	agent.lazy = True
+	return agent
+
+#agent name => function that returns a new agent
+AGENTS = {
+	'HungryAgent': HungryAgent,
+	'LongRouteJunkieAgent': LongRouteJunkieAgent,
+	'OneStepThinkerAgent': OneStepThinkerAgent,
+	'PathAgent': PathAgent,
+	'ApproximateQLearningAgent': make_aql_agent,
+}
+
+#returns the agents of a game, names => name of the agent of every seat
+def make_seated_agents(names):
+	return [AGENTS[name]() for name in names]
+
+#expected score (win = 1, tie = 1/2) of an agent elo points stronger than its opponent
+def expected_score(elo):
+	return 1 / (1 + 10 ** (-elo / 400))
+
+#sequential probability ratio test between "a is elo_margin stronger than b" and "b is elo_margin stronger than a"
+#wins, losses => games of a against b (ties don't change the ratio)
+#returns 1 if a is stronger, -1 if b is stronger, 0 if more games are needed
+def sprt(wins, losses, elo_margin, alpha, beta):
+	p = expected_score(elo_margin)
+	llr = (wins - losses) * math.log(p / (1 - p))
+	if llr >= math.log((1 - beta) / alpha):
+		return 1
+	if llr <= math.log(beta / (1 - alpha)):
+		return -1
+	return 0
+
+#bradley-terry strengths from the scores between agents (minorization-maximization)
+#scores => score[i, j] is the number of wins (plus half the ties) of agent i against agent j
+#prior => ties added between every two agents that played, so an agent that never lost has a finite rating
+#returns (elo of every agent with mean 0, standard error of every elo)
+def bradley_terry(scores, prior=0.5, iterations=1000, tolerance=1e-9):
+	games = scores + scores.T
+	scores = scores + prior * (games > 0)
+	games = scores + scores.T
+	wins = scores.sum(axis=1)
+	strengths = np.ones(len(scores))
+	for i in range(iterations):
+		new_strengths = wins / (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+		new_strengths /= np.exp(np.log(new_strengths).mean())
+		converged = np.abs(new_strengths - strengths).max() < tolerance
+		strengths = new_strengths
+		if converged:
+			break
+
+	#the covariance of the log strengths is the pseudo inverse of the fisher information (ratings are only defined up to a constant)
+	p = strengths[:, None] / (strengths[:, None] + strengths[None, :])
+	information = -games * p * p.T
+	np.fill_diagonal(information, 0)
+	np.fill_diagonal(information, -information.sum(axis=1))
+	variances = np.diag(np.linalg.pinv(information))
+
+	scale = 400 / math.log(10)
+	return (scale * np.log(strengths), scale * np.sqrt(np.maximum(variances, 0)))
+
+#agent_names => the agents of the tournament (keys of AGENTS), map_names => maps of parallelRunner.MAPS
+#players_per_game => number of agents of every game, max_games => games of a pairing if the test never stops it
+#elo_margin, alpha, beta => the test stops a pairing once it tells with errors alpha/beta whether one agent is elo_margin stronger
+#confidence => confidence of the intervals of the ratings
+#crn => duplicate games: every seating of a round of a pairing is played with the same seed and shuffled decks
+#(see parallelRunner.play_game), so every agent gets the cards of every seat and deck luck cancels out
+class Tournament:
+	def __init__(self, agent_names, map_names=('usa',), players_per_game=2, max_games=200, seed=0, elo_margin=50, alpha=0.05, beta=0.05, confidence=0.95, processes=None, crn=False):
+		self.agent_names = list(agent_names)
+		self.agent_index = {name: i for (i, name) in enumerate(self.agent_names)}
+		self.map_names = list(map_names)
+		self.players_per_game = players_per_game
+		self.max_games = max_games
+		self.seed = seed
+		self.elo_margin = elo_margin
+		self.alpha = alpha
+		self.beta = beta
+		self.confidence = confidence
+		self.processes = processes
+		self.crn = crn
+
+		self.pairings = list(itertools.combinations(self.agent_names, players_per_game))
+		#every seating of a pairing on every map, the games of a pairing go through them in turn
+		self.seatings = [(seats, map_name) for map_name in self.map_names for seats in itertools.permutations(range(players_per_game))]
+		self.games_played = {pairing: 0 for pairing in self.pairings}
+		self.decided = {pairing: False for pairing in self.pairings}
+
+		self.scores = {name: [] for name in self.agent_names}
+		self.places = {name: collections.Counter() for name in self.agent_names}
+		#pairwise[i, j] => wins (plus half the ties) of agent i against agent j, over all games
+		self.pairwise = np.zeros((len(self.agent_names), len(self.agent_names)))
+		#(a, b) => [wins of a, wins of b] in the games of both (ties not counted), for the test
+		self.head_to_head = {pair: [0, 0] for pair in itertools.combinations(self.agent_names, 2)}
+		self.failures = 0
+
+	#tasks of the next round: one game of every seating for every pairing still running
+	def next_round(self):
+		tasks = []
+		for (pairing_no, pairing) in enumerate(self.pairings):
+			if self.decided[pairing]:
+				continue
+			#with crn, the games of a round of the same map share their seed
+			round_no = self.games_played[pairing] // len(self.seatings)
+			for (seats, map_name) in self.seatings:
+				game_no = self.games_played[pairing]
+				if game_no >= self.max_games:
+					break
+				seed_no = round_no * len(self.map_names) + self.map_names.index(map_name) if self.crn else game_no
+				names = tuple(pairing[i] for i in seats)
+				aql_indices = tuple(seat for (seat, name) in enumerate(names) if name == 'ApproximateQLearningAgent')
+				tasks.append((pairing, names, (seed_no, game_seed(self.seed, pairing_no), functools.partial(make_seated_agents, names), map_name, aql_indices, 10, self.crn, False)))
+				self.games_played[pairing] += 1
+		return tasks
+
+	#adds the result of a game (see parallelRunner.game_result), names => agent of every seat
+	def record(self, names, result):
+		if result['run_failure']:
+			self.failures += 1
+			return
+		for (seat, name) in enumerate(names):
+			self.scores[name].append(result['scores'][seat])
+			self.places[name][result['places'][seat]] += 1
+
+		for (seat1, seat2) in itertools.combinations(range(len(names)), 2):
+			(i, j) = (self.agent_index[names[seat1]], self.agent_index[names[seat2]])
+			(place1, place2) = (result['places'][seat1], result['places'][seat2])
+			if place1 == place2:
+				self.pairwise[i, j] += 0.5
+				self.pairwise[j, i] += 0.5
+				continue
+			(winner, loser) = (names[seat1], names[seat2]) if place1 < place2 else (names[seat2], names[seat1])
+			if (winner, loser) in self.head_to_head:
+				self.head_to_head[(winner, loser)][0] += 1
+			else:
+				self.head_to_head[(loser, winner)][1] += 1
+			self.pairwise[self.agent_index[winner], self.agent_index[loser]] += 1
+
+	#result of the test for two agents (see sprt), a before b in agent_names
+	def test(self, a, b):
+		(wins, losses) = self.head_to_head[(a, b)]
+		return sprt(wins, losses, self.elo_margin, self.alpha, self.beta)
+
+	def update_decided(self):
+		for pairing in self.pairings:
+			self.decided[pairing] = all(self.test(a, b) != 0 for (a, b) in itertools.combinations(pairing, 2))
+
+	#plays rounds until every pairing is decided or has played max_games games
+	def run(self):
+		pool = make_pool(self.processes, self.map_names)
+		try:
+			while True:
+				tasks = self.next_round()
+				if len(tasks) == 0:
+					break
+				for ((pairing, names, task), result) in zip(tasks, run_tasks(pool, [task for (pairing, names, task) in tasks])):
+					self.record(names, result)
+				self.update_decided()
+		finally:
+			if pool is not None:
+				pool.terminate()
+		return self.report()
+
+	#returns {agent name: statistics} and {pairing: (games played, decided)}
+	def report(self):
+		(elos, errors) = bradley_terry(self.pairwise)
+		z = statistics.NormalDist().inv_cdf(0.5 + self.confidence / 2)
+		agents = {}
+		for (i, name) in enumerate(self.agent_names):
+			games = len(self.scores[name])
+			agents[name] = {
+				'games': games,
+				'win rate': self.places[name][1] / games if games else 0,
+				'mean score': float(np.mean(self.scores[name])) if games else 0,
+				'places': {place: count / games for (place, count) in sorted(self.places[name].items())},
+				'elo': float(elos[i]),
+				'elo interval': (float(elos[i] - z * errors[i]), float(elos[i] + z * errors[i])),
+			}
+		pairings = {pairing: (self.games_played[pairing], self.decided[pairing]) for pairing in self.pairings}
+		return (agents, pairings)
@@ -1,12 +1,17 @@
 import random
 import bisect
 import networkx as nx
+import numpy as np
 import itertools
 import random
 import pickle
 import copyreg
 import types
+import collections.abc
 from agent import Agent
+from longestRoute import longestTrailWeight, maxCitiesOnTrail
+from pathOracle import path_oracle
+from planningCache import PlanningCache
 import copy
 import sys
 
@@ -36,10 +41,15 @@ class LogMove:
 	def __getstate__(self): return self.__dict__
 	def __setstate__(self, d): self.__dict__.update(d)
 
+#rng => the random generator of the agents (by default the generator of the game, see Game)
+#games that are recorded (game.record, see gameRecord.py) need a separate rng: the game must be the only user of its generator
 class GameHandler:
-	def __init__(self, game, agents: list[Agent], filename):
+	def __init__(self, game, agents: list[Agent], filename, rng=None):
 		self.game = game
 		self.agents = agents
+		self.rng = game.rng if rng is None else rng
+		for agent in agents:
+			agent.set_rng(self.rng)
 		self.filename = filename
 		self.turn_count = 0
 		self.last_player = None
@@ -84,13 +94,11 @@ class GameHandler:
 			#(2) score points if this route caused previously-incomplete destination card(s) to be completed
 			#    OR if just helped us make progress on the way
 			player = self.game.players[pnum]
-			player_graph = self.game.player_graph(pnum)
 			for card in player.hand_destination_cards:
 				if card not in player.completed_destination_cards_train:
-					if card.destinations[0] in player_graph.nodes() and card.destinations[1] in player_graph.nodes():
-						if nx.has_path(player_graph, card.destinations[0], card.destinations[1]):
-							player.completed_destination_cards_train.add(card)
-							reward += card.points						
+					if player.connections.completes(card):
+						player.completed_destination_cards_train.add(card)
+						reward += card.points
 					if frozenset((args[0], args[1])) in self.agent_best_paths[pnum][tuple(card.destinations)]:
 						reward += 15
 			
@@ -109,9 +117,8 @@ class GameHandler:
 		for x in range(num_keep, len(dest_card_set) + 1):
 			if not self.game.players[pnum].can_draw_destination_cards(x):
 				continue
-			comb = itertools.combinations(dest_card_set, x)
-			for cardset in comb:
-				pmoves.append(Move('chooseDestinationCards', [pnum, list(cardset)]))
+			for indexes in itertools.combinations(range(len(dest_card_set)), x):
+				pmoves.append(Move('chooseDestinationCards', [pnum, [dest_card_set[i] for i in indexes]], pack_move(3, pnum, sum(1 << i for i in indexes))))
 		
 		assert len(pmoves) > 0
 		for move in pmoves:
@@ -119,9 +126,8 @@ class GameHandler:
 		return pmoves
 	
 	def get_live_path_edges(self, pnum, source, target):
-		jgraph = self.agents[pnum].joint_graph(self.game, pnum)
 		try:
-			sp = nx.shortest_path(jgraph, source, target, weight='weight')
+			sp = path_oracle(self.game.board, pnum, self.game.number_of_players).path(source, target)
 		except:
 			return {}
 		return {frozenset(p) for p in zip(sp, sp[1:])}
@@ -143,8 +149,13 @@ class GameHandler:
 			if tuple(card.destinations) not in self.agent_best_paths[pnum]:
 				self.agent_best_paths[pnum][tuple(card.destinations)] = self.get_live_path_edges(pnum, card.destinations[0], card.destinations[1])
 
+	#save => if True, the record of the game (game.record, see gameRecord.py) is written to filename + runnum + '.npz' at the end
 	def play(self, runnum, save=False):
 		movelog = []
+		if save and self.game.record is None:
+			raise ValueError("Only recorded games can be saved (see gameRecord.py)")
+		if self.game.record is not None and self.rng is self.game.rng:
+			raise ValueError("The agents of a recorded game need their own random generator (GameHandler rng)")
 		
 		self.game.setup()
 
@@ -290,13 +301,12 @@ class GameHandler:
 		#for i in range(0, self.game.number_of_players):
 		#	print("Player " + str(i+1) + ": " + str(self.game.players[i].points))
 
+		if self.game.record is not None:
+			self.game.record.final_points = [p.points for p in self.game.players]
 		if save:
-			f1 = open(self.filename + str(runnum) + '.go', 'wb')
-			f2 = open(self.filename + str(runnum) + '.ml', 'wb')
-			pickle.dump(self.game, f1)
-			pickle.dump(movelog, f2)
-			f1.close()
-			f2.close()
+			#imported here because gameRecord imports this module
+			from gameRecord import save_records
+			save_records(self.filename + str(runnum) + '.npz', [self.game.record])
 
 def numberOfRelativeEdges(graph, multi_edges=True):
 	total_relative_edges_left = 0
@@ -330,7 +340,8 @@ def make_train_deck(number_of_color_cards, number_of_wildcards):
 	cards = {"red": number_of_color_cards, "orange": number_of_color_cards, "blue": number_of_color_cards, "pink": number_of_color_cards, "white": number_of_color_cards, "yellow": number_of_color_cards, "black": number_of_color_cards, "green": number_of_color_cards, "wild": number_of_wildcards}
 	return cards
 
-def randomCard(cards):
+#rng => the random generator to draw with (a random.Random, by default the global one of the random module)
+def randomCard(cards, rng=random):
 	keys = list(cards.keys())
 	total = 0
 	temp = []
@@ -339,7 +350,7 @@ def randomCard(cards):
 		total += cards[x]
 		temp.append(total)
 	
-	seed = random.random() * total
+	seed = rng.random() * total
 	index = bisect.bisect(temp, seed)
 	
 	return keys[index]
@@ -347,6 +358,60 @@ def randomCard(cards):
 def emptyCardDict():
 	return {"red": 0, "orange": 0, "blue": 0, "pink": 0, "white": 0, "yellow": 0, "black": 0, "green": 0, "wild": 0}
 
+#colors of the train cards of a hand, in the order of emptyCardDict
+HAND_COLORS = list(emptyCardDict())
+HAND_INDEX = {color: i for (i, color) in enumerate(HAND_COLORS)}
+
+#the cards of a player: the number of train cards of every color (a list in the order of HAND_COLORS) and the destination
+#cards drawn but not chosen yet (pending), plus the total number of train cards
+#works like the dict hands of older versions: hand[color], hand["destination"] (the pending cards), items(), ...
+#cards => dict of color => number of cards to start with (like emptyCardDict())
+class Hand(collections.abc.MutableMapping):
+	__slots__ = ('counts', 'pending', 'total')
+
+	def __init__(self, cards=None):
+		self.counts = [0] * len(HAND_COLORS)
+		self.pending = []
+		self.total = 0
+		for (card, number) in (cards or {}).items():
+			self[card] = number
+
+	def __getitem__(self, card):
+		if card == "destination":
+			return self.pending
+		return self.counts[HAND_INDEX[card]]
+
+	def __setitem__(self, card, value):
+		if card == "destination":
+			self.pending = value
+			return
+		i = HAND_INDEX[card]
+		self.total += value - self.counts[i]
+		self.counts[i] = value
+
+	def __delitem__(self, card):
+		raise TypeError("cards can't be removed from a hand")
+
+	def __iter__(self):
+		yield from HAND_COLORS
+		yield "destination"
+
+	def __len__(self):
+		return len(HAND_COLORS) + 1
+
+	def __contains__(self, card):
+		return card in HAND_INDEX or card == "destination"
+
+	def __repr__(self):
+		return repr(dict(self))
+
+	def copy(self):
+		h = Hand.__new__(Hand)
+		h.counts = list(self.counts)
+		h.pending = list(self.pending)
+		h.total = self.total
+		return h
+
 #returns a dict that relates the number of trains on a route to how many points that is worth
 # 1 train route is worth 1 point
 # 2 train route is worth 2 points
@@ -361,6 +426,57 @@ def point_table():
 def comparePlayerKey(p1):
 	return p1.points
 
+#every state of a board gets a different version number (see Board.version)
+board_versions = itertools.count()
+
+#the random module (the default generator of games and decks) can't be pickled:
+#objects that use it are saved with rng None and get the random module back when loaded
+def rng_getstate(obj):
+	state = obj.__dict__.copy()
+	if state.get('rng') is random:
+		state['rng'] = None
+	return state
+
+def rng_setstate(obj, d):
+	obj.__dict__.update(d)
+	if obj.__dict__.get('rng') is None:
+		obj.rng = random
+
+#returns a shallow copy of an object (faster than copy.copy, which goes through __reduce_ex__)
+def shallow_copy(obj):
+	c = obj.__class__.__new__(obj.__class__)
+	if hasattr(obj, '__dict__'):
+		c.__dict__.update(obj.__dict__)
+	for name in getattr(obj.__class__, '__slots__', ()):
+		setattr(c, name, getattr(obj, name))
+	return c
+
+#returns a copy of a networkx Graph/MultiGraph with its own edge attribute dicts
+#works directly on the adjacency dicts so the order of nodes and neighbors is exactly the one of the original
+#(agents iterate the board in that order, so G.copy() which re-adds the edges is not good enough)
+#it is also a lot cheaper than copy.deepcopy
+def clone_graph(graph):
+	g = graph.__class__()
+	g.graph.update(graph.graph)
+	for node, data in graph._node.items():
+		g._node[node] = data.copy()
+
+	#both directions of an edge point to the same dict, the clone has to keep it that way
+	cloned = {}
+	for node1, neighbors in graph._adj.items():
+		g_neighbors = {}
+		for node2, data in neighbors.items():
+			data_id = id(data)
+			if data_id not in cloned:
+				if graph.is_multigraph():
+					cloned[data_id] = {key: attr.copy() for key, attr in data.items()}
+				else:
+					cloned[data_id] = data.copy()
+			g_neighbors[node2] = cloned[data_id]
+		g._adj[node1] = g_neighbors
+
+	return g
+
 #class to encapsulate the destination cards
 #dest1 and dest2 => strings for the two destinations
 #points => integer for how many points the player wins by completing that conection
@@ -379,18 +495,76 @@ class DestinationCountryCard(DestinationCard):
 	def __str__(self):
 		return str(self.destinations) + " " + str(self.points) + " " + self.type
 
+#disjoint sets of cities (union-find) to know which cities are connected by the routes of a player
+#routes are only added during a game, so connected(city1, city2) gives the same answer as nx.has_path on the player graph
+#(False if one of the cities is not in the graph) without traversing it
+class CityUnionFind:
+	def __init__(self):
+		self.parent = {}
+		self.size = {}
+
+	def copy(self):
+		u = CityUnionFind()
+		u.parent = self.parent.copy()
+		u.size = self.size.copy()
+		return u
+
+	def find(self, city):
+		parent = self.parent
+		while parent[city] != city:
+			parent[city] = parent[parent[city]]
+			city = parent[city]
+		return city
+
+	def add_city(self, city):
+		if city not in self.parent:
+			self.parent[city] = city
+			self.size[city] = 1
+
+	def union(self, city1, city2):
+		self.add_city(city1)
+		self.add_city(city2)
+		root1 = self.find(city1)
+		root2 = self.find(city2)
+		if root1 == root2:
+			return
+		if self.size[root1] < self.size[root2]:
+			(root1, root2) = (root2, root1)
+		self.parent[root2] = root1
+		self.size[root1] += self.size[root2]
+
+	def connected(self, city1, city2):
+		if city1 not in self.parent or city2 not in self.parent:
+			return False
+		return self.find(city1) == self.find(city2)
+
+	#country cards (the second destination is a list of countries) are never completed here, like with the membership test
+	#on the player graph before: calculatePoints scores them by the countries that are reached
+	def completes(self, card):
+		if isinstance(card.destinations[1], list):
+			return False
+		return self.connected(card.destinations[0], card.destinations[1])
+
 #class to encapsulate the player
 #hand => list of train cards (strings) in the player's hand
 #number_of_trains => integer of how many trains the player has left (players start with 45 trains)
 #points => integer of the number of points the player currently has
 #drawing_train_cards => boolean to indicate that the player drew 1 train cards and needs to draw 1 more
+#hand => the train cards to start with, a dict of color => number of cards (use function emptyCardDict above)
 class Player:
+	__slots__ = ('hand', 'hand_destination_cards', 'number_of_trains', 'points', 'graph', 'shared_graph', 'connections', 'drawing_train_cards',
+		'completed_destination_cards', 'completed_destination_cards_train', 'max_incomplete_destination_cards', 'max_train_car_cards')
+
 	def __init__(self, hand, number_of_trains, points):
-		self.hand = hand
+		self.hand = Hand(hand)
 		self.hand_destination_cards = []
 		self.number_of_trains = number_of_trains
 		self.points = points
 		self.graph = nx.Graph()
+		#True while self.graph is shared with a copy of this player (see copy)
+		self.shared_graph = False
+		#cities connected by the routes of the player (kept up to date by add_route)
+		self.connections = CityUnionFind()
 		self.drawing_train_cards = False
 		self.completed_destination_cards = set()
 		self.completed_destination_cards_train = set()
@@ -398,14 +572,37 @@ class Player:
 		self.max_incomplete_destination_cards = 3
 		self.max_train_car_cards = 20
 
+	#returns a snapshot of the player
+	#destination cards are never modified so they are shared, the graph is shared until one of the copies claims a route
 	def copy(self):
-		p = Player(copy.deepcopy(self.hand), self.number_of_trains, self.points)
-		#p.hand_destination_cards = copy.copy(self.hand_destination_cards)
-		p.hand_destination_cards = copy.deepcopy(self.hand_destination_cards)
-		p.drawing_train_cards = self.drawing_train_cards
-		p.graph = copy.deepcopy(self.graph)
+		p = shallow_copy(self)
+		p.hand = self.hand.copy()
+		p.hand_destination_cards = list(self.hand_destination_cards)
+		p.completed_destination_cards = set(self.completed_destination_cards)
+		p.completed_destination_cards_train = set(self.completed_destination_cards_train)
+		p.connections = self.connections.copy()
+		p.shared_graph = self.shared_graph = True
 		return p
 
+	#adds a claimed route to the player graph, cloning the graph first if it is still shared with a copy
+	def add_route(self, city1, city2, weight):
+		if self.shared_graph:
+			self.graph = clone_graph(self.graph)
+			self.shared_graph = False
+		self.graph.add_edge(city1, city2, weight=weight)
+		self.connections.union(city1, city2)
+
+	#removes a route added with add_route (used to undo moves)
+	#remove_cities => cities that were not in the graph before the route was added
+	#connections => the connections of the player before the route was added (union-find can't remove routes)
+	def remove_route(self, city1, city2, remove_cities, connections):
+		if self.shared_graph:
+			self.graph = clone_graph(self.graph)
+			self.shared_graph = False
+		self.graph.remove_edge(city1, city2)
+		self.graph.remove_nodes_from(remove_cities)
+		self.connections = connections
+
 	def print_destination_cards(self):
 		for card in self.hand_destination_cards:
 			print(card)
@@ -418,39 +615,154 @@ class Player:
 		return len(self.hand) - len(self.hand["destination"]) < self.max_train_car_cards
 
 #Data structure to store move data
+#kinds of moves (Move.function), the index of a kind is its id in move codes
+MOVE_KINDS = ['claimRoute', 'drawTrainCard', 'drawDestinationCards', 'chooseDestinationCards']
+MOVE_KIND_IDS = {kind: i for (i, kind) in enumerate(MOVE_KINDS)}
+#color id of the drawTrainCard move that draws the top card of the deck (the first id after the ids of COLOR_NAMES)
+TOP_CARD = 10
+
+#a move code packs a move in one integer: the kind (2 bits), a color id (4 bits, see COLOR_IDS) and a route id (the rest)
+#claimRoute => the route and the color of the cards used, drawTrainCard => the color of the card (TOP_CARD for the top card)
+#drawDestinationCards => nothing, chooseDestinationCards => the player (in place of the color) and the cards kept as a bitmask
+#of the pending destination cards of the player (in place of the route)
+def pack_move(kind, color=0, route=0):
+	return kind | (color << 2) | (route << 6)
+
+#returns (kind, color, route) of a move code
+def unpack_move(code):
+	return (code & 3, (code >> 2) & 15, code >> 6)
+
+DRAW_TOP_CODE = pack_move(1, TOP_CARD)
+DRAW_DESTINATIONS_CODE = pack_move(2)
+
+#colors routes can be claimed with (the colors of ROUTE_COLORS but GRAY), see Game.legal_action_mask
+NUMBER_OF_CLAIM_COLORS = 8
+#most destination cards a player can have to choose from at once (the draw rules of every map give 3)
+MAX_PENDING_CARDS = 3
+
+#returns the first index of the claimRoute, top card, face up card, drawDestinationCards and chooseDestinationCards
+#actions, and the size of the action space of a map with number_of_routes routes (see Game.action_space_size)
+def action_offsets(number_of_routes):
+	claims = number_of_routes * NUMBER_OF_CLAIM_COLORS
+	return (0, claims, claims + 1, claims + 1 + len(HAND_COLORS), claims + 2 + len(HAND_COLORS), claims + 1 + len(HAND_COLORS) + (1 << MAX_PENDING_CARDS))
+
+#copies the lists of move arguments, the rest (strings, destination cards) is shared: it is never changed
+def copy_args(args):
+	if type(args) == list:
+		return [copy_args(arg) for arg in args]
+	return args
+
+#function => kind of move (see MOVE_KINDS), args => arguments of the move (see make_move)
+#code => the move code of the move (see pack_move), the moves of get_possible_moves have it (None if unknown)
 class Move:
-	def __init__(self, fref, args):
+	__slots__ = ('function', 'args', 'code')
+
+	def __init__(self, fref, args, code=None):
 		self.function = fref
 		self.args = args
+		self.code = code
 	
 	def copy(self):
-		m = Move(self.function, copy.deepcopy(self.args))
-		return m
+		return Move(self.function, copy_args(self.args), self.code)
 
 
 #class to encapsulate decks (train card deck and destination deck)
-#deck => list of cards (strings for train deck, DestinationCard class for destination deck) of the deck 
+#deck => dictionary of card => number of copies of the card in the deck (strings for train deck, DestinationCard class for destination deck)
+#besides the dictionary, the deck keeps the number of cards left in the deck and in the discard pile (see remaining and discarded)
+#and a fenwick tree of the counts (in the order of the keys of self.deck) to draw a card in O(log n)
+#if self.deck is changed directly (instead of with draw_card/reshuffle), call recount afterwards
+#rng => the random generator cards are drawn with (see Game)
+#shuffle_rng => if given, the deck is a real shuffled pile instead: it is shuffled with shuffle_rng when it is made
+#(and when the discard pile is put back), then cards are drawn from the top without using rng
 class CardManager:
-	def __init__(self, cardlist):
+	def __init__(self, cardlist, rng=random, shuffle_rng=None):
 		self.deck = cardlist
 		self.discard_pile = {}
+		self.rng = rng
+		self.shuffle_rng = shuffle_rng
+		#the cards of a shuffled deck in the order they are drawn (from the end), None if the deck isn't shuffled
+		self.order = None
+		self.recount()
+
+	def __getstate__(self): return rng_getstate(self)
+	def __setstate__(self, d): rng_setstate(self, d)
 
 	def __len__(self):
 		return len(self.deck)
 
+	#cards themselves are never modified, so only the counts need to be copied
 	def copy(self):
-		#c = CardManager(copy.copy(self.deck))
-		#c.discard_pile = copy.copy(self.discard_pile)
-		c = CardManager(copy.deepcopy(self.deck))
-		c.discard_pile = copy.deepcopy(self.discard_pile)
+		c = shallow_copy(self)
+		c.deck = self.deck.copy()
+		c.discard_pile = self.discard_pile.copy()
+		c.tree = list(self.tree)
+		if self.order is not None:
+			c.order = list(self.order)
+			c.shuffle_rng = copy.copy(self.shuffle_rng)
 		return c
 
+	#rebuilds the totals and the fenwick tree from self.deck and self.discard_pile
+	def recount(self):
+		self.cards = list(self.deck.keys())
+		self.card_index = {card: i for (i, card) in enumerate(self.cards)}
+		counts = [count if isinstance(count, int) else 0 for count in self.deck.values()]
+		self.total = sum(counts)
+		self.discard_total = sum(self.discard_pile.values())
+
+		#tree[i] holds the sum of the counts of the cards in (i - lowbit(i), i]
+		self.tree = [0] + counts
+		for i in range(1, len(self.tree)):
+			parent = i + (i & -i)
+			if parent < len(self.tree):
+				self.tree[parent] += self.tree[i]
+		self.top_step = 1 << (len(self.cards).bit_length() - 1) if self.cards else 0
+		if self.shuffle_rng is not None:
+			self.shuffle()
+
+	#puts the cards of the deck in a new random order (shuffled decks only)
+	def shuffle(self):
+		self.order = [card for card in self.cards if isinstance(self.deck[card], int) for i in range(self.deck[card])]
+		self.shuffle_rng.shuffle(self.order)
+
+	#number of cards left in the deck
+	def remaining(self):
+		return self.total
+
+	#number of cards in the discard pile
+	def discarded(self):
+		return self.discard_total
+
 	#returns a randomly picked card from the list (deck)
+	#each card is picked with probability count/total, with a single rng.random() per draw (same cards as randomCard(self.deck, self.rng))
+	#a shuffled deck returns its top card instead
 	def draw_card(self):
-		if (sum(self.deck.values()) == 0):
+		if self.total == 0:
 			self.reshuffle()
-		card = randomCard(self.deck)
+
+		if self.order is not None:
+			card = self.order.pop()
+			position = self.card_index[card]
+		else:
+			seed = self.rng.random() * self.total
+
+			#finds the first card whose cumulative count is bigger than seed
+			position = 0
+			cumulative = 0
+			step = self.top_step
+			while step > 0:
+				next_position = position + step
+				if next_position < len(self.tree) and cumulative + self.tree[next_position] <= seed:
+					position = next_position
+					cumulative += self.tree[next_position]
+				step >>= 1
+			card = self.cards[position]
+
 		self.deck[card] -= 1
+		self.total -= 1
+		i = position + 1
+		while i < len(self.tree):
+			self.tree[i] -= 1
+			i += i & -i
 
 		return card
 
@@ -462,28 +774,237 @@ class CardManager:
 					self.discard_pile[c] += 1
 				else:
 					self.discard_pile[c] = 1
+				self.discard_total += 1
 		else:
 			if card in self.discard_pile:
 				self.discard_pile[card] += 1
 			else:
 				self.discard_pile[card] = 1
+			self.discard_total += 1
 
 	#assumes an empty deck. Puts all cards from the discard pile back in the deck. Empties the discard_pile
 	def reshuffle(self):
 		#self.deck = copy.copy(self.discard_pile)
 		self.deck = self.discard_pile.copy()
 		self.discard_pile = {}
+		self.recount()
+
+#colors of the routes, in the order moves are generated. Index of a color = its color id in RouteTable
+ROUTE_COLORS = ["RED", "ORANGE", "BLUE", "PINK", "WHITE", "YELLOW", "BLACK", "GREEN", "GRAY"]
+#every color id: the colors of the routes and the wild cards. Names are uppercase for routes, lowercase for train cards
+COLOR_NAMES = ROUTE_COLORS + ["WILD"]
+#color name (either case) => color id
+COLOR_IDS = {name: i for (i, color) in enumerate(COLOR_NAMES) for name in (color, color.lower())}
+#color id => name of the train cards of that color (the keys of Player.hand)
+CARD_NAMES = [color.lower() for color in COLOR_NAMES]
+#returns the name of the train cards of a color name (either case), other colors (odd colors of some maps) are lowercased
+def card_name(color):
+	color_id = COLOR_IDS.get(color)
+	return CARD_NAMES[color_id] if color_id is not None else color.lower()
+
+#color id of the gray routes, that can be claimed with the cards of any color
+GRAY_ID = COLOR_IDS["GRAY"]
+
+#the route between these cities can be claimed with any 4 cards instead of a missing card (nordic countries map)
+SPECIAL_NORDIC_CITIES = {"murmansk", "lieksa"}
+
+#returns the value of a destination card as a hashable tuple (city1, city2, points): country cards have lists of countries and points
+def ticket_key(card):
+	(destination1, destination2) = card.destinations
+	points = card.points
+	if isinstance(destination2, list):
+		destination2 = tuple(destination2)
+	if isinstance(points, list):
+		points = tuple(points)
+	return (destination1, destination2, points)
+
+#static description of all routes of a map, with one row per route (edge of the board MultiGraph)
+#built once when the board is loaded and shared by every copy of the board (it never changes during a game)
+#routes are numbered in the order of graph.edges(keys=True), city pairs in the order they first appear there
+#graph => the board graph as returned by loadgraphfromfile
+class RouteTable:
+	def __init__(self, graph):
+		self.cities = list(graph.nodes())
+		self.city_index = {city: i for (i, city) in enumerate(self.cities)}
+		self.color_names = list(ROUTE_COLORS)
+
+		#python values of each route, for lookups of a single route
+		#each row is (city1, city2, key, weight, color, ferries, underground, mountain)
+		self.rows = []
+		#(city1, city2, key) => route id, in both orientations
+		self.route_index = {}
+		#list of (city1, city2) and (city1, city2) => pair id, in both orientations
+		self.pairs = []
+		self.pair_index = {}
+		#list of route ids of each pair, in key order
+		self.pair_routes = []
+		pair_of_route = []
+		colors = []
+
+		for (city1, city2, key, data) in graph.edges(keys=True, data=True):
+			if (city1, city2) not in self.pair_index:
+				self.pair_index[(city1, city2)] = self.pair_index[(city2, city1)] = len(self.pairs)
+				self.pairs.append((city1, city2))
+				self.pair_routes.append([])
+			route = len(self.rows)
+			self.route_index[(city1, city2, key)] = self.route_index[(city2, city1, key)] = route
+			self.pair_routes[self.pair_index[(city1, city2)]].append(route)
+			pair_of_route.append(self.pair_index[(city1, city2)])
+			if data['color'] not in self.color_names:
+				self.color_names.append(data['color'])
+			colors.append(self.color_names.index(data['color']))
+			self.rows.append((city1, city2, key, data['weight'], data['color'], data['ferries'], data['underground'], data['mountain']))
+
+		self.number_of_routes = len(self.rows)
+		self.number_of_pairs = len(self.pairs)
+		#rank of every city id in the alphabetical order of the names (to order two cities without comparing strings)
+		self.city_rank = [0] * len(self.cities)
+		for (rank, city) in enumerate(sorted(range(len(self.cities)), key=lambda c: self.cities[c])):
+			self.city_rank[city] = rank
+		#whether each pair is the special nordic route (see SPECIAL_NORDIC_CITIES)
+		self.special_pair = [set(c.lower() for c in pair) == SPECIAL_NORDIC_CITIES for pair in self.pairs]
+		#destination cards of the map (see add_tickets): list of ticket keys and ticket key => ticket id
+		self.tickets = []
+		self.ticket_index = {}
+		#color id and pair id of every route as python lists, for lookups of a single route
+		self.route_color = colors
+		self.route_pair = pair_of_route
+		self.city1 = np.array([self.city_index[r[0]] for r in self.rows], dtype=np.int32)
+		self.city2 = np.array([self.city_index[r[1]] for r in self.rows], dtype=np.int32)
+		self.length = np.array([r[3] for r in self.rows], dtype=np.int32)
+		self.color = np.array(colors, dtype=np.int32)
+		self.ferries = np.array([r[5] for r in self.rows], dtype=np.int32)
+		self.underground = np.array([r[6] for r in self.rows], dtype=bool)
+		self.mountain = np.array([r[7] for r in self.rows], dtype=np.int32)
+		self.pair = np.array(pair_of_route, dtype=np.int32)
+
+	#returns the route ids between two cities (empty list if there is no route)
+	def routes_between(self, city1, city2):
+		pair = self.pair_index.get((city1, city2))
+		if pair is None:
+			return []
+		return self.pair_routes[pair]
+
+	#numbers the destination cards of a deck that aren't numbered yet, in the order of the deck
+	#called when the map is loaded (see MapBundle.board) and when a game is made (for decks that weren't loaded from a bundle)
+	def add_tickets(self, cards):
+		for card in cards:
+			key = ticket_key(card)
+			if key not in self.ticket_index:
+				self.ticket_index[key] = len(self.tickets)
+				self.tickets.append(key)
+
+	#returns the id of a destination card, the same for every copy of the card
+	#raises KeyError if the card isn't one of the cards numbered by add_tickets
+	def ticket_id(self, card):
+		return self.ticket_index[ticket_key(card)]
 
 #class to encapsulate the Board (represented by a graph from the library networkx)
 #board_graph => graph that represents the board (a graph in networkx is represented by a dictionary)
+#route state is also kept in arrays (see RouteTable): self.owner holds the owner of every route (-1 if free)
+#the graph is kept in sync with self.owner so agents can keep reading game.board.graph
 class Board:
 	def __init__(self, board_graph):
 		self.graph = board_graph
-
+		#True while self.graph is shared with a copy of this board (see copy)
+		self.shared_graph = False
+		self.routes = RouteTable(board_graph)
+		#changes every time the owner of a route changes, two boards with the same version have the same routes claimed
+		self.version = next(board_versions)
+		self.owner = np.array([row_owner for (_, _, _, row_owner) in board_graph.edges(keys=True, data='owner')], dtype=np.int32)
+		#(pnum, number_of_players) => PathOracle of the player (see pathOracle.path_oracle)
+		self.path_oracles = {}
+		#graphs and lists the agents build from this version of the board (see planningCache.py)
+		self.planning_cache = PlanningCache()
+
+	#the path oracles and the planning cache are only caches, they aren't saved
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['path_oracles'] = {}
+		state['planning_cache'] = PlanningCache()
+		return state
+
+	#versions are only unique inside a process, so a board loaded from a pickle gets a new one
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.__dict__.setdefault('path_oracles', {})
+		self.__dict__.setdefault('planning_cache', PlanningCache())
+		self.version = next(board_versions)
+
+	#returns a snapshot of the board
+	#the route table is shared, the graph is shared copy-on-write: it only gets cloned when one of the boards changes the owner of a route
+	#the path oracles are shared too (an oracle is copied before it is synced with another version, see path_oracle),
+	#the copy starts with the entries of the planning cache but adds its own to a cache of its own
 	def copy(self):
-		b = Board(copy.deepcopy(self.graph))
+		b = shallow_copy(self)
+		b.owner = self.owner.copy()
+		b.shared_graph = self.shared_graph = True
+		b.path_oracles = dict(self.path_oracles)
+		b.planning_cache = self.planning_cache.copy()
 		return b
 
+	#returns the attribute dict of a route (as stored in the graph)
+	def route(self, route_id):
+		(city1, city2, key) = self.routes.rows[route_id][:3]
+		return self.graph[city1][city2][key]
+
+	#sets the owner of a route and returns the route (edge) as stored in this board's graph
+	#edge => one of the routes returned by get_connection/get_free_connection for city1 and city2
+	def set_owner(self, city1, city2, edge, owner):
+		connections = self.get_connection(city1, city2)
+		key = next(k for k in connections if connections[k] is edge)
+		return self.set_route_owner(self.routes.route_index[(city1, city2, key)], owner)
+
+	#same as set_owner, for a route id
+	def set_route_owner(self, route_id, owner):
+		if self.shared_graph:
+			self.graph = clone_graph(self.graph)
+			self.shared_graph = False
+		edge = self.route(route_id)
+		edge['owner'] = owner
+		self.owner[route_id] = owner
+		self.version = next(board_versions)
+		return edge
+
+	#####################
+	#   ROUTE QUERIES   #
+	#####################
+	#all of these return boolean masks over routes (or pairs of cities) of self.routes
+
+	def free_routes(self):
+		return self.owner == -1
+
+	def routes_owned_by(self, player):
+		return self.owner == player
+
+	#returns a mask over pairs of cities that have at least one claimed route (owned by player, if given)
+	def claimed_pairs(self, player=None):
+		owned = self.owner != -1 if player is None else self.owner == player
+		return np.bincount(self.routes.pair[owned], minlength=self.routes.number_of_pairs) > 0
+
+	#returns the routes that can't be claimed because of double-route locking
+	#if number_of_players < 4, only 1 route can be claimed between the same two cities
+	#player => if given, also locks the routes between two cities where this player already owns a route
+	def locked_routes(self, number_of_players, player=None):
+		if number_of_players < 4:
+			locked_pairs = self.claimed_pairs()
+		elif player is not None:
+			locked_pairs = self.claimed_pairs(player)
+		else:
+			return np.zeros(self.routes.number_of_routes, dtype=bool)
+		return locked_pairs[self.routes.pair] & (self.owner == -1)
+
+	#returns the free routes that are not locked (and have at least min_weight_edge trains)
+	def claimable_routes(self, number_of_players, player=None, min_weight_edge=0):
+		return self.free_routes() & ~self.locked_routes(number_of_players, player) & (self.routes.length >= min_weight_edge)
+
+	#number of pairs of cities with at least one free route (multi_edges=True) or with no claimed route (multi_edges=False)
+	#same as numberOfRelativeEdges(self.graph, multi_edges)
+	def number_of_relative_edges(self, multi_edges=True):
+		if multi_edges:
+			return int(np.count_nonzero(np.bincount(self.routes.pair[self.free_routes()], minlength=self.routes.number_of_pairs)))
+		return int(self.routes.number_of_pairs - np.count_nonzero(self.claimed_pairs()))
+
 	#returns a route (edge) of a specific color that connect two cities
 	#if color is None, return a list of all routes between the two cities
 	#city1 => string of one of the cities in the route
@@ -516,25 +1037,53 @@ class Board:
 	#color => the color of the route. If color is None, returns list of all possible unclaimed routes
 	#number_of_players => the number of players in the current game
 	def get_free_connection(self, city1, city2, color=None, number_of_players=2, special_variant=False):
-		connections = self.get_connection(city1, city2)
-		locked = False
+		if color is None:
+			if self.pair_locked(city1, city2, number_of_players, special_variant):
+				return None
+			return [self.route(r) for r in self.routes.routes_between(city1, city2) if self.owner[r] == -1]
+
+		route = self.free_route_id(city1, city2, color, number_of_players, special_variant)
+		if route is None:
+			return None
+		return self.route(route)
+
+	#True if no route between city1 and city2 can be claimed anymore because one of them was claimed
+	def pair_locked(self, city1, city2, number_of_players=2, special_variant=False):
+		pair = self.routes.pair_index.get((city1, city2))
+		return pair is not None and self.pair_id_locked(pair, number_of_players, special_variant)
+
+	#same as pair_locked, for a pair id
+	def pair_id_locked(self, pair, number_of_players=2, special_variant=False):
 		if number_of_players < 4 or (number_of_players == 3 and special_variant):
-			for c in connections:
-				if connections[c]['owner'] != -1:
-					locked = True
-
-		if not locked:
-			if color is None:
-				ret = []
-				for c in connections:
-					if connections[c]['owner'] == -1:
-						ret.append(connections[c])
-				return ret
-			for c in connections:
-				if (connections[c]['color'] == color or connections[c]['color'] == "GRAY") and connections[c]['owner'] == -1:
-					return connections[c]
+			for r in self.routes.pair_routes[pair]:
+				if self.owner[r] != -1:
+					return True
+		return False
+
+	#same as get_free_connection (with a color) but returns the id of the route in self.routes
+	def free_route_id(self, city1, city2, color, number_of_players=2, special_variant=False):
+		if self.pair_locked(city1, city2, number_of_players, special_variant):
+			return None
+		for r in self.routes.routes_between(city1, city2):
+			route_color = self.routes.rows[r][4]
+			if (route_color == color or route_color == "GRAY") and self.owner[r] == -1:
+				return r
+		return None
+
+	#same as free_route_id, for a pair id and a color id
+	def free_pair_route(self, pair, color, number_of_players=2, special_variant=False):
+		if self.pair_id_locked(pair, number_of_players, special_variant):
+			return None
+		route_color = self.routes.route_color
+		for r in self.routes.pair_routes[pair]:
+			if (route_color[r] == color or route_color[r] == GRAY_ID) and self.owner[r] == -1:
+				return r
 		return None
 
+#variants of the games of training.py/agent_test.py (the usa rules, see Game): also used with the europe map
+#by parallelRunner and the only rules BatchEnv plays
+USA_VARIANTS = [3, 2, 3, 1, True, False, False, False, False, False, 4, 5, 2, 3, 2, 10, 15, 2, False]
+
 #class that encapsulate the game itself
 #board => object of the Board class (defined above)
 #point_table => dictionary (use function point_table above)
@@ -564,12 +1113,27 @@ class Board:
 #the same concept is applied to all other move. If a move function has no parameters just pass an empty list, for example:
 #game.make_move(game.move_drawDestinationCards, [])
 
+#rng => the random generator of the game (decks, first player, long routes of Europe), a random.Random
+#by default the global generator of the random module, give every game its own random.Random(seed) to be able to
+#replay it or play games side by side. Copies of the game (see copy) share the generator
+#deck_seed => if given, both decks are shuffled piles (see CardManager) with their own generators seeded from deck_seed:
+#the cards drawn (face up cards included) don't depend on rng or on the random choices of the agents, so games with the
+#same deck_seed deal the same cards to the same seats whoever sits there (common random numbers to compare agents)
 class Game:
-	def __init__(self, board, point_table, destination_deck, train_deck, players, current_player, variants=[3, 2, 3, 1, True, False, False, False, False, False, 4, 5, 2, 3, 2, 10, 15, 2, False]):
+	def __init__(self, board, point_table, destination_deck, train_deck, players, current_player, variants=[3, 2, 3, 1, True, False, False, False, False, False, 4, 5, 2, 3, 2, 10, 15, 2, False], rng=random, deck_seed=None):
 		self.board = board
 		self.point_table = point_table
-		self.destination_deck = CardManager(destination_deck)
-		self.train_deck = CardManager(train_deck)
+		self.rng = rng
+		#the cards of the deck get their ticket ids before the deck is dealt (long routes are a list of cards in some decks)
+		board.routes.add_tickets(card for card in destination_deck if card != 'long_routes')
+		if 'long_routes' in destination_deck:
+			board.routes.add_tickets(destination_deck['long_routes'])
+		if deck_seed is None:
+			self.destination_deck = CardManager(destination_deck, rng)
+			self.train_deck = CardManager(train_deck, rng)
+		else:
+			self.destination_deck = CardManager(destination_deck, rng, random.Random(f"destination {deck_seed}"))
+			self.train_deck = CardManager(train_deck, rng, random.Random(f"train {deck_seed}"))
 		self.train_cards_face_up = emptyCardDict()
 		self.number_of_players = len(players)
 		self.players = players
@@ -588,6 +1152,17 @@ class Game:
 
 		self.number_of_current_draws = 0
 
+		#routes that can be claimed with each color, for every pair of cities (see update_claim_options)
+		self.claim_options = None
+		self.update_claim_options()
+		#player index => (state key, claimRoute moves) of the last call to get_claim_route_moves
+		self.claim_moves_cache = {}
+
+		#stack of frames to undo moves (see enable_undo). None when undo is disabled
+		self.undo_stack = None
+		#record every make_move and choose_destination_cards call is added to (see gameRecord.py). None when not recording
+		self.record = None
+
 		#TWEAKABLE
 		self.number_of_train_cards_first_turn = variants[10] #4
 		self.number_of_face_up_train_cards = variants[11] #5
@@ -601,34 +1176,30 @@ class Game:
 
 		#Number of trains players start the game with
 
-	def __getstate__(self): return self.__dict__
-	def __setstate__(self, d): self.__dict__.update(d)
+	def __getstate__(self): return rng_getstate(self)
+	def __setstate__(self, d): rng_setstate(self, d)
 
 	def set_moves_reference(self):
 		self.moves_reference['claimRoute'] = self.move_claimRoute
 		self.moves_reference['drawDestinationCards'] = self.move_drawDestinationCards
 		self.moves_reference['drawTrainCard'] = self.move_drawTrainCard
 		
+	#returns a snapshot of the game that can be modified without changing this game
+	#the board graph and the player graphs are shared copy-on-write and destination cards are shared,
+	#so only the small mutable parts (hands, decks, face up cards, route owners once changed) get copied
 	def copy(self):
-		copy_players = []
-		for p in self.players:
-			copy_players.append(p.copy())
-		#g = Game(self.board.copy(), self.point_table, copy.copy(self.destination_deck), copy.copy(self.train_deck), copy_players, self.current_player)
-		g = Game(self.board.copy(), self.point_table, {}, {}, copy_players, self.current_player, self.destination_deck_draw_rules + [self.longest_route_variant, self.globetrotter_variant, self.europe_variant, self.switzerland_variant, self.nordic_countries_variant, self.india_variant,self.number_of_train_cards_first_turn,self.number_of_face_up_train_cards, self.limit_of_face_up_wild_cards, self.number_of_cards_drawn_on_underground, self.number_of_leftover_trains_to_end_game, self.amount_of_points_longest_route, self.amount_of_points_globetrotter, self.number_of_cards_draw_per_turn, self.asia_variant])
-		g.set_moves_reference()
+		g = shallow_copy(self)
+		g.board = self.board.copy()
+		g.players = [p.copy() for p in self.players]
 		g.destination_deck = self.destination_deck.copy()
 		g.train_deck = self.train_deck.copy()
-		g.last_turn_player = self.last_turn_player
-		g.train_cards_face_up = copy.deepcopy(self.train_cards_face_up)
-		#g.number_of_train_cards_first_turn = self.number_of_train_cards_first_turn
-		#g.number_of_face_up_train_cards = self.number_of_face_up_train_cards
-		#g.limit_of_face_up_wild_cards = self.limit_of_face_up_wild_cards
-		#g.number_of_cards_drawn_on_underground = self.number_of_cards_drawn_on_underground
-		#g.number_of_leftover_trains_to_end_game = self.number_of_leftover_trains_to_end_game
-		#g.amount_of_points_longest_route = self.amount_of_points_longest_route
-		#g.amount_of_points_globetrotter = self.amount_of_points_globetrotter
-		#g.number_of_cards_draw_per_turn = self.number_of_cards_draw_per_turn
-		#g.number_of_current_draws = self.number_of_current_draws
+		g.train_cards_face_up = self.train_cards_face_up.copy()
+		g.claim_options = list(self.claim_options)
+		g.claim_moves_cache = dict(self.claim_moves_cache)
+		g.undo_stack = None
+		g.record = None
+		g.moves_reference = {}
+		g.set_moves_reference()
 
 		return g
 
@@ -640,11 +1211,12 @@ class Game:
 			for i in range(0, self.number_of_players):
 				if "destination" not in self.players[i].hand:
 					self.players[i].hand["destination"] = []
-				card = random.choice(self.destination_deck.deck['long_routes'])
+				card = self.rng.choice(self.destination_deck.deck['long_routes'])
 				self.players[i].hand["destination"].append(card)
 				self.destination_deck.deck['long_routes'].remove(card)
 
 			self.destination_deck.deck['long_routes'] = 0
+			self.destination_deck.recount()
 
 		for i in range (0, self.number_of_players):
 			for j in range(0, self.number_of_train_cards_first_turn):
@@ -655,7 +1227,7 @@ class Game:
 				self.players[i].hand["destination"].append(self.draw_card(self.destination_deck))
 			dlen = len(self.players[i].hand["destination"])
 			assert dlen == 3, f"player should have 3 dcards at setup but has {dlen}"
-		self.current_player = random.choice([x for x in range(0, self.number_of_players)])
+		self.current_player = self.rng.choice([x for x in range(0, self.number_of_players)])
 		self.who_went_first = self.current_player
 
 		for i in range(0, self.number_of_face_up_train_cards):
@@ -666,7 +1238,7 @@ class Game:
 	def draw_card(self, deck):
 		card = deck.draw_card()
 
-		if deck == self.train_deck and sum(self.train_deck.deck.values()) == 0:
+		if deck == self.train_deck and self.train_deck.remaining() == 0:
 			self.train_deck.reshuffle()
 
 		return card
@@ -697,7 +1269,7 @@ class Game:
 
 				if 'wild' in card_count:
 					if card_count['wild'] >= self.limit_of_face_up_wild_cards + 1:
-						x = sum(self.train_deck.deck.values()) + sum(self.train_deck.discard_pile.values())
+						x = self.train_deck.remaining() + self.train_deck.discarded()
 						if x > self.number_of_face_up_train_cards:
 							self.train_deck.discard(self.train_cards_face_up)
 							self.train_cards_face_up = emptyCardDict()
@@ -730,6 +1302,10 @@ class Game:
 	def choose_destination_cards(self, player, cards, min_num_cards):
 
 		#print "cards:" + str(cards)
+		if self.undo_stack is not None:
+			self.push_undo_frame()
+		if self.record is not None:
+			self.record.add_move(self, 'chooseDestinationCards', [player, cards])
 		
 		if len(cards) >= min_num_cards:
 			#print self.players[player].hand
@@ -752,10 +1328,10 @@ class Game:
 	#returns the list of cards he needs to use to claim the route
 	#if the player doesn't have enough of the color, it will try to complete the requirements with wild cards
 	def checkPlayerHandRequirements(self, player_index, number_of_cards, color, ferries, special_nordic_route=False):
-		if sum([x for x in self.players[player_index].hand.values() if isinstance(x, int)]) < number_of_cards:
+		if self.players[player_index].hand.total < number_of_cards:
 			return False
 
-		color = color.lower()
+		color = card_name(color)
 
 		card_count = self.players[player_index].hand
 		total = 0
@@ -769,7 +1345,7 @@ class Game:
 				color = 'wild'
 	
 		if special_nordic_route:
-			total_cards_left = sum([x for x in self.players[player_index].hand.values() if isinstance(x, int)])
+			total_cards_left = self.players[player_index].hand.total
 			total_cards_left = total_cards_left - total
 			total = total + (total_cards_left/4)
 
@@ -803,10 +1379,9 @@ class Game:
 
 				while (len(cards_to_use) - length_of_original_color) < number_of_cards:
 					temp_dictionary = {}
-					for key in card_count:
-						if isinstance(card_count[key], int):
-							if key not in cards_to_use and card_count[key] > 0:
-								temp_dictionary[key] = card_count[key]
+					for (key, count) in zip(HAND_COLORS, card_count.counts):
+						if key not in cards_to_use and count > 0:
+							temp_dictionary[key] = count
 
 					next_color = min(temp_dictionary, key=temp_dictionary.get)
 					number_of_cards_left = number_of_cards - len(cards_to_use) + length_of_original_color
@@ -825,28 +1400,34 @@ class Game:
 	def move_claimRoute(self, args):
 		#if len(args) == 2:
 		#	return self.claimRoute(args[0], args[1])
-		return self.claimRoute(args[0], args[1], args[2])		
+		return self.claim_route(args[0], args[1], args[2])		
 
 	#claims a route of a specific color between two cities
 	#city1 and city2 => strings of the two cities that form the route
 	#color => string of the color of the route to claim
 	#if the route is a gray route, pass color as the color you want to use to claim that route, for example:
 	#if you want to claim a gray route with blue cards, pass 'blue' as the color
+	#called outside make_move, so with undo enabled the claim gets its own undo frame (it isn't recorded, see gameRecord.py)
 	def claimRoute(self, city1, city2, color):
-		edge = self.board.get_free_connection(city1, city2, color, self.number_of_players, self.switzerland_variant or self.nordic_countries_variant)
+		if self.undo_stack is not None:
+			self.push_undo_frame(recorded=False)
+		return self.claim_route(city1, city2, color)
+
+	#claimRoute without an undo frame: the frame of the move is pushed by make_move
+	def claim_route(self, city1, city2, color):
+		route = self.board.free_route_id(city1, city2, color, self.number_of_players, self.switzerland_variant or self.nordic_countries_variant)
+		edge = self.board.route(route) if route is not None else None
 
 		if edge != None and edge['owner'] == -1:
 			route_color = edge['color'] if edge['color'] != 'GRAY' else color
+			#name of the train cards of the color of the route
+			card_color = card_name(route_color)
 			
-			if color.lower() == 'wild' and (self.switzerland_variant or self.nordic_countries_variant):
+			if card_name(color) == 'wild' and (self.switzerland_variant or self.nordic_countries_variant):
 				return False
 
-			special_nordic_route = False
-				
-			if self.nordic_countries_variant:
-				cities = [city1.lower(), city2.lower()]
-				if "murmansk" in cities and "lieksa" in cities:
-					special_nordic_route = True
+			pair = self.board.routes.route_pair[route]
+			special_nordic_route = self.nordic_countries_variant and self.board.routes.special_pair[pair]
 			
 			cards_needed = self.checkPlayerHandRequirements(self.current_player, edge['weight'], route_color, edge['ferries'], special_nordic_route)
 
@@ -855,34 +1436,34 @@ class Game:
 			
 				if edge['underground']:
 					extra_weight = 0
-					y = self.number_of_cards_drawn_on_underground if (sum(self.train_deck.deck.values()) + sum(self.train_deck.discard_pile.values()))  >= self.number_of_cards_drawn_on_underground else (sum(self.train_deck.deck.values()) +  sum(self.train_deck.discard_pile.values()))
+					y = self.number_of_cards_drawn_on_underground if (self.train_deck.remaining() + self.train_deck.discarded()) >= self.number_of_cards_drawn_on_underground else (self.train_deck.remaining() + self.train_deck.discarded())
 					for i in range(0, y):
 						card = self.draw_card(self.train_deck)
-						if card.lower() == route_color.lower() or card.lower() == "wild":
+						if card == card_color or card == "wild":
 							extra_weight = extra_weight + 1
 						self.train_deck.discard(card)
 					
-					if sum(self.train_deck.deck.values()) == 0:
+					if self.train_deck.remaining() == 0:
 						self.train_deck.reshuffle()
 				
 					if extra_weight > 0:
-						total_player_hand = self.players[self.current_player].hand[route_color.lower()]
-						if route_color.lower() != "wild":
+						total_player_hand = self.players[self.current_player].hand[card_color]
+						if card_color != "wild":
 							total_player_hand += self.players[self.current_player].hand["wild"]
 						
 						if len(cards_needed) + extra_weight > total_player_hand:
 							not_enough_cards = True
 						else:
-							if self.players[self.current_player].hand[route_color.lower()] >= len(cards_needed) + extra_weight:
+							if self.players[self.current_player].hand[card_color] >= len(cards_needed) + extra_weight:
 								for i in range(0, extra_weight):
-									cards_needed.append(route_color.lower())
+									cards_needed.append(card_color)
 									
 								extra_weight = 0
 								
-							elif self.players[self.current_player].hand[route_color.lower()] > len(cards_needed):
-								difference = self.players[self.current_player].hand[route_color.lower()] - len(cards_needed)
+							elif self.players[self.current_player].hand[card_color] > len(cards_needed):
+								difference = self.players[self.current_player].hand[card_color] - len(cards_needed)
 								for i in range(0, difference):
-									cards_needed.append(route_color.lower())
+									cards_needed.append(card_color)
 								
 								extra_weight = extra_weight - difference
 							
@@ -890,22 +1471,27 @@ class Game:
 								cards_needed.append("wild")
 						
 				if not not_enough_cards:
+					if self.undo_stack is not None:
+						key = self.board.routes.rows[route][2]
+						new_cities = [c for c in set([city1, city2]) if c not in self.players[self.current_player].graph]
+						self.undo_stack[-1]['routes'].append((self.current_player, city1, city2, key, new_cities, self.players[self.current_player].connections.copy()))
+
 					self.discard_cards(self.current_player, cards_needed)
 					self.players[self.current_player].number_of_trains = self.players[self.current_player].number_of_trains - edge['weight']
-					edge['owner'] = self.current_player
+					edge = self.board.set_route_owner(route, self.current_player)
+					self.update_claim_options([pair])
 					self.players[self.current_player].points = self.players[self.current_player].points + self.point_table[edge['weight']]
 					if edge['mountain'] != 0:
 						self.players[self.current_player].number_of_trains = self.players[self.current_player].number_of_trains - edge['mountain']
 						self.players[self.current_player].points = self.players[self.current_player].points + (edge['mountain'] * 2)
 
-					self.players[self.current_player].graph.add_edge(city1, city2, weight=edge['weight'])
+					self.players[self.current_player].add_route(city1, city2, edge['weight'])
 
 					cur_player_obj = self.players[self.current_player]
 					for card in cur_player_obj.hand_destination_cards:
 						if card not in cur_player_obj.completed_destination_cards:
-							if card.destinations[0] in cur_player_obj.graph.nodes() and card.destinations[1] in cur_player_obj.graph.nodes():
-								if nx.has_path(cur_player_obj.graph, card.destinations[0], card.destinations[1]):
-									cur_player_obj.completed_destination_cards.add(card)
+							if cur_player_obj.connections.completes(card):
+								cur_player_obj.completed_destination_cards.add(card)
 			else:
 				return False
 
@@ -924,10 +1510,10 @@ class Game:
 
 	#draws 3 new destination cards of which the player is required to keep at least 1 (rulebook)
 	def drawDestinationCards(self):
-		if sum(self.destination_deck.deck.values()) == 0:
+		if self.destination_deck.remaining() == 0:
 			return False
 
-		x = self.destination_deck_draw_rules[2] if sum(self.destination_deck.deck.values()) >= self.destination_deck_draw_rules[2] else sum(self.destination_deck.deck.values())
+		x = self.destination_deck_draw_rules[2] if self.destination_deck.remaining() >= self.destination_deck_draw_rules[2] else self.destination_deck.remaining()
 		if 'destination' not in self.players[self.current_player].hand:
 			self.players[self.current_player].hand['destination'] = []
 		for i in range(0, x):
@@ -944,7 +1530,7 @@ class Game:
 	#card => string of the card to draw. If value is 'top', draws a card from the top of the deck
 	#to draw from the face up cards, just pass the string of the color of the card to draw as the parameter
 	def drawTrainCard(self, card):
-		if sum(self.train_deck.deck.values()) == 0:
+		if self.train_deck.remaining() == 0:
 			self.train_deck.reshuffle()
 		if (not self.switzerland_variant) and (not self.nordic_countries_variant) and self.number_of_current_draws + 1 < self.number_of_cards_draw_per_turn and card == 'wild' and card in self.train_cards_face_up and self.train_cards_face_up[card] > 0 and self.players[self.current_player].drawing_train_cards == False:
 			self.players[self.current_player].hand['wild'] += 1
@@ -977,12 +1563,12 @@ class Game:
 			drawn = True
 		
 		if drawn:
-			if card == 'top' and sum(self.train_deck.deck.values()) == 0:
+			if card == 'top' and self.train_deck.remaining() == 0:
 				self.number_of_current_draws = 0
 				self.next_players_turn()
 				return True
 
-			elif sum(self.train_deck.deck.values()) == 0 and sum(self.train_cards_face_up.values()) == 0:
+			elif self.train_deck.remaining() == 0 and sum(self.train_cards_face_up.values()) == 0:
 				self.number_of_current_draws = 0
 				self.next_players_turn()
 				return True
@@ -1006,6 +1592,10 @@ class Game:
 		#print("args: " + str(args))
 		#print(len(self.train_deck.deck))
 		#print "Move made!  " + str(move)
+		if self.undo_stack is not None:
+			self.push_undo_frame()
+		if self.record is not None:
+			self.record.add_move(self, move, args)
 		last_turn = False
 		if self.current_player == self.last_turn_player:
 			last_turn = True
@@ -1023,6 +1613,71 @@ class Game:
 			return sorted([x for x in self.players], key=comparePlayerKey)
 
 
+	####################
+	#   UNDOING MOVES  #
+	####################
+
+	#after enable_undo, every make_move and choose_destination_cards call can be reverted with unmake_move (last in, first out)
+	#this lets agents search ahead on the real game (one make_move + one unmake_move per node) instead of copying it:
+	#game.enable_undo()
+	#game.make_move('claimRoute', ['NEW YORK', 'BOSTON', 'RED'])
+	#game.unmake_move()
+	def enable_undo(self):
+		if self.undo_stack is None:
+			self.undo_stack = []
+
+	def disable_undo(self):
+		self.undo_stack = None
+
+	#saves everything a move can change, except the routes claimed (those are recorded by claim_route in the frame)
+	#recorded => whether the move is added to self.record (unmake_move removes it from the record too)
+	def push_undo_frame(self, recorded=True):
+		players = []
+		for p in self.players:
+			players.append((p.hand.copy(), p.number_of_trains, p.points, p.drawing_train_cards, len(p.hand_destination_cards), set(p.completed_destination_cards), set(p.completed_destination_cards_train)))
+
+		self.undo_stack.append({'random_state': self.rng.getstate(),
+								'current_player': self.current_player,
+								'last_turn_player': self.last_turn_player,
+								'game_over': self.game_over,
+								'number_of_current_draws': self.number_of_current_draws,
+								'train_deck': self.train_deck.copy(),
+								'destination_deck': self.destination_deck.copy(),
+								'train_cards_face_up': self.train_cards_face_up.copy(),
+								'players': players,
+								'recorded': recorded and self.record is not None,
+								'routes': []})
+
+	#reverts the last move made with make_move or choose_destination_cards (including the state of the random generator)
+	#returns False if there is nothing to undo
+	def unmake_move(self):
+		if not self.undo_stack:
+			return False
+
+		frame = self.undo_stack.pop()
+		if frame['recorded']:
+			self.record.moves.pop()
+		for (pnum, city1, city2, key, new_cities, connections) in reversed(frame['routes']):
+			route = self.board.routes.route_index[(city1, city2, key)]
+			self.board.set_route_owner(route, -1)
+			self.players[pnum].remove_route(city1, city2, new_cities, connections)
+			self.update_claim_options([self.board.routes.route_pair[route]])
+
+		for (p, saved) in zip(self.players, frame['players']):
+			p.hand, p.number_of_trains, p.points, p.drawing_train_cards, num_destination_cards, p.completed_destination_cards, p.completed_destination_cards_train = saved
+			del p.hand_destination_cards[num_destination_cards:]
+
+		self.rng.setstate(frame['random_state'])
+		self.current_player = frame['current_player']
+		self.last_turn_player = frame['last_turn_player']
+		self.game_over = frame['game_over']
+		self.number_of_current_draws = frame['number_of_current_draws']
+		self.train_deck = frame['train_deck']
+		self.destination_deck = frame['destination_deck']
+		self.train_cards_face_up = frame['train_cards_face_up']
+
+		return True
+
 	#returns a graph of all routes (edges) claimed by a player
 	#player => index of the player
 	def player_graph(self, player):
@@ -1085,7 +1740,7 @@ class Game:
 							if destination.destinations[0] in player_graph.nodes():
 								for key in available_nodes:
 									for country in available_nodes[key]:
-										if nx.has_path(player_graph, destination.destinations[0], country):
+										if player.connections.connected(destination.destinations[0], country):
 											total = destination.points[destination.destinations[1].index(key)]
 											if total > max_points:
 												max_points = total
@@ -1099,7 +1754,7 @@ class Game:
 										break
 	
 									for country in available_nodes[key]:
-										if nx.has_path(player_graph, start, country):
+										if player.connections.connected(start, country):
 											total = destination.points[destination.destinations[1].index(key)]
 											if total > max_points:
 												max_points = total
@@ -1115,7 +1770,7 @@ class Game:
 				except:
 					try:
 						mandala = 0
-						if nx.has_path(player_graph, destination.destinations[0], destination.destinations[1]):
+						if player.connections.completes(destination):
 							#print "Finished " + str(destination.destinations) + "!  +" + str(destination.points)
 							player.points = player.points + destination.points
 							number_of_destinations_completed += 1
@@ -1153,12 +1808,10 @@ class Game:
 					globetrotter_player.append(self.players.index(player))
 
 			if self.longest_route_variant:
-				temparr = [self.findMaxWeightSumForNode(player_graph, v, []) for v in player_graph.nodes()]
-				temp = 0
-				if len(temparr) > 0:
-					temp = max(temparr)
+				#None if the player can't reach the longest route found so far
+				temp = longestTrailWeight(player_graph, longest_route_value)
 				#print(f"Player {self.players.index(player)} has longest route score of {temp}")
-				if longest_route_value == None or temp >= longest_route_value:
+				if temp is not None and (longest_route_value == None or temp >= longest_route_value):
 					if longest_route_value is None or temp > longest_route_value:
 						longest_route_player = [self.players.index(player)]
 					else:
@@ -1167,15 +1820,11 @@ class Game:
 					longest_route_value = temp
                     
 			if self.asia_variant:
-				temparr = [self.findMaxNodesVistiedForNode(player_graph, v, []) for v in player_graph.nodes()]
-				aux = [len(x) for x in temparr]
-				temparr = aux
-				temp = 0
-				if len(temparr) > 0:
-					temp = max(temparr)
+				#None if the player can't reach the most cities visited found so far
+				temp = maxCitiesOnTrail(player_graph, asia_route_value)
 				
-				if asia_route_value == None or temp >= asia_route_value:
-					if temp > asia_route_value:
+				if temp is not None and (asia_route_value == None or temp >= asia_route_value):
+					if asia_route_value is None or temp > asia_route_value:
 						asia_route_player = [self.players.index(player)]
 					else:
 						asia_route_player.append(self.players.index(player))
@@ -1199,7 +1848,7 @@ class Game:
 		player_graph = self.player_graph(self.players.index(player))
 		for destination in player.hand_destination_cards:
 			try:
-				if nx.has_path(player_graph, destination.destinations[0], destination.destinations[1]):
+				if player.connections.completes(destination):
 					player.points = player.points + destination.points
 				else:
 					player.points = player.points - destination.points
@@ -1210,7 +1859,7 @@ class Game:
 	#G => the graph from which to calculate (use a graph return by the function player_graph above)
 	#source => the node from which to start
 	#list_of_visited_edges => the list of the edges visited already
-	#the function calculates the longest route in the calculatePoints function above by recursively calling this function updating the list of visited edges, for every node in the graph
+	#calculatePoints uses longestTrailWeight (longestRoute.py) instead, which gives the same result as the max of this function over all nodes
 	def findMaxWeightSumForNode(self, G, source, list_of_visited_edges):
 		temp_edges = [e for e in G.edges() if e not in list_of_visited_edges and source in e]
 		if len(temp_edges) == 0:
@@ -1221,6 +1870,8 @@ class Game:
 			result.extend([(self.findMaxWeightSumForNode(G, y, list_of_visited_edges+[(x,y)]) + G[y][x]['weight']) for (x,y) in temp_edges if source == x])
 			return max(result)
 
+	#returns the set of nodes of a trail from source (keeps the biggest set of each step, so it can miss the trail with the most nodes)
+	#calculatePoints uses maxCitiesOnTrail (longestRoute.py) instead, which is exact
 	def findMaxNodesVistiedForNode(self, G, source, list_of_visited_edges):
 		temp_edges = [e for e in G.edges() if e not in list_of_visited_edges and source in e]
 		if len(temp_edges) == 0:
@@ -1232,59 +1883,215 @@ class Game:
 			l = [len(x) for x in result]
 			return result[l.index(max(l))]
 
+	###################
+	#   CLAIM MOVES   #
+	###################
+
+	#claim_options has one entry per pair of cities (indexed like board.routes.pairs) with the tuples (color id, route id)
+	#of the route get_free_connection returns for each color. Empty if no route of the pair can be claimed
+	#it only changes when a route of the pair is claimed (or unclaimed), so claimRoute and unmake_move update the pairs they change
+	#pairs => list of pair indexes to update. None to rebuild everything
+	def update_claim_options(self, pairs=None):
+		routes = self.board.routes
+		if pairs is None:
+			self.claim_options = [()] * routes.number_of_pairs
+			pairs = range(routes.number_of_pairs)
+
+		special_variant = self.switzerland_variant or self.nordic_countries_variant
+		for pair in pairs:
+			options = []
+			for color in range(NUMBER_OF_CLAIM_COLORS):
+				route = self.board.free_pair_route(pair, color, self.number_of_players, special_variant)
+				if route is not None:
+					options.append((color, route))
+			self.claim_options[pair] = tuple(options)
+
+	#returns (pair id, color id, move code) of every claimRoute move player_index can make (see get_possible_moves for the names)
+	#the result only depends on the routes claimed (board.version), the hand and the trains of the player,
+	#so it is cached and calls during the same turn only cost the number of moves
+	def get_claim_route_moves(self, player_index):
+		player = self.players[player_index]
+		key = (self.board.version, tuple(player.hand.counts), player.number_of_trains)
+		cached = self.claim_moves_cache.get(player_index)
+		if cached is not None and cached[0] == key:
+			return cached[1]
+
+		routes = self.board.routes
+		rows = routes.rows
+		#Can never claim route between two cities if you already have claimed a route between the two cities
+		owned_pairs = self.board.claimed_pairs(player_index).tolist()
+		#(weight, color, ferries, special_nordic_route) => whether the hand of the player has the cards
+		hand_requirements = {}
+		claims = []
+		for (pair, options) in enumerate(self.claim_options):
+			if not options or owned_pairs[pair]:
+				continue
+
+			special_nordic_route = self.nordic_countries_variant and routes.special_pair[pair]
+
+			for (color, route) in options:
+				(weight, ferries, mountain) = (rows[route][3], rows[route][5], rows[route][7])
+				requirement = (weight, color, ferries, special_nordic_route)
+				if requirement not in hand_requirements:
+					hand_requirements[requirement] = self.checkPlayerHandRequirements(player_index, weight, COLOR_NAMES[color], ferries, special_nordic_route) != False
+				if hand_requirements[requirement] and player.number_of_trains >= weight + mountain:
+					claims.append((pair, color, pack_move(0, color, route)))
+
+		self.claim_moves_cache[player_index] = (key, claims)
+		return claims
+
 	def get_possible_moves(self, player_index):
 		pmoves = []
-		if self.players[player_index].drawing_train_cards == True and sum(self.train_deck.deck.values()) > 0:
+		if self.players[player_index].drawing_train_cards == True and self.train_deck.remaining() > 0:
 			#always draw another train car card if already drew one this turn
-			pmoves.append(Move('drawTrainCard', 'top'))
-			for card in set(self.train_cards_face_up):
+			pmoves.append(Move('drawTrainCard', 'top', DRAW_TOP_CODE))
+			for card in self.train_cards_face_up:
 				if (self.switzerland_variant or self.nordic_countries_variant) and self.train_cards_face_up[card] > 0:
-					pmoves.append(Move('drawTrainCard', card))
+					pmoves.append(Move('drawTrainCard', card, pack_move(1, COLOR_IDS[card])))
 				else:
 					if card != 'wild' and self.train_cards_face_up[card] > 0:
-						pmoves.append(Move('drawTrainCard', card))
+						pmoves.append(Move('drawTrainCard', card, pack_move(1, COLOR_IDS[card])))
 				#pmoves.append(Move(self.move_drawTrainCard, card))				
 		else:
-			colors = ["RED", "ORANGE", "BLUE", "PINK", "WHITE", "YELLOW", "BLACK", "GREEN"]
-			edges = self.board.graph.edges()
-			#for city1 in self.board.graph:
-			#	for city2 in self.board.graph:
-			visited = []
-			for (city1, city2) in edges:
-				if (city1, city2) not in visited:
-					visited.append((city1, city2))
-
-					#Can never claim route between two cities if you already have claimed a route between the two cities
-					if self.player_graph(player_index).has_edge(city1, city2):
-						continue
-
-					special_nordic_route = False				
-					if self.nordic_countries_variant:
-						cities = [city1.lower(), city2.lower()]
-						if "murmansk" in cities and "lieksa" in cities:
-							special_nordic_route = True
-	
-					for color in colors:
-						edge = self.board.get_free_connection(city1, city2, color, self.number_of_players, self.switzerland_variant or self.nordic_countries_variant)
-
-						if edge != None:
-							if self.checkPlayerHandRequirements(player_index, edge['weight'], color, edge['ferries'], special_nordic_route) != False:
-								if self.players[player_index].number_of_trains >= edge['weight'] + edge['mountain']:
-									pmoves.append(Move('claimRoute', [city1, city2, color]))
-								#pmoves.append(Move(self.move_claimRoute, [city1, city2, color]))
-			if sum(self.destination_deck.deck.values()) > 0 and self.players[player_index].can_draw_destination_cards(self.destination_deck_draw_rules[3]): #possible to draw destination cards even if only 1 can be drawn
-				pmoves.append(Move('drawDestinationCards',[]))
+			#a new Move (and list of args) every call, agents may keep or change the moves they get
+			pairs = self.board.routes.pairs
+			for (pair, color, code) in self.get_claim_route_moves(player_index):
+				(city1, city2) = pairs[pair]
+				pmoves.append(Move('claimRoute', [city1, city2, COLOR_NAMES[color]], code))
+				#pmoves.append(Move(self.move_claimRoute, [city1, city2, color]))
+			if self.destination_deck.remaining() > 0 and self.players[player_index].can_draw_destination_cards(self.destination_deck_draw_rules[3]): #possible to draw destination cards even if only 1 can be drawn
+				pmoves.append(Move('drawDestinationCards', [], DRAW_DESTINATIONS_CODE))
 				#pmoves.append(Move(self.move_drawDestinationCards,[]))
-			if sum(self.train_deck.deck.values()) > 0 and self.players[player_index].can_draw_train_car_cards():
-				pmoves.append(Move('drawTrainCard', 'top'))
+			if self.train_deck.remaining() > 0 and self.players[player_index].can_draw_train_car_cards():
+				pmoves.append(Move('drawTrainCard', 'top', DRAW_TOP_CODE))
 				#pmoves.append(Move(self.move_drawTrainCard, 'top'))
 			if sum(self.train_cards_face_up.values()) > 0 and self.players[player_index].can_draw_train_car_cards():
-				for card in set(self.train_cards_face_up):
+				for card in self.train_cards_face_up:
 					if self.train_cards_face_up[card] > 0:
-						pmoves.append(Move('drawTrainCard', card))
+						pmoves.append(Move('drawTrainCard', card, pack_move(1, COLOR_IDS[card])))
 					#pmoves.append(Move(self.move_drawTrainCard, card))
 		return pmoves
 
+	#returns the move code of a move (see pack_move), function and args as in make_move
+	#raises ValueError if the route of a claimRoute move can't be claimed
+	def move_code(self, function, args):
+		if function == 'claimRoute':
+			route = self.board.free_route_id(args[0], args[1], args[2], self.number_of_players, self.switzerland_variant or self.nordic_countries_variant)
+			if route is None:
+				raise ValueError(f"No free route between {args[0]} and {args[1]} for {args[2]}")
+			return pack_move(0, COLOR_IDS[args[2]], route)
+		if function == 'drawTrainCard':
+			return DRAW_TOP_CODE if args == 'top' else pack_move(1, COLOR_IDS[args])
+		if function == 'drawDestinationCards':
+			return DRAW_DESTINATIONS_CODE
+		(player, cards) = args
+		routes = self.board.routes
+		pending = [routes.ticket_id(card) for card in self.list_pending_destination_cards(player)]
+		mask = 0
+		for card in cards:
+			mask |= 1 << next(i for (i, ticket) in enumerate(pending) if ticket == routes.ticket_id(card) and not mask & (1 << i))
+		return pack_move(3, player, mask)
+
+	#returns the least number of its pending destination cards pnum must keep
+	#players choose their first destination cards before they keep any
+	def min_destination_cards(self, pnum):
+		return self.destination_deck_draw_rules[1] if len(self.players[pnum].hand_destination_cards) == 0 else self.destination_deck_draw_rules[3]
+
+	#returns the Move of a move code (see pack_move)
+	def code_move(self, code):
+		(kind, color, route) = unpack_move(code)
+		if kind == 0:
+			(city1, city2) = self.board.routes.rows[route][:2]
+			return Move('claimRoute', [city1, city2, COLOR_NAMES[color]], code)
+		if kind == 1:
+			return Move('drawTrainCard', 'top' if color == TOP_CARD else CARD_NAMES[color], code)
+		if kind == 2:
+			return Move('drawDestinationCards', [], code)
+		pending = self.list_pending_destination_cards(color)
+		return Move('chooseDestinationCards', [color, [card for (i, card) in enumerate(pending) if route & (1 << i)]], code)
+
+	#####################
+	#   ACTION SPACE    #
+	#####################
+
+	#every move has a fixed action index, so a policy can score all actions of the map at once and pick the best legal one:
+	#claimRoute => route id * NUMBER_OF_CLAIM_COLORS + color id (the route get_free_connection claims with that color)
+	#drawTrainCard => one index for the top card, then one per face up color (in the order of HAND_COLORS)
+	#drawDestinationCards => one index, chooseDestinationCards => one per non empty subset of the MAX_PENDING_CARDS pending cards
+	def action_space_size(self):
+		return self.action_offsets()[-1]
+
+	#returns the offsets of the actions of the map of the game (see action_offsets)
+	def action_offsets(self):
+		return action_offsets(self.board.routes.number_of_routes)
+
+	#returns a boolean array with the actions pnum can make: the moves of get_possible_moves, or the destination cards
+	#pnum can keep (see GameHandler.generate_destination_card_choices) while pnum has pending destination cards
+	def legal_action_mask(self, pnum):
+		(claim, top, face_up, draw_destinations, choose, size) = self.action_offsets()
+		mask = np.zeros(size, dtype=bool)
+		player = self.players[pnum]
+
+		pending = len(player.hand.pending)
+		if pending > 0:
+			min_num_cards = self.min_destination_cards(pnum)
+			for cards in range(1, 1 << pending):
+				number = bin(cards).count('1')
+				if number >= min_num_cards and player.can_draw_destination_cards(number):
+					mask[choose + cards - 1] = True
+			return mask
+
+		can_draw = self.train_deck.remaining() > 0
+		special_variant = self.switzerland_variant or self.nordic_countries_variant
+		if player.drawing_train_cards and can_draw:
+			mask[top] = True
+			for (card, count) in self.train_cards_face_up.items():
+				if count > 0 and (special_variant or card != 'wild'):
+					mask[face_up + HAND_INDEX[card]] = True
+			return mask
+
+		for (pair, color, code) in self.get_claim_route_moves(pnum):
+			(kind, color, route) = unpack_move(code)
+			mask[claim + route * NUMBER_OF_CLAIM_COLORS + color] = True
+		if self.destination_deck.remaining() > 0 and player.can_draw_destination_cards(self.destination_deck_draw_rules[3]):
+			mask[draw_destinations] = True
+		if player.can_draw_train_car_cards():
+			mask[top] = can_draw
+			for (card, count) in self.train_cards_face_up.items():
+				if count > 0:
+					mask[face_up + HAND_INDEX[card]] = True
+		return mask
+
+	#returns the action index of a move (a Move from get_possible_moves or generate_destination_card_choices)
+	#raises ValueError if the move has no action (more pending destination cards than MAX_PENDING_CARDS)
+	def encode_move(self, move):
+		code = move.code if move.code is not None else self.move_code(move.function, move.args)
+		(claim, top, face_up, draw_destinations, choose, size) = self.action_offsets()
+		(kind, color, route) = unpack_move(code)
+		if kind == 0:
+			return claim + route * NUMBER_OF_CLAIM_COLORS + color
+		if kind == 1:
+			return top if color == TOP_CARD else face_up + HAND_INDEX[CARD_NAMES[color]]
+		if kind == 2:
+			return draw_destinations
+		if route == 0 or route >= (1 << MAX_PENDING_CARDS):
+			raise ValueError(f"No action to keep the destination cards {route:b}")
+		return choose + route - 1
+
+	#returns the Move of an action index for pnum (the player keeping destination cards)
+	def decode_action(self, action, pnum):
+		(claim, top, face_up, draw_destinations, choose, size) = self.action_offsets()
+		if action < top:
+			(route, color) = divmod(action - claim, NUMBER_OF_CLAIM_COLORS)
+			return self.code_move(pack_move(0, color, route))
+		if action == top:
+			return self.code_move(DRAW_TOP_CODE)
+		if action < draw_destinations:
+			return self.code_move(pack_move(1, COLOR_IDS[HAND_COLORS[action - face_up]]))
+		if action == draw_destinations:
+			return self.code_move(DRAW_DESTINATIONS_CODE)
+		return self.code_move(pack_move(3, pnum, action - choose + 1))
+
 	def printScoring(self, pnum):
 		longest_route_player = []
 	
@@ -1313,7 +2120,7 @@ class Game:
 						if destination.destinations[0] in player_graph.nodes():
 							for key in available_nodes:
 								for country in available_nodes[key]:
-									if nx.has_path(player_graph, destination.destinations[0], country):
+									if player.connections.connected(destination.destinations[0], country):
 										print(str(destination.destinations) + ' was completed! +' + str(destination.points))
 										scored = True
 										break
@@ -1324,7 +2131,7 @@ class Game:
 									break
 
 								for country in available_nodes[key]:
-									if nx.has_path(player_graph, start, country):
+									if player.connections.connected(start, country):
 										print(str(destination.destinations) + ' was completed! +' + str(destination.points))
 										scored = True
 										break
@@ -1333,7 +2140,7 @@ class Game:
 						print(str(destination.destinations) + ' was not completed! -' + str(destination.points))
 			except:
 				try:
-					if nx.has_path(player_graph, destination.destinations[0], destination.destinations[1]):
+					if player.connections.completes(destination):
 						print(str(destination.destinations) + ' was completed! +' + str(destination.points))
 					else:
 						print(str(destination.destinations) + ' was not completed! -' + str(destination.points))
@@ -1356,7 +2163,7 @@ class Game:
 		
 		for destination in player.hand_destination_cards:
 			try:
-				if nx.has_path(player_graph, destination.destinations[0], destination.destinations[1]):
+				if player.connections.completes(destination):
 					#print "Finished " + str(destination.destinations) + "!  +" + str(destination.points)
 					rscore = rscore + destination.points
 				else:
@@ -1374,7 +2181,7 @@ class Game:
 		
 		for destination in player.hand_destination_cards:
 			try:
-				if nx.has_path(player_graph, destination.destinations[0], destination.destinations[1]):
+				if player.connections.completes(destination):
 					num += 1
 			except:
 				pass
@@ -1383,32 +2190,19 @@ class Game:
 	def getNumIncompleteDCards(self, pnum):
 		num = 0
 		player = self.players[pnum]
-		player_graph = self.player_graph(pnum)
 		
 		for destination in player.hand_destination_cards:
-			if destination.destinations[0] not in self.player_graph(pnum) or destination.destinations[1] not in self.player_graph(pnum):
-				num += 1
-			elif not nx.has_path(player_graph, destination.destinations[0], destination.destinations[1]):
+			if not player.connections.completes(destination):
 				num += 1
 		return num
 
+	#returns the set of pairs of cities (city1, city2) that still have a route that can be claimed
 	def getUnclaimedRoutes(self):
-		colors = ["RED", "ORANGE", "BLUE", "PINK", "WHITE", "YELLOW", "BLACK", "GREEN"]
-		edges = self.board.graph.edges()
-		#for city1 in self.board.graph:
-		#	for city2 in self.board.graph:
-		unclaimed = set()
-		visited = []
-		for (city1, city2) in edges:
-			if (city1, city2) not in visited:
-				visited.append((city1, city2))
-
-				for color in colors:
-					edge = self.board.get_free_connection(city1, city2, color, self.number_of_players, self.switzerland_variant or self.nordic_countries_variant)
-
-					if edge != None:
-						unclaimed.add((city1, city2))
-		return unclaimed
+		routes = self.board.routes
+		#colors that can be claimed with the colors of the train cards (everything but odd colors of some maps)
+		claimable_color = routes.color < len(ROUTE_COLORS)
+		free = self.board.claimable_routes(self.number_of_players) & claimable_color
+		return set(routes.pairs[pair] for pair in np.unique(routes.pair[free]).tolist())
     
 	def winner(self):
 		points_list = [x.points for x in self.players]     